@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0012_userprofile_language'),
+        # submission/0007 没有声明对 contest 和 problem 的依赖。account 最先被规划，
+        # 在这里依赖它们，新建数据库时这两个表在 submission/0007 之前创建
+        ('contest', '0005_auto_20170823_0918'),
+        ('problem', '0006_auto_20170823_0918'),
+    ]
+
+    operations = [
+        # 数据库中的列由 problem/0015 复制到 user_problem_status 之后删除
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.RemoveField(
+                model_name='userprofile',
+                name='acm_problems_status',
+            ),
+            migrations.RemoveField(
+                model_name='userprofile',
+                name='oi_problems_status',
+            ),
+        ]),
+    ]
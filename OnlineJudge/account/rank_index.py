@@ -0,0 +1,218 @@
+from django.db import transaction
+
+from utils.cache import cache
+from utils.constants import CacheKey, ContestRuleType
+from .models import AdminType, UserProfile
+
+# ACM 的分数为 accepted_number * ACM_SCORE_BASE - submission_number，提交次数不会超过 ACM_SCORE_BASE
+ACM_SCORE_BASE = 10 ** 9
+BUILD_BATCH_SIZE = 1000
+
+# 排行榜还没有构建时不写入，分数为空表示不在排行榜中
+#
+# KEYS: 各个规则的排行榜, ARGV[1]: user id, ARGV[i + 1]: KEYS[i] 中的分数
+UPDATE_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call("EXISTS", key) == 1 then
+        if ARGV[i + 1] == "" then
+            redis.call("ZREM", key, ARGV[1])
+        else
+            redis.call("ZADD", key, ARGV[i + 1], ARGV[1])
+        end
+    end
+end
+"""
+
+# 从游标之后开始取一页，游标是上一页最后一个用户的 (分数, user id)，不再查询游标用户现在的分数。
+# 排行榜按分数从高到低、分数相同时按 member 从大到小排列，所以下一页先取分数相同、member 比游标小的用户，
+# 再取分数比游标低的用户。分数相同的用户用二分查找确定游标的位置
+#
+# KEYS[1]: 排行榜, ARGV[1]: 游标 user id, ARGV[2]: 游标分数, ARGV[3]: 每页数量
+# 返回 {第一条的名次(从 0 开始), user id, 分数, user id, 分数, ...}
+PAGE_SCRIPT = """
+local limit = tonumber(ARGV[3])
+if ARGV[1] == "" then
+    local items = redis.call("ZREVRANGE", KEYS[1], 0, limit - 1, "WITHSCORES")
+    table.insert(items, 1, 0)
+    return items
+end
+local score = ARGV[2]
+local low, high = 0, redis.call("ZCOUNT", KEYS[1], score, score)
+while low < high do
+    local mid = math.floor((low + high) / 2)
+    local member = redis.call("ZREVRANGEBYSCORE", KEYS[1], score, score, "LIMIT", mid, 1)[1]
+    if member >= ARGV[1] then
+        low = mid + 1
+    else
+        high = mid
+    end
+end
+local items = redis.call("ZREVRANGEBYSCORE", KEYS[1], score, score, "WITHSCORES", "LIMIT", low, limit)
+local rest = limit - #items / 2
+if rest > 0 then
+    for _, item in ipairs(redis.call("ZREVRANGEBYSCORE", KEYS[1], "(" .. score, "-inf", "WITHSCORES", "LIMIT", 0, rest)) do
+        table.insert(items, item)
+    end
+end
+table.insert(items, 1, redis.call("ZCOUNT", KEYS[1], "(" .. score, "+inf") + low)
+return items
+"""
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class UserRankIndex:
+    """
+    全站用户排名，ACM 和 OI 规则各一个 redis sorted set，member 为 user_id。
+    JudgeDispatcher 更新 UserProfile 之后只更新这一个用户的分数，查询名次和翻页都是 O(log n)。
+    第一次查询时从数据库构建，与 UserRankAPI 一致只包含正常状态、有提交(OI 有得分)的普通用户。
+    """
+    def __init__(self, redis_conn=cache):
+        self._redis_conn = redis_conn
+        self._update_script = None
+        self._page_script = None
+
+    @staticmethod
+    def _key(rule_type):
+        return f"{CacheKey.user_rank}:{rule_type}"
+
+    @staticmethod
+    def score(rule_type, accepted_number, submission_number, total_score):
+        """
+        :return: 排行榜中的分数，不应该出现在排行榜中返回 None
+        """
+        if rule_type == ContestRuleType.ACM:
+            return accepted_number * ACM_SCORE_BASE - submission_number if submission_number > 0 else None
+        return total_score if total_score > 0 else None
+
+    @staticmethod
+    def profiles(rule_type):
+        profiles = UserProfile.objects.filter(user__admin_type=AdminType.REGULAR_USER, user__is_disabled=False)
+        if rule_type == ContestRuleType.ACM:
+            return profiles.filter(submission_number__gt=0)
+        return profiles.filter(total_score__gt=0)
+
+    def _ensure(self, rule_type):
+        key = self._key(rule_type)
+        if self._redis_conn.exists(key):
+            return
+        with transaction.atomic():
+            # 锁住参与排名的用户，构建期间的评测等构建完成之后再写入，不会被旧数据覆盖
+            profiles = list(self.profiles(rule_type).select_for_update(of=("self",))
+                            .values_list("user_id", "accepted_number", "submission_number", "total_score"))
+            pipe = self._redis_conn.pipeline()
+            pipe.delete(key)
+            for i in range(0, len(profiles), BUILD_BATCH_SIZE):
+                pipe.zadd(key, {user_id: self.score(rule_type, *values)
+                                for user_id, *values in profiles[i:i + BUILD_BATCH_SIZE]})
+            pipe.execute()
+
+    def update_users(self, user_ids):
+        """
+        在更新 UserProfile 的事务中调用，同一个用户的更新由 UserProfile 的行锁保证顺序
+        """
+        rows = UserProfile.objects.filter(user_id__in=user_ids) \
+            .values_list("user_id", "accepted_number", "submission_number", "total_score",
+                         "user__admin_type", "user__is_disabled")
+        if self._update_script is None:
+            self._update_script = self._redis_conn.register_script(UPDATE_SCRIPT)
+        keys = [self._key(rule_type) for rule_type in ContestRuleType.choices()]
+        pipe = self._redis_conn.pipeline()
+        found = set()
+        for user_id, accepted_number, submission_number, total_score, admin_type, is_disabled in rows:
+            found.add(user_id)
+            scores = []
+            for rule_type in ContestRuleType.choices():
+                score = None
+                if admin_type == AdminType.REGULAR_USER and not is_disabled:
+                    score = self.score(rule_type, accepted_number, submission_number, total_score)
+                scores.append("" if score is None else score)
+            self._update_script(keys=keys, args=[user_id, *scores], client=pipe)
+        # 已经删除的用户
+        for user_id in set(int(user_id) for user_id in user_ids) - found:
+            for key in keys:
+                pipe.zrem(key, user_id)
+        pipe.execute()
+
+    def _profiles(self, user_ids):
+        profiles = {profile.user_id: profile
+                    for profile in UserProfile.objects.select_related("user").filter(user_id__in=user_ids)}
+        return [profiles[user_id] for user_id in user_ids if user_id in profiles]
+
+    def page(self, rule_type, offset, limit):
+        """
+        :return: (当前页按名次排列的 UserProfile 列表, 总人数)
+        """
+        self._ensure(rule_type)
+        key = self._key(rule_type)
+        if limit <= 0:
+            return [], self._redis_conn.zcard(key)
+        pipe = self._redis_conn.pipeline()
+        pipe.zrevrange(key, offset, offset + limit - 1)
+        pipe.zcard(key)
+        user_ids, total = pipe.execute()
+        return self._profiles([int(user_id) for user_id in user_ids]), total
+
+    def page_after(self, rule_type, cursor, limit):
+        """
+        按游标翻页，游标为空时从第一名开始
+        :return: ([(名次, UserProfile)], 下一页的游标(没有下一页时为 None), 总人数)
+        """
+        cursor_user_id, cursor_score = "", ""
+        if cursor:
+            try:
+                cursor_score, cursor_user_id = (int(item) for item in cursor.split(":"))
+            except ValueError:
+                raise InvalidCursor(cursor)
+        self._ensure(rule_type)
+        key = self._key(rule_type)
+        if self._page_script is None:
+            self._page_script = self._redis_conn.register_script(PAGE_SCRIPT)
+        start, *items = self._page_script(keys=[key], args=[cursor_user_id, cursor_score, limit])
+        total = self._redis_conn.zcard(key)
+        user_ids = [int(user_id) for user_id in items[::2]]
+        scores = {user_id: int(float(score)) for user_id, score in zip(user_ids, items[1::2])}
+        positions = {user_id: start + i + 1 for i, user_id in enumerate(user_ids)}
+        results = [(positions[profile.user_id], profile) for profile in self._profiles(user_ids)]
+        next_cursor = None
+        if user_ids and start + len(user_ids) < total:
+            next_cursor = f"{scores[user_ids[-1]]}:{user_ids[-1]}"
+        return results, next_cursor, total
+
+    def sequence(self, rule_type):
+        return UserRankSequence(self, rule_type)
+
+    def rank_of(self, rule_type, user_id):
+        """
+        :return: 从 1 开始的名次，不在排行榜中返回 None
+        """
+        self._ensure(rule_type)
+        rank = self._redis_conn.zrevrank(self._key(rule_type), user_id)
+        return None if rank is None else rank + 1
+
+    def invalidate(self):
+        self._redis_conn.delete_many([self._key(rule_type) for rule_type in ContestRuleType.choices()])
+
+
+class UserRankSequence:
+    """
+    可以直接传给 APIView.paginate_data 的排名序列，只支持切片
+    """
+    def __init__(self, index, rule_type):
+        self._index = index
+        self._rule_type = rule_type
+        self._total = None
+
+    def __getitem__(self, item):
+        profiles, self._total = self._index.page(self._rule_type, item.start, item.stop - item.start)
+        return profiles
+
+    def count(self):
+        if self._total is None:
+            _, self._total = self._index.page(self._rule_type, 0, 0)
+        return self._total
+
+
+user_rank_index = UserRankIndex()
@@ -1,5 +1,7 @@
 from django import forms
+from django.db.models import QuerySet
 
+from problem.models import ProblemRuleType, UserProblemStatus
 from utils.api import serializers, UsernameSerializer
 
 from .models import AdminType, ProblemPermission, User, UserProfile
@@ -70,6 +72,8 @@ class UserSerializer(serializers.ModelSerializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer()
     real_name = serializers.SerializerMethodField()
+    acm_problems_status = serializers.SerializerMethodField()
+    oi_problems_status = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfile
@@ -78,10 +82,39 @@ class UserProfileSerializer(serializers.ModelSerializer):
     def __init__(self, *args, **kwargs):
         self.show_real_name = kwargs.pop("show_real_name", False)
         super(UserProfileSerializer, self).__init__(*args, **kwargs)
+        self._problems_status = {}
 
     def get_real_name(self, obj):
         return obj.real_name if self.show_real_name else None
 
+    def _get_problems_status(self, obj):
+        """
+        题目状态保存在 UserProblemStatus 中，这里按原来 UserProfile 中 json 的格式返回
+        {"problems": {problem_id: {"status": ..., "_id": ..., "score": ...}}, "contest_problems": {...}}
+        many=True 时 child 的 instance 是全部的 profile，第一次调用时一次查询所有用户的状态
+        """
+        if obj.user_id not in self._problems_status:
+            profiles = self.instance if isinstance(self.instance, (list, tuple, QuerySet)) else [obj]
+            user_ids = {profile.user_id for profile in profiles} | {obj.user_id}
+            for user_id in user_ids:
+                self._problems_status[user_id] = {ProblemRuleType.ACM: {}, ProblemRuleType.OI: {}}
+            rows = UserProblemStatus.objects.filter(user_id__in=user_ids) \
+                .values_list("user_id", "problem_id", "problem___id", "problem__rule_type", "contest_id",
+                             "status", "score")
+            for user_id, problem_id, _id, rule_type, contest_id, status, score in rows:
+                item = {"status": status, "_id": _id}
+                if rule_type == ProblemRuleType.OI:
+                    item["score"] = score
+                key = "contest_problems" if contest_id else "problems"
+                self._problems_status[user_id][rule_type].setdefault(key, {})[str(problem_id)] = item
+        return self._problems_status[obj.user_id]
+
+    def get_acm_problems_status(self, obj):
+        return self._get_problems_status(obj)[ProblemRuleType.ACM]
+
+    def get_oi_problems_status(self, obj):
+        return self._get_problems_status(obj)[ProblemRuleType.OI]
+
 
 class EditUserSerializer(serializers.Serializer):
     id = serializers.IntegerField()
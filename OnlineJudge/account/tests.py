@@ -8,11 +8,18 @@ from django.contrib import auth
 from django.utils.timezone import now
 from otpauth import OtpAuth
 
+from contest.models import ACMContestRank, Contest
+from contest.rank_snapshot import contest_rank_snapshot
+from contest.tests import DEFAULT_CONTEST_DATA
+from problem.models import Problem, UserProblemStatus
+from problem.tests import DEFAULT_PROBLEM_DATA
 from utils.api.tests import APIClient, APITestCase
 from utils.shortcuts import rand_str
 from options.options import SysOptions
 
-from .models import AdminType, ProblemPermission, User
+from .models import AdminType, ProblemPermission, User, UserProfile
+from .rank_index import user_rank_index
+from .serializers import UserProfileSerializer
 from utils.constants import ContestRuleType
 
 
@@ -260,6 +267,21 @@ class UserProfileAPITest(APITestCase):
         self.assertEqual(data["submission_number"], 0)
         self.assertEqual(data["language"], "en-US")
 
+    def test_problems_status_in_one_query(self):
+        admin = self.create_admin(login=False)
+        problem_data = dict(DEFAULT_PROBLEM_DATA, created_by=admin)
+        problem_data.pop("tags")
+        problem = Problem.objects.create(**problem_data)
+        for i in range(3):
+            user = self.create_user(f"user{i}", "test123", login=False)
+            UserProblemStatus.objects.create(user=user, problem=problem, status=i)
+
+        profiles = list(UserProfile.objects.filter(user__username__startswith="user").select_related("user"))
+        with self.assertNumQueries(1):
+            data = UserProfileSerializer(profiles, many=True).data
+        self.assertEqual(sorted(item["acm_problems_status"]["problems"][str(problem.id)]["status"] for item in data),
+                         [0, 1, 2])
+
 
 class TwoFactorAuthAPITest(APITestCase):
     def setUp(self):
@@ -444,6 +466,7 @@ class UserChangePasswordAPITest(APITestCase):
 
 class UserRankAPITest(APITestCase):
     def setUp(self):
+        user_rank_index.invalidate()
         self.url = self.reverse("user_rank_api")
         self.create_user("test1", "test123", login=False)
         self.create_user("test2", "test123", login=False)
@@ -491,6 +514,64 @@ class UserRankAPITest(APITestCase):
         self.assertSuccess(resp)
         self.assertEqual(len(resp.data["data"]), 2)
 
+    def tearDown(self):
+        user_rank_index.invalidate()
+
+    def test_cursor_paging(self):
+        test3 = self.create_user("test3", "test123")
+        UserProfile.objects.filter(user=test3).update(submission_number=5, accepted_number=5)
+        results, cursor = [], ""
+        while cursor is not None:
+            resp = self.client.get(self.url, data={"rule": ContestRuleType.ACM, "cursor": cursor, "limit": 2})
+            self.assertSuccess(resp)
+            data = resp.data["data"]
+            self.assertEqual(data["total"], 3)
+            self.assertEqual(data["my_rank"], 3)
+            results.extend((item["rank"], item["user"]["username"]) for item in data["results"])
+            cursor = data["next_cursor"]
+        self.assertEqual(results, [(1, "test1"), (2, "test2"), (3, "test3")])
+
+        # 游标用户的分数变化之后，仍然从游标中的分数之后开始
+        resp = self.client.get(self.url, data={"cursor": "", "limit": 1})
+        test1 = User.objects.get(username="test1")
+        UserProfile.objects.filter(user=test1).update(accepted_number=1)
+        user_rank_index.update_users([test1.id])
+        resp = self.client.get(self.url, data={"cursor": resp.data["data"]["next_cursor"], "limit": 10})
+        self.assertEqual([(item["rank"], item["user"]["username"]) for item in resp.data["data"]["results"]],
+                         [(1, "test2"), (2, "test3"), (3, "test1")])
+
+        resp = self.client.get(self.url, data={"cursor": "invalid"})
+        self.assertFailed(resp, "Invalid cursor")
+
+    def test_cursor_paging_with_same_score(self):
+        users = [self.create_user(f"same{i}", "test123", login=False) for i in range(5)]
+        UserProfile.objects.filter(user__in=users).update(submission_number=5, accepted_number=5)
+        resp = self.client.get(self.url, data={"cursor": "", "limit": 4})
+        first = [item["user"]["username"] for item in resp.data["data"]["results"]]
+        cursor = resp.data["data"]["next_cursor"]
+
+        # 游标用户从排行榜中移除之后，按游标中的 (分数, user id) 继续翻页，不会重复或者遗漏
+        User.objects.filter(username=first[-1]).update(is_disabled=True)
+        user_rank_index.update_users([User.objects.get(username=first[-1]).id])
+        resp = self.client.get(self.url, data={"cursor": cursor, "limit": 10})
+        data = resp.data["data"]
+        self.assertIsNone(data["next_cursor"])
+        self.assertEqual([item["rank"] for item in data["results"]], [4, 5, 6])
+        rest = [item["user"]["username"] for item in data["results"]]
+        self.assertEqual(sorted(first + rest), sorted(["test1", "test2"] + [user.username for user in users]))
+
+    def test_update_users(self):
+        test2 = User.objects.get(username="test2")
+        self.assertEqual(user_rank_index.rank_of(ContestRuleType.ACM, test2.id), 2)
+        UserProfile.objects.filter(user=test2).update(accepted_number=11)
+        user_rank_index.update_users([test2.id])
+        self.assertEqual(user_rank_index.rank_of(ContestRuleType.ACM, test2.id), 1)
+
+        User.objects.filter(id=test2.id).update(is_disabled=True)
+        user_rank_index.update_users([test2.id])
+        self.assertIsNone(user_rank_index.rank_of(ContestRuleType.OI, test2.id))
+        self.assertEqual(user_rank_index.page(ContestRuleType.ACM, 0, 10)[1], 1)
+
 
 class ProfileProblemDisplayIDRefreshAPITest(APITestCase):
     def setUp(self):
@@ -599,6 +680,26 @@ class AdminUserTest(APITestCase):
         self.assertSuccess(resp)
         self.assertEqual(User.objects.all().count(), 2)
 
+    def _contest_with_rank(self):
+        contest = Contest.objects.create(created_by=self.user, **dict(DEFAULT_CONTEST_DATA, password=None))
+        ACMContestRank.objects.create(user=self.regular_user, contest=contest, accepted_number=1)
+        self.addCleanup(contest_rank_snapshot.invalidate, contest.id)
+        # 先构建快照，用户的变化之后才需要丢弃它
+        self.assertEqual(contest_rank_snapshot.page(contest, False, 0, 10)[1], 1)
+        return contest
+
+    def test_disable_user_invalidates_rank_snapshot(self):
+        contest = self._contest_with_rank()
+        resp = self.client.put(self.url, data=dict(self.data, is_disabled=True))
+        self.assertSuccess(resp)
+        self.assertEqual(contest_rank_snapshot.page(contest, False, 0, 10)[1], 0)
+
+    def test_delete_user_invalidates_rank_snapshot(self):
+        contest = self._contest_with_rank()
+        resp = self.client.delete(self.url + "?id=" + str(self.regular_user.id))
+        self.assertSuccess(resp)
+        self.assertEqual(contest_rank_snapshot.page(contest, False, 0, 10)[1], 0)
+
 
 class GenerateUserAPITest(APITestCase):
     def setUp(self):
@@ -7,12 +7,15 @@ from django.db.models import Q
 from django.http import HttpResponse
 from django.contrib.auth.hashers import make_password
 
+from contest.rank_snapshot import contest_rank_snapshot
+from contest.scoreboard import contest_scoreboard
 from submission.models import Submission
 from utils.api import APIView, validate_serializer
 from utils.shortcuts import rand_str
 
 from ..decorators import super_admin_required
 from ..models import AdminType, ProblemPermission, User, UserProfile
+from ..rank_index import user_rank_index
 from ..serializers import EditUserSerializer, UserAdminSerializer, GenerateUserSerializer
 from ..serializers import ImportUserSeralizer
 
@@ -60,6 +63,7 @@ class UserAdminAPI(APIView):
             return self.error("Email already exists")
 
         pre_username = user.username
+        rank_changed = user.admin_type != data["admin_type"] or user.is_disabled != data["is_disabled"]
         user.username = data["username"].lower()
         user.email = data["email"].lower()
         user.admin_type = data["admin_type"]
@@ -97,6 +101,11 @@ class UserAdminAPI(APIView):
             Submission.objects.filter(username=pre_username).update(username=user.username)
 
         UserProfile.objects.filter(user=user).update(real_name=data["real_name"])
+        # 比赛排行榜只包含正常状态的普通用户
+        if rank_changed:
+            for contest_id in contest_scoreboard.invalidate_users([user.id]):
+                contest_rank_snapshot.invalidate(contest_id)
+            user_rank_index.update_users([user.id])
         return self.success(UserAdminSerializer(user).data)
 
     @super_admin_required
@@ -129,7 +138,12 @@ class UserAdminAPI(APIView):
         ids = id.split(",")
         if str(request.user.id) in ids:
             return self.error("Current user can not be deleted")
+        contest_ids = contest_scoreboard.invalidate_users(ids)
         User.objects.filter(id__in=ids).delete()
+        # 用户的排名在删除时一起被删除，删除之后再丢弃快照
+        for contest_id in contest_ids:
+            contest_rank_snapshot.invalidate(contest_id)
+        user_rank_index.update_users(ids)
         return self.success()
 
 
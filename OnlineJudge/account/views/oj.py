@@ -16,14 +16,14 @@ from django.utils.timezone import now
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
 from otpauth import OtpAuth
 
-from problem.models import Problem
 from utils.constants import ContestRuleType
 from options.options import SysOptions
 from utils.api import APIView, validate_serializer, CSRFExemptAPIView
 from utils.captcha import Captcha
 from utils.shortcuts import rand_str, img2base64, datetime2str
 from ..decorators import login_required
-from ..models import User, UserProfile, AdminType
+from ..models import User, UserProfile
+from ..rank_index import InvalidCursor, user_rank_index
 from ..serializers import (ApplyResetPasswordSerializer, ResetPasswordSerializer,
                            UserChangePasswordSerializer, UserLoginSerializer,
                            UserRegisterSerializer, UsernameOrEmailCheckSerializer,
@@ -455,31 +455,35 @@ class UserRankAPI(APIView):
         rule_type = request.GET.get("rule")
         if rule_type not in ContestRuleType.choices():
             rule_type = ContestRuleType.ACM
-        profiles = UserProfile.objects.filter(user__admin_type=AdminType.REGULAR_USER, user__is_disabled=False) \
-            .select_related("user")
-        if rule_type == ContestRuleType.ACM:
-            profiles = profiles.filter(submission_number__gt=0).order_by("-accepted_number", "submission_number")
-        else:
-            profiles = profiles.filter(total_score__gt=0).order_by("-total_score")
-        return self.success(self.paginate_data(request, profiles, RankInfoSerializer))
+        # 排名保存在 redis 中，传 cursor 参数时按游标翻页(第一页传空字符串)并返回当前用户的名次，否则按 offset 翻页
+        cursor = request.GET.get("cursor")
+        if cursor is None:
+            return self.success(self.paginate_data(request, user_rank_index.sequence(rule_type), RankInfoSerializer))
+        try:
+            limit = int(request.GET.get("limit", "10"))
+        except ValueError:
+            limit = 10
+        if limit <= 0 or limit > 250:
+            limit = 10
+        try:
+            results, next_cursor, total = user_rank_index.page_after(rule_type, cursor, limit)
+        except InvalidCursor:
+            return self.error("Invalid cursor")
+        items = []
+        for rank, profile in results:
+            item = RankInfoSerializer(profile).data
+            item["rank"] = rank
+            items.append(item)
+        data = {"results": items, "next_cursor": next_cursor, "total": total, "my_rank": None}
+        if request.user.is_authenticated:
+            data["my_rank"] = user_rank_index.rank_of(rule_type, request.user.id)
+        return self.success(data)
 
 
 class ProfileProblemDisplayIDRefreshAPI(APIView):
     @login_required
     def get(self, request):
-        profile = request.user.userprofile
-        acm_problems = profile.acm_problems_status.get("problems", {})
-        oi_problems = profile.oi_problems_status.get("problems", {})
-        ids = list(acm_problems.keys()) + list(oi_problems.keys())
-        if not ids:
-            return self.success()
-        display_ids = Problem.objects.filter(id__in=ids, visible=True).values_list("_id", flat=True)
-        id_map = dict(zip(ids, display_ids))
-        for k, v in acm_problems.items():
-            v["_id"] = id_map[k]
-        for k, v in oi_problems.items():
-            v["_id"] = id_map[k]
-        profile.save(update_fields=["acm_problems_status", "oi_problems_status"])
+        # 题目状态中的 display id 查询时从 Problem 中读取，不会过期，保留接口兼容前端
         return self.success()
 
 
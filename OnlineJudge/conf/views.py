@@ -16,7 +16,9 @@ from requests.exceptions import RequestException
 from account.decorators import super_admin_required
 from account.models import User
 from contest.models import Contest
+from judge.allocator import slot_allocator
 from judge.dispatcher import process_pending_task
+from judge.queue import waiting_queue
 from options.options import SysOptions
 from problem.models import Problem
 from submission.models import Submission
@@ -109,14 +111,23 @@ class JudgeServerAPI(APIView):
     @super_admin_required
     def get(self, request):
         servers = JudgeServer.objects.all().order_by("-last_heartbeat")
+        data = JudgeServerSerializer(servers, many=True).data
+        # task_number 由 redis 中的 lease 维护
+        usage = slot_allocator.usage([item["id"] for item in data])
+        for item in data:
+            item["task_number"] = usage[item["id"]]
         return self.success({"token": SysOptions.judge_server_token,
-                             "servers": JudgeServerSerializer(servers, many=True).data})
+                             "servers": data,
+                             "waiting_queue": waiting_queue.size()})
 
     @super_admin_required
     def delete(self, request):
         hostname = request.GET.get("hostname")
         if hostname:
-            JudgeServer.objects.filter(hostname=hostname).delete()
+            servers = JudgeServer.objects.filter(hostname=hostname)
+            for server_id in servers.values_list("id", flat=True):
+                slot_allocator.unregister(server_id)
+            servers.delete()
         return self.success()
 
     @validate_serializer(EditJudgeServerSerializer)
@@ -124,6 +135,8 @@ class JudgeServerAPI(APIView):
     def put(self, request):
         is_disabled = request.data.get("is_disabled", False)
         JudgeServer.objects.filter(id=request.data["id"]).update(is_disabled=is_disabled)
+        for server in JudgeServer.objects.filter(id=request.data["id"]):
+            slot_allocator.register(server)
         if not is_disabled:
             process_pending_task()
         return self.success()
@@ -148,15 +161,16 @@ class JudgeServerHeartbeatAPI(CSRFExemptAPIView):
             server.last_heartbeat = timezone.now()
             server.save(update_fields=["judger_version", "cpu_core", "memory_usage", "service_url", "ip", "last_heartbeat"])
         except JudgeServer.DoesNotExist:
-            JudgeServer.objects.create(hostname=data["hostname"],
-                                       judger_version=data["judger_version"],
-                                       cpu_core=data["cpu_core"],
-                                       memory_usage=data["memory"],
-                                       cpu_usage=data["cpu"],
-                                       ip=request.META["REMOTE_ADDR"],
-                                       service_url=data["service_url"],
-                                       last_heartbeat=timezone.now(),
-                                       )
+            server = JudgeServer.objects.create(hostname=data["hostname"],
+                                                judger_version=data["judger_version"],
+                                                cpu_core=data["cpu_core"],
+                                                memory_usage=data["memory"],
+                                                cpu_usage=data["cpu"],
+                                                ip=request.META["REMOTE_ADDR"],
+                                                service_url=data["service_url"],
+                                                last_heartbeat=timezone.now(),
+                                                )
+        slot_allocator.register(server)
         # 新server上线 处理队列中的，防止没有新的提交而导致一直waiting
         process_pending_task()
 
@@ -0,0 +1,118 @@
+from django.db import transaction
+
+from problem.models import Problem
+from submission.models import Submission
+from .models import ContestBestScore
+
+BATCH_SIZE = 1000
+# 与 micro-service-server 一致，judge server 返回的 result 为 0 即为通过
+ACCEPTED_RESULTS = {"0", "ac", "accepted", "success", "ok"}
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def case_scores(test_case_score):
+    """
+    :return: {测试点编号(从 1 开始): 分数}
+    """
+    ret = {}
+    for index, item in enumerate(test_case_score or [], start=1):
+        score = _to_int(item.get("score", 0)) if isinstance(item, dict) else None
+        ret[index] = max(score or 0, 0)
+    return ret
+
+
+def submission_partial(info, scores):
+    """
+    按测试点计算提交的部分分
+    :return: (score, passed, total)，没有测试点结果时 total 为 0
+    """
+    data = info.get("data") if isinstance(info, dict) else None
+    if not isinstance(data, list):
+        return 0, 0, 0
+    score = passed = 0
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        test_case = _to_int(item.get("test_case"))
+        if test_case is None:
+            continue
+        result = item.get("result")
+        if _to_int(result) == 0 or (isinstance(result, str) and result.strip().lower() in ACCEPTED_RESULTS):
+            passed += 1
+            score += scores.get(test_case, 0)
+    return score, passed, len(data)
+
+
+def collect_best_scores(submissions, problem_scores):
+    """
+    :param submissions: 按 create_time 排序的 (user_id, problem_id, info, create_time)
+    :param problem_scores: {problem_id: case_scores}
+    :return: {(user_id, problem_id): {"score", "passed", "total", "best_time"}}，分数相同时取最早的提交
+    """
+    best = {}
+    for user_id, problem_id, info, create_time in submissions:
+        if problem_id not in problem_scores:
+            continue
+        score, passed, total = submission_partial(info, problem_scores[problem_id])
+        if not total:
+            continue
+        item = best.get((user_id, problem_id))
+        if item is None or score > item["score"]:
+            best[(user_id, problem_id)] = {"score": score, "passed": passed, "total": total, "best_time": create_time}
+    return best
+
+
+def rebuild_best_scores(contest_id, user_ids=None, problem_ids=None):
+    """
+    从提交重新计算比赛的最好成绩，用于重判和数据回填
+    """
+    problems = Problem.objects.filter(contest_id=contest_id)
+    submissions = Submission.objects.filter(contest_id=contest_id)
+    rows = ContestBestScore.objects.filter(contest_id=contest_id)
+    if user_ids is not None:
+        submissions = submissions.filter(user_id__in=user_ids)
+        rows = rows.filter(user_id__in=user_ids)
+    if problem_ids is not None:
+        problems = problems.filter(id__in=problem_ids)
+        submissions = submissions.filter(problem_id__in=problem_ids)
+        rows = rows.filter(problem_id__in=problem_ids)
+
+    problem_scores = {problem_id: case_scores(test_case_score)
+                      for problem_id, test_case_score in problems.values_list("id", "test_case_score")}
+    submissions = submissions.order_by("create_time").values_list("user_id", "problem_id", "info", "create_time")
+    best = collect_best_scores(submissions.iterator(chunk_size=BATCH_SIZE), problem_scores)
+    with transaction.atomic():
+        rows.delete()
+        # 重建期间新评测完成的提交已经写入的行保留
+        ContestBestScore.objects.bulk_create([ContestBestScore(contest_id=contest_id, user_id=user_id,
+                                                               problem_id=problem_id, **item)
+                                              for (user_id, problem_id), item in best.items()],
+                                             batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def update_best_score(submission, problem):
+    """
+    评测结束之后调用，只在本次提交的分数更高时更新
+    """
+    score, passed, total = submission_partial(submission.info, case_scores(problem.test_case_score))
+    if not total:
+        return
+    lookup = {"contest_id": submission.contest_id, "user_id": submission.user_id, "problem_id": problem.id}
+    values = {"score": score, "passed": passed, "total": total, "best_time": submission.create_time}
+    with transaction.atomic():
+        row = ContestBestScore.objects.select_for_update().filter(**lookup).first()
+        if row is None:
+            row, created = ContestBestScore.objects.get_or_create(**lookup, defaults=values)
+            if created:
+                return
+            row = ContestBestScore.objects.select_for_update().get(**lookup)
+        if score > row.score or (score == row.score and submission.create_time < row.best_time):
+            for k, v in values.items():
+                setattr(row, k, v)
+            row.save(update_fields=list(values.keys()))
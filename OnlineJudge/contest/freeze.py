@@ -0,0 +1,94 @@
+import bisect
+
+from django.utils.timezone import now
+
+from problem.models import Problem
+from .models import Contest
+from .scoreboard import contest_scoreboard
+
+# ACM 罚时: 每次错误的提交 20 分钟
+PENALTY_TIME = 20 * 60
+
+
+def _sort_key(accepted_number, total_time, user_id):
+    return -accepted_number, total_time, user_id
+
+
+class ContestFreeze:
+    """
+    ACM 比赛封榜。
+    封榜之后公开的排名只统计封榜时间之前的提交，由排名快照保存，评测新的提交不需要重新计算；
+    比赛管理员仍然可以看到实时排名。
+    """
+    @staticmethod
+    def freeze_time(contest):
+        """
+        非实时排名的比赛没有设置封榜时间(或者封榜时间还没到)时，以第一次生成快照的时间作为封榜时间并保存下来，
+        之后再生成的快照都相同
+        """
+        if contest.freeze_time is None or (not contest.real_time_rank and contest.freeze_time > now()):
+            Contest.objects.filter(id=contest.id, freeze_time=contest.freeze_time).update(freeze_time=now())
+            contest.freeze_time = Contest.objects.values_list("freeze_time", flat=True).get(id=contest.id)
+        return contest.freeze_time
+
+    def frozen_ranks(self, contest):
+        """
+        封榜时的排名，返回没有保存的 ACMContestRank，顺序与排行榜一致
+        """
+        # rejudge 依赖 rank_snapshot，放在这里导入避免循环导入
+        from judge.rejudge import replay_contest_rank
+
+        replayed = replay_contest_rank(contest, until=self.freeze_time(contest))
+        ranks = list(contest_scoreboard.ranks(contest).select_related("user", "user__userprofile"))
+        for rank in ranks:
+            data = replayed.get(rank.user_id, {"submission_number": 0, "accepted_number": 0, "total_time": 0,
+                                               "submission_info": {}})
+            for k, v in data.items():
+                setattr(rank, k, v)
+        ranks.sort(key=lambda rank: _sort_key(rank.accepted_number, rank.total_time, rank.user_id))
+        return ranks
+
+    def replay_events(self, contest):
+        """
+        颁奖时揭晓封榜之后的提交: 每次选择排名最靠后、还有没揭晓题目的用户，按题目顺序揭晓其中的一道题，
+        直到排名与实时排名一致
+        :return: 揭晓事件的列表，rank 从 1 开始
+        """
+        problem_ids = [str(problem_id) for problem_id in
+                       Problem.objects.filter(contest=contest).order_by("_id").values_list("id", flat=True)]
+        live = {rank.user_id: rank for rank in contest_scoreboard.ranks(contest)}
+        frozen = self.frozen_ranks(contest)
+
+        state, pending = {}, {}
+        for rank in frozen:
+            live_info = live[rank.user_id].submission_info
+            state[rank.user_id] = [rank.accepted_number, rank.total_time]
+            pending[rank.user_id] = [problem_id for problem_id in problem_ids
+                                     if live_info.get(problem_id) != rank.submission_info.get(problem_id)]
+        order = [_sort_key(rank.accepted_number, rank.total_time, rank.user_id) for rank in frozen]
+
+        events = []
+        index = len(order) - 1
+        while index >= 0:
+            user_id = order[index][2]
+            if not pending[user_id]:
+                index -= 1
+                continue
+            problem_id = pending[user_id].pop(0)
+            info = live[user_id].submission_info[problem_id]
+            if info["is_ac"]:
+                state[user_id][0] += 1
+                state[user_id][1] += info["ac_time"] + info["error_number"] * PENALTY_TIME
+            # 揭晓只会让名次上升，index 处换成了原来排在前面的用户，不需要移动 index
+            del order[index]
+            key = _sort_key(*state[user_id], user_id)
+            rank_after = bisect.bisect_left(order, key)
+            order.insert(rank_after, key)
+            events.append({"user_id": user_id, "problem_id": int(problem_id),
+                           "is_ac": info["is_ac"], "error_number": info["error_number"], "ac_time": info["ac_time"],
+                           "rank_before": index + 1, "rank_after": rank_after + 1,
+                           "accepted_number": state[user_id][0], "total_time": state[user_id][1]})
+        return events
+
+
+contest_freeze = ContestFreeze()
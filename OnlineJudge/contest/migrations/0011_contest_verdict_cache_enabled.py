@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0010_auto_20190326_0201'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='verdict_cache_enabled',
+            field=models.BooleanField(default=True),
+        ),
+        # micro-service-server also inserts contests and does not know this column
+        migrations.RunSQL(
+            "ALTER TABLE contest ALTER COLUMN verdict_cache_enabled SET DEFAULT true",
+            "ALTER TABLE contest ALTER COLUMN verdict_cache_enabled DROP DEFAULT",
+        ),
+    ]
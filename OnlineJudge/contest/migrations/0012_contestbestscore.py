@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def backfill_best_scores(apps, schema_editor):
+    from contest.best_score import case_scores, collect_best_scores
+
+    Problem = apps.get_model("problem", "Problem")
+    Submission = apps.get_model("submission", "Submission")
+    ContestBestScore = apps.get_model("contest", "ContestBestScore")
+
+    problems = Problem.objects.filter(contest_id__isnull=False).values_list("contest_id", "id", "test_case_score")
+    contest_problems = {}
+    for contest_id, problem_id, test_case_score in problems:
+        contest_problems.setdefault(contest_id, {})[problem_id] = case_scores(test_case_score)
+    for contest_id, problem_scores in contest_problems.items():
+        submissions = Submission.objects.filter(contest_id=contest_id).order_by("create_time") \
+            .values_list("user_id", "problem_id", "info", "create_time")
+        best = collect_best_scores(submissions.iterator(chunk_size=BATCH_SIZE), problem_scores)
+        ContestBestScore.objects.bulk_create([ContestBestScore(contest_id=contest_id, user_id=user_id,
+                                                               problem_id=problem_id, **item)
+                                              for (user_id, problem_id), item in best.items()],
+                                             batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0011_contest_verdict_cache_enabled'),
+        ('problem', '0015_userproblemstatus'),
+        ('submission', '0012_auto_20180501_0436'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContestBestScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('score', models.IntegerField(default=0)),
+                ('passed', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('best_time', models.DateTimeField()),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contest.contest')),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='problem.problem')),
+            ],
+            options={
+                'db_table': 'contest_best_score',
+                'unique_together': {('contest', 'user_id', 'problem')},
+            },
+        ),
+        migrations.RunPython(backfill_best_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0013_contest_freeze_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContestRankEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('time', models.IntegerField()),
+                ('accepted_number', models.IntegerField(default=0)),
+                ('total_time', models.IntegerField(default=0)),
+                ('total_score', models.IntegerField(default=0)),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contest.contest')),
+            ],
+            options={
+                'db_table': 'contest_rank_event',
+                'index_together': {('contest', 'time')},
+            },
+        ),
+    ]
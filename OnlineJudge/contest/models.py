@@ -24,6 +24,10 @@ class Contest(models.Model):
     # 是否可见 false的话相当于删除
     visible = models.BooleanField(default=True)
     allowed_ip_ranges = JSONField(default=list)
+    # 相同代码重复提交时是否复用之前的评测结果
+    verdict_cache_enabled = models.BooleanField(default=True)
+    # 封榜时间，之后的提交不计入公开的排名；为空并且不是实时排名时以第一次生成排名快照的时间为准
+    freeze_time = models.DateTimeField(null=True)
 
     @property
     def status(self):
@@ -43,6 +47,15 @@ class Contest(models.Model):
             return ContestType.PASSWORD_PROTECTED_CONTEST
         return ContestType.PUBLIC_CONTEST
 
+    @property
+    def rank_frozen(self):
+        # OI 比赛总是实时排名
+        if self.rule_type != ContestRuleType.ACM:
+            return False
+        if not self.real_time_rank:
+            return True
+        return self.freeze_time is not None and self.freeze_time <= now()
+
     # 是否有权查看problem 的一些统计信息 诸如submission_number, accepted_number 等
     def problem_details_permission(self, user):
         return self.rule_type == ContestRuleType.ACM or \
@@ -88,6 +101,43 @@ class OIContestRank(AbstractContestRank):
         unique_together = (("user", "contest"),)
 
 
+class ContestBestScore(models.Model):
+    """
+    每个用户在比赛中每道题的最好成绩(按测试点计算的部分分)，评测结束之后更新，
+    micro-service-server 的排名、成绩导出和比赛进度直接读取，不再扫描全部提交
+    """
+    contest = models.ForeignKey(Contest, on_delete=models.CASCADE)
+    # 与 Submission.user_id 一致，不使用外键
+    user_id = models.IntegerField()
+    problem = models.ForeignKey("problem.Problem", on_delete=models.CASCADE)
+    score = models.IntegerField(default=0)
+    passed = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    # 第一次得到这个分数的提交时间
+    best_time = models.DateTimeField()
+
+    class Meta:
+        db_table = "contest_best_score"
+        unique_together = (("contest", "user_id", "problem"),)
+
+
+class ContestRankEvent(models.Model):
+    """
+    比赛中用户排名依据的变化，评测之后 AC 数和罚时(OI 为总分)变化时记录一条，用于生成排名随时间变化的曲线
+    """
+    contest = models.ForeignKey(Contest, on_delete=models.CASCADE)
+    user_id = models.IntegerField()
+    # 提交时间距离比赛开始的秒数
+    time = models.IntegerField()
+    accepted_number = models.IntegerField(default=0)
+    total_time = models.IntegerField(default=0)
+    total_score = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "contest_rank_event"
+        index_together = (("contest", "time"),)
+
+
 class ContestAnnouncement(models.Model):
     contest = models.ForeignKey(Contest, on_delete=models.CASCADE)
     title = models.TextField()
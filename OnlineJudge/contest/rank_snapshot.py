@@ -0,0 +1,159 @@
+import json
+
+from utils.cache import cache
+from utils.constants import CacheKey, ContestRuleType
+from .freeze import contest_freeze
+from .scoreboard import contest_scoreboard
+from .serializers import ACMContestRankSerializer, OIContestRankSerializer
+
+# 每个 chunk 保存的排名条数，一页最多 250 条，最多读取 6 个 chunk
+CHUNK_SIZE = 50
+BUILD_LOCK_TIMEOUT = 60
+
+TOTAL_FIELD = "total"
+VERSION_FIELD = "version"
+ADMIN_VARIANT = "admin"
+PUBLIC_VARIANT = "public"
+
+# 构建期间快照被 invalidate 过(版本号变化)，丢弃构建结果，否则原子地替换为新快照
+#
+# KEYS[1]: 版本号, KEYS[2]: 构建中的 hash, KEYS[3]: 快照 hash
+# ARGV[1]: 开始构建时的版本号
+PUBLISH_SCRIPT = """
+if (redis.call("GET", KEYS[1]) or "0") == ARGV[1] then
+    redis.call("RENAME", KEYS[2], KEYS[3])
+    return 1
+end
+redis.call("DEL", KEYS[2])
+return 0
+"""
+
+
+class ContestRankSnapshot:
+    """
+    封榜的比赛返回的是排名快照，只包含封榜之前的提交，封榜期间的评测不会改变快照。
+    快照中保存序列化之后的 json，每个比赛一个 hash，field 为 "<admin|public>:<chunk 序号>"，
+    读取一页只需要一次 HMGET，不需要查询数据库和序列化。
+    is_contest_admin 会影响输出(是否包含真实姓名)，所以两种结果分别保存。
+    """
+    def __init__(self, redis_conn=cache):
+        self._redis_conn = redis_conn
+        self._publish_script = None
+
+    @staticmethod
+    def _key(contest_id):
+        return f"{CacheKey.contest_rank_cache}:{contest_id}"
+
+    @staticmethod
+    def _version_key(contest_id):
+        return f"{CacheKey.contest_rank_cache_version}:{contest_id}"
+
+    @staticmethod
+    def _field(is_contest_admin, chunk):
+        return f"{ADMIN_VARIANT if is_contest_admin else PUBLIC_VARIANT}:{chunk}"
+
+    @staticmethod
+    def _serialize(contest, ranks, is_contest_admin):
+        if contest.rule_type == ContestRuleType.OI:
+            serializer = OIContestRankSerializer
+        else:
+            serializer = ACMContestRankSerializer
+        return serializer(ranks, many=True, is_contest_admin=is_contest_admin).data
+
+    def build(self, contest):
+        """
+        :return: {is_contest_admin: 序列化之后的全部排名}
+        """
+        contest_id = contest.id
+        version = int(self._redis_conn.get(self._version_key(contest_id)) or 0)
+        if contest.rank_frozen:
+            ranks = contest_freeze.frozen_ranks(contest)
+        else:
+            ranks = list(contest_scoreboard.ordered_ranks(contest))
+        rows = {is_contest_admin: self._serialize(contest, ranks, is_contest_admin) for is_contest_admin in (False, True)}
+
+        mapping = {TOTAL_FIELD: len(ranks), VERSION_FIELD: version}
+        for is_contest_admin, items in rows.items():
+            for i in range(0, len(items), CHUNK_SIZE):
+                mapping[self._field(is_contest_admin, i // CHUNK_SIZE)] = json.dumps(items[i:i + CHUNK_SIZE])
+        building_key = f"{self._key(contest_id)}:{version}"
+        pipe = self._redis_conn.pipeline()
+        pipe.delete(building_key)
+        pipe.hset(building_key, mapping=mapping)
+        pipe.execute()
+        if self._publish_script is None:
+            self._publish_script = self._redis_conn.register_script(PUBLISH_SCRIPT)
+        self._publish_script(keys=[self._version_key(contest_id), building_key, self._key(contest_id)],
+                             args=[version])
+        return rows
+
+    def _build_once(self, contest):
+        # 同一个比赛同时只有一个请求构建快照，其他请求等待之后直接读取
+        lock = self._redis_conn.lock(f"{CacheKey.contest_rank_cache_lock}:{contest.id}",
+                                     timeout=BUILD_LOCK_TIMEOUT, blocking_timeout=BUILD_LOCK_TIMEOUT)
+        with lock:
+            if not self._redis_conn.exists(self._key(contest.id)):
+                return self.build(contest)
+        return None
+
+    def page(self, contest, is_contest_admin, offset, limit):
+        """
+        :return: (当前页序列化之后的排名, 总人数)
+        """
+        fields = [TOTAL_FIELD]
+        if limit > 0:
+            fields += [self._field(is_contest_admin, chunk)
+                       for chunk in range(offset // CHUNK_SIZE, (offset + limit - 1) // CHUNK_SIZE + 1)]
+        values = self._redis_conn.hmget(self._key(contest.id), fields)
+        if values[0] is None:
+            rows = self._build_once(contest)
+            if rows is not None:
+                items = rows[is_contest_admin]
+                return items[offset:offset + limit] if limit > 0 else [], len(items)
+            values = self._redis_conn.hmget(self._key(contest.id), fields)
+        items = []
+        for value in values[1:]:
+            if value is None:
+                break
+            items.extend(json.loads(value))
+        start = offset % CHUNK_SIZE
+        return items[start:start + limit], int(values[0] or 0)
+
+    def rows(self, contest, is_contest_admin):
+        """
+        快照中的全部排名，用于导出
+        """
+        _, total = self.page(contest, is_contest_admin, 0, 0)
+        if not total:
+            return []
+        return self.page(contest, is_contest_admin, 0, total)[0]
+
+    def invalidate(self, contest_id):
+        pipe = self._redis_conn.pipeline()
+        pipe.incr(self._version_key(contest_id))
+        pipe.delete(self._key(contest_id))
+        pipe.execute()
+
+
+class RankSnapshotSequence:
+    """
+    可以直接传给 APIView.paginate_data 的快照序列，只支持切片
+    """
+    def __init__(self, contest, is_contest_admin, snapshot=None):
+        self._snapshot = snapshot or contest_rank_snapshot
+        self._contest = contest
+        self._is_contest_admin = is_contest_admin
+        self._total = None
+
+    def __getitem__(self, item):
+        rows, self._total = self._snapshot.page(self._contest, self._is_contest_admin,
+                                                item.start, item.stop - item.start)
+        return rows
+
+    def count(self):
+        if self._total is None:
+            _, self._total = self._snapshot.page(self._contest, self._is_contest_admin, 0, 0)
+        return self._total
+
+
+contest_rank_snapshot = ContestRankSnapshot()
@@ -0,0 +1,143 @@
+from django.db import transaction
+
+from account.models import AdminType
+from utils.cache import cache
+from utils.constants import CacheKey, ContestRuleType
+from .models import ACMContestRank, OIContestRank
+
+# ACM 的分数为 accepted_number * ACM_SCORE_BASE - total_time，罚时(秒)不会超过 ACM_SCORE_BASE
+ACM_SCORE_BASE = 10 ** 10
+BUILD_BATCH_SIZE = 1000
+
+# 排行榜还没有构建时不写入，否则会变成只有一个用户的排行榜
+#
+# KEYS[1]: 排行榜, ARGV[1]: user id, ARGV[2]: score
+UPDATE_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    redis.call("ZADD", KEYS[1], ARGV[2], ARGV[1])
+end
+"""
+
+
+class ContestScoreboard:
+    """
+    比赛排名保存在 redis sorted set 中，member 为 user_id。
+    每次评测之后只更新这一个用户的分数，查询某一页和某个用户的名次都是 O(log n)。
+    第一次查询时从数据库构建，与 ContestRankAPI 一致只包含正常状态的普通用户。
+    """
+    def __init__(self, redis_conn=cache):
+        self._redis_conn = redis_conn
+        self._update_script = None
+
+    @staticmethod
+    def _key(contest_id):
+        return f"{CacheKey.contest_scoreboard}:{contest_id}"
+
+    @staticmethod
+    def rank_model(contest):
+        return ACMContestRank if contest.rule_type == ContestRuleType.ACM else OIContestRank
+
+    @staticmethod
+    def score(contest, rank):
+        if contest.rule_type == ContestRuleType.ACM:
+            return rank.accepted_number * ACM_SCORE_BASE - rank.total_time
+        return rank.total_score
+
+    def ranks(self, contest):
+        return self.rank_model(contest).objects.filter(contest=contest,
+                                                       user__admin_type=AdminType.REGULAR_USER,
+                                                       user__is_disabled=False)
+
+    def ordered_ranks(self, contest):
+        qs = self.ranks(contest).select_related("user", "user__userprofile")
+        if contest.rule_type == ContestRuleType.ACM:
+            return qs.order_by("-accepted_number", "total_time")
+        return qs.order_by("-total_score")
+
+    def update(self, contest, rank):
+        """
+        在更新 rank 的事务中调用，同一个用户的更新由 rank 的行锁保证顺序
+        """
+        key = self._key(contest.id)
+        if rank.user.admin_type != AdminType.REGULAR_USER or rank.user.is_disabled:
+            self._redis_conn.zrem(key, rank.user_id)
+            return
+        if self._update_script is None:
+            self._update_script = self._redis_conn.register_script(UPDATE_SCRIPT)
+        self._update_script(keys=[key], args=[rank.user_id, self.score(contest, rank)])
+
+    def _ensure(self, contest):
+        key = self._key(contest.id)
+        if self._redis_conn.exists(key):
+            return
+        with transaction.atomic():
+            # 锁住全部排名，构建期间的评测等构建完成之后再写入，不会被旧数据覆盖
+            ranks = list(self.ranks(contest).select_for_update(of=("self",)))
+            pipe = self._redis_conn.pipeline()
+            pipe.delete(key)
+            for i in range(0, len(ranks), BUILD_BATCH_SIZE):
+                pipe.zadd(key, {rank.user_id: self.score(contest, rank) for rank in ranks[i:i + BUILD_BATCH_SIZE]})
+            pipe.execute()
+
+    def page(self, contest, offset, limit):
+        """
+        :return: (当前页按名次排列的 rank 列表, 总人数)
+        """
+        self._ensure(contest)
+        key = self._key(contest.id)
+        if limit <= 0:
+            return [], self._redis_conn.zcard(key)
+        pipe = self._redis_conn.pipeline()
+        pipe.zrevrange(key, offset, offset + limit - 1)
+        pipe.zcard(key)
+        user_ids, total = pipe.execute()
+        user_ids = [int(user_id) for user_id in user_ids]
+        ranks = {rank.user_id: rank for rank in self.ranks(contest).select_related("user").filter(user_id__in=user_ids)}
+        return [ranks[user_id] for user_id in user_ids if user_id in ranks], total
+
+    def sequence(self, contest):
+        return ScoreboardSequence(self, contest)
+
+    def rank_of(self, contest, user_id):
+        """
+        :return: 从 1 开始的名次，不在排行榜中返回 None
+        """
+        self._ensure(contest)
+        rank = self._redis_conn.zrevrank(self._key(contest.id), user_id)
+        return None if rank is None else rank + 1
+
+    def invalidate(self, contest_ids):
+        if contest_ids:
+            self._redis_conn.delete_many([self._key(contest_id) for contest_id in contest_ids])
+
+    def invalidate_users(self, user_ids):
+        """
+        用户被禁用、修改权限或者删除之后，重新构建参加过的比赛的排行榜，返回这些比赛的 id
+        """
+        contest_ids = set()
+        for model in (ACMContestRank, OIContestRank):
+            contest_ids.update(model.objects.filter(user_id__in=user_ids).values_list("contest_id", flat=True))
+        self.invalidate(contest_ids)
+        return contest_ids
+
+
+class ScoreboardSequence:
+    """
+    可以直接传给 APIView.paginate_data 的排名序列，只支持切片
+    """
+    def __init__(self, scoreboard, contest):
+        self._scoreboard = scoreboard
+        self._contest = contest
+        self._total = None
+
+    def __getitem__(self, item):
+        ranks, self._total = self._scoreboard.page(self._contest, item.start, item.stop - item.start)
+        return ranks
+
+    def count(self):
+        if self._total is None:
+            _, self._total = self._scoreboard.page(self._contest, 0, 0)
+        return self._total
+
+
+contest_scoreboard = ContestScoreboard()
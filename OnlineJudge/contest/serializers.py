@@ -14,6 +14,8 @@ class CreateConetestSeriaizer(serializers.Serializer):
     visible = serializers.BooleanField()
     real_time_rank = serializers.BooleanField()
     allowed_ip_ranges = serializers.ListField(child=serializers.CharField(max_length=32), allow_empty=True)
+    verdict_cache_enabled = serializers.BooleanField(default=True)
+    freeze_time = serializers.DateTimeField(required=False, allow_null=True)
 
 
 class EditConetestSeriaizer(serializers.Serializer):
@@ -26,6 +28,8 @@ class EditConetestSeriaizer(serializers.Serializer):
     visible = serializers.BooleanField()
     real_time_rank = serializers.BooleanField()
     allowed_ip_ranges = serializers.ListField(child=serializers.CharField(max_length=32))
+    verdict_cache_enabled = serializers.BooleanField(required=False)
+    freeze_time = serializers.DateTimeField(required=False, allow_null=True)
 
 
 class ContestAdminSerializer(serializers.ModelSerializer):
@@ -1,11 +1,23 @@
 import copy
+import io
+import zipfile
 from datetime import datetime, timedelta
+from unittest import mock
 
 from django.utils import timezone
 
+from judge.rejudge import rebuild_contest_rank
+from problem.models import Problem
+from submission.models import JudgeStatus, Submission
+from submission.tests import DEFAULT_PROBLEM_DATA, DEFAULT_SUBMISSION_DATA, SubmissionPrepare
 from utils.api.tests import APITestCase
 
-from .models import ContestAnnouncement, ContestRuleType, Contest
+from .models import (ACMContestRank, ContestAnnouncement, ContestBestScore, ContestRankEvent, ContestRuleType,
+                     Contest, OIContestRank)
+from . import rank_snapshot
+from .best_score import rebuild_best_scores, submission_partial, update_best_score
+from .rank_snapshot import contest_rank_snapshot
+from .scoreboard import contest_scoreboard
 
 DEFAULT_CONTEST_DATA = {"title": "test title", "description": "test description",
                         "start_time": timezone.localtime(timezone.now()),
@@ -160,3 +172,382 @@ class ContestRankAPITest(APITestCase):
     def get_contest_rank(self):
         resp = self.client.get(self.url + "?contest_id=" + self.acm_contest.id)
         self.assertSuccess(resp)
+
+
+class ContestScoreboardTest(APITestCase):
+    def setUp(self):
+        admin = self.create_admin()
+        data = copy.deepcopy(DEFAULT_CONTEST_DATA)
+        data["password"] = None
+        self.contest = Contest.objects.create(created_by=admin, **data)
+        data["rule_type"] = ContestRuleType.OI
+        self.oi_contest = Contest.objects.create(created_by=admin, **data)
+        contest_scoreboard.invalidate([self.contest.id, self.oi_contest.id])
+        self.users = [self.create_user(f"user{i}", "test123", login=False) for i in range(3)]
+        self.url = self.reverse("contest_rank_api")
+
+    def tearDown(self):
+        contest_scoreboard.invalidate([self.contest.id, self.oi_contest.id])
+
+    def create_ranks(self):
+        # user1 通过题数最多，user0 和 user2 通过题数相同，user2 罚时更少
+        ranks = []
+        for user, accepted_number, total_time in zip(self.users, (1, 2, 1), (300, 500, 100)):
+            ranks.append(ACMContestRank.objects.create(user=user, contest=self.contest,
+                                                       accepted_number=accepted_number, total_time=total_time))
+        return ranks
+
+    def test_build_from_database(self):
+        self.create_ranks()
+        ranks, total = contest_scoreboard.page(self.contest, 0, 10)
+        self.assertEqual(total, 3)
+        self.assertEqual([rank.user.username for rank in ranks], ["user1", "user2", "user0"])
+        self.assertEqual(contest_scoreboard.rank_of(self.contest, self.users[0].id), 3)
+
+    def test_update(self):
+        ranks = self.create_ranks()
+        contest_scoreboard.page(self.contest, 0, 10)
+        ranks[0].accepted_number = 3
+        ranks[0].save()
+        contest_scoreboard.update(self.contest, ranks[0])
+        self.assertEqual(contest_scoreboard.rank_of(self.contest, self.users[0].id), 1)
+        ranks, total = contest_scoreboard.page(self.contest, 1, 1)
+        self.assertEqual(total, 3)
+        self.assertEqual(ranks[0].user_id, self.users[1].id)
+
+    def test_update_before_build(self):
+        ranks = self.create_ranks()
+        contest_scoreboard.update(self.contest, ranks[0])
+        # 没有构建过的排行榜不会只写入一个用户
+        _, total = contest_scoreboard.page(self.contest, 0, 10)
+        self.assertEqual(total, 3)
+
+    def test_disabled_user(self):
+        self.create_ranks()
+        contest_scoreboard.page(self.contest, 0, 10)
+        self.users[1].is_disabled = True
+        self.users[1].save()
+        contest_scoreboard.invalidate_users([self.users[1].id])
+        self.assertIsNone(contest_scoreboard.rank_of(self.contest, self.users[1].id))
+        self.assertEqual(contest_scoreboard.rank_of(self.contest, self.users[2].id), 1)
+
+    def test_oi_scoreboard(self):
+        for user, total_score in zip(self.users, (100, 300, 200)):
+            OIContestRank.objects.create(user=user, contest=self.oi_contest, total_score=total_score)
+        ranks, _ = contest_scoreboard.page(self.oi_contest, 0, 10)
+        self.assertEqual([rank.total_score for rank in ranks], [300, 200, 100])
+
+    def test_rank_api(self):
+        self.create_ranks()
+        self.client.login(username="user0", password="test123")
+        resp = self.client.get(self.url, data={"contest_id": self.contest.id, "limit": 2, "offset": 0})
+        self.assertSuccess(resp)
+        data = resp.data["data"]
+        self.assertEqual(data["total"], 3)
+        self.assertEqual([item["user"]["username"] for item in data["results"]], ["user1", "user2"])
+        self.assertEqual(data["my_rank"], 3)
+
+    def test_force_refresh(self):
+        self.addCleanup(contest_rank_snapshot.invalidate, self.contest.id)
+        ranks = self.create_ranks()
+        contest_scoreboard.page(self.contest, 0, 10)
+        contest_rank_snapshot.build(self.contest)
+        # 直接修改数据库，排行榜中还是旧的排名
+        ACMContestRank.objects.filter(id=ranks[0].id).update(accepted_number=3)
+        params = {"contest_id": self.contest.id, "limit": 1, "offset": 0, "force_refresh": "1"}
+
+        # 普通用户不能强制刷新
+        self.client.login(username="user0", password="test123")
+        resp = self.client.get(self.url, data=params)
+        self.assertEqual(resp.data["data"]["results"][0]["user"]["username"], "user1")
+
+        self.client.login(username="admin", password="admin")
+        resp = self.client.get(self.url, data=params)
+        self.assertEqual(resp.data["data"]["results"][0]["user"]["username"], "user0")
+        self.assertFalse(contest_rank_snapshot._redis_conn.exists(contest_rank_snapshot._key(self.contest.id)))
+
+
+class ContestRankSnapshotTest(APITestCase):
+    def setUp(self):
+        admin = self.create_admin()
+        data = copy.deepcopy(DEFAULT_CONTEST_DATA)
+        data["password"] = None
+        self.contest = Contest.objects.create(created_by=admin, **data)
+        contest_rank_snapshot.invalidate(self.contest.id)
+        self.users = []
+        for i in range(5):
+            user = self.create_user(f"user{i}", "test123", login=False)
+            user.userprofile.real_name = f"real name {i}"
+            user.userprofile.save()
+            ACMContestRank.objects.create(user=user, contest=self.contest, accepted_number=i)
+            self.users.append(user)
+        self.url = self.reverse("contest_rank_api")
+
+    def tearDown(self):
+        contest_rank_snapshot.invalidate(self.contest.id)
+
+    def test_page(self):
+        rows, total = contest_rank_snapshot.page(self.contest, False, 1, 2)
+        self.assertEqual(total, 5)
+        self.assertEqual([row["user"]["username"] for row in rows], ["user3", "user2"])
+        self.assertIsNone(rows[0]["user"]["real_name"])
+
+        rows, _ = contest_rank_snapshot.page(self.contest, True, 0, 1)
+        self.assertEqual(rows[0]["user"]["real_name"], "real name 4")
+
+    @mock.patch.object(rank_snapshot, "CHUNK_SIZE", 2)
+    def test_page_across_chunks(self):
+        contest_rank_snapshot.build(self.contest)
+        rows, total = contest_rank_snapshot.page(self.contest, False, 1, 3)
+        self.assertEqual(total, 5)
+        self.assertEqual([row["user"]["username"] for row in rows], ["user3", "user2", "user1"])
+        self.assertEqual(len(contest_rank_snapshot.rows(self.contest, False)), 5)
+
+    def test_snapshot_is_frozen_until_invalidated(self):
+        contest_rank_snapshot.page(self.contest, False, 0, 10)
+        ACMContestRank.objects.filter(user=self.users[0]).update(accepted_number=10)
+        rows, _ = contest_rank_snapshot.page(self.contest, False, 0, 1)
+        self.assertEqual(rows[0]["user"]["username"], "user4")
+
+        contest_rank_snapshot.invalidate(self.contest.id)
+        rows, _ = contest_rank_snapshot.page(self.contest, False, 0, 1)
+        self.assertEqual(rows[0]["user"]["username"], "user0")
+
+    def test_discard_stale_build(self):
+        ordered_ranks = contest_scoreboard.ordered_ranks
+
+        def invalidate_during_build(contest):
+            contest_rank_snapshot.invalidate(contest.id)
+            return ordered_ranks(contest)
+
+        with mock.patch.object(contest_scoreboard, "ordered_ranks", side_effect=invalidate_during_build):
+            contest_rank_snapshot.build(self.contest)
+        self.assertFalse(contest_rank_snapshot._redis_conn.exists(contest_rank_snapshot._key(self.contest.id)))
+
+
+class ContestFreezeTest(APITestCase):
+    def setUp(self):
+        self.admin = self.create_admin()
+        start_time = timezone.now() - timedelta(hours=2)
+        data = dict(DEFAULT_CONTEST_DATA, password=None, start_time=start_time,
+                    end_time=start_time + timedelta(hours=3), freeze_time=start_time + timedelta(hours=1))
+        self.contest = Contest.objects.create(created_by=self.admin, **data)
+        contest_rank_snapshot.invalidate(self.contest.id)
+        self.problems = []
+        for display_id in ("A", "B"):
+            problem_data = dict(DEFAULT_PROBLEM_DATA, _id=display_id, contest=self.contest, created_by=self.admin)
+            problem_data.pop("tags")
+            self.problems.append(Problem.objects.create(**problem_data))
+        self.users = [self.create_user(f"user{i}", "test123", login=False) for i in range(3)]
+
+        # 封榜前 user0 和 user1 各过了 A，封榜后 user1 过了 B，user2 过了 A 和 B
+        for user, problem, result, minutes in [(0, 0, JudgeStatus.ACCEPTED, 10),
+                                               (1, 0, JudgeStatus.ACCEPTED, 20),
+                                               (2, 0, JudgeStatus.WRONG_ANSWER, 30),
+                                               (1, 1, JudgeStatus.WRONG_ANSWER, 70),
+                                               (1, 1, JudgeStatus.ACCEPTED, 80),
+                                               (2, 0, JudgeStatus.ACCEPTED, 90),
+                                               (2, 1, JudgeStatus.ACCEPTED, 100)]:
+            submission = Submission.objects.create(**dict(DEFAULT_SUBMISSION_DATA, problem_id=self.problems[problem].id,
+                                                          user_id=self.users[user].id, contest=self.contest,
+                                                          username=self.users[user].username, result=result))
+            Submission.objects.filter(id=submission.id).update(create_time=start_time + timedelta(minutes=minutes))
+        rebuild_contest_rank(self.contest)
+        self.url = self.reverse("contest_rank_api")
+
+    def tearDown(self):
+        contest_rank_snapshot.invalidate(self.contest.id)
+        contest_scoreboard.invalidate([self.contest.id])
+
+    def _usernames(self, **params):
+        resp = self.client.get(self.url, data=dict(contest_id=self.contest.id, limit=10, offset=0, **params))
+        self.assertSuccess(resp)
+        return [(item["user"]["username"], item["accepted_number"]) for item in resp.data["data"]["results"]]
+
+    def test_rank_api(self):
+        self.client.login(username="user0", password="test123")
+        self.assertEqual(self._usernames(), [("user0", 1), ("user1", 1), ("user2", 0)])
+
+        # 比赛管理员看到实时排名
+        self.client.login(username="admin", password="admin")
+        self.assertEqual(self._usernames(), [("user1", 2), ("user2", 2), ("user0", 1)])
+        self.assertEqual(self._usernames(frozen="1"), [("user0", 1), ("user1", 1), ("user2", 0)])
+
+    def test_download_rank(self):
+        # 不可见的题目没有对应的列
+        Problem.objects.filter(id=self.problems[1].id).update(visible=False)
+        self.client.login(username="admin", password="admin")
+        resp = self.client.get(self.url, data={"contest_id": self.contest.id, "download_csv": "1"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/xlsx")
+        self.assertTrue(resp.streaming)
+        with zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content))) as f:
+            sheet = f.read("xl/worksheets/sheet1.xml").decode()
+        for user in self.users:
+            self.assertIn(user.username, sheet)
+
+    def test_snapshot_ignores_submissions_after_freeze(self):
+        contest_rank_snapshot.build(self.contest)
+        Submission.objects.create(**dict(DEFAULT_SUBMISSION_DATA, problem_id=self.problems[1].id,
+                                         user_id=self.users[0].id, contest=self.contest,
+                                         username="user0", result=JudgeStatus.ACCEPTED))
+        rebuild_contest_rank(self.contest)
+        rows, _ = contest_rank_snapshot.page(self.contest, False, 0, 10)
+        self.assertEqual([row["accepted_number"] for row in rows], [1, 1, 0])
+
+    def test_freeze_at_first_build(self):
+        Contest.objects.filter(id=self.contest.id).update(real_time_rank=False, freeze_time=None)
+        contest = Contest.objects.get(id=self.contest.id)
+        contest_rank_snapshot.build(contest)
+        self.assertIsNotNone(Contest.objects.get(id=self.contest.id).freeze_time)
+        rows, _ = contest_rank_snapshot.page(contest, False, 0, 10)
+        self.assertEqual([row["accepted_number"] for row in rows], [2, 2, 1])
+
+    def test_replay_events(self):
+        self.client.login(username="admin", password="admin")
+        resp = self.client.get(self.reverse("contest_rank_replay_admin_api"), data={"contest_id": self.contest.id})
+        self.assertSuccess(resp)
+        events = [(event["user_id"], event["problem_id"], event["is_ac"], event["rank_before"], event["rank_after"])
+                  for event in resp.data["data"]["events"]]
+        user0, user1, user2 = (user.id for user in self.users)
+        problem_a, problem_b = (problem.id for problem in self.problems)
+        self.assertEqual(events, [(user2, problem_a, True, 3, 3),
+                                  (user2, problem_b, True, 3, 1),
+                                  (user1, problem_b, True, 3, 1)])
+        self.assertEqual(resp.data["data"]["events"][-1]["accepted_number"], 2)
+
+    def _submission_total(self):
+        resp = self.client.get(self.reverse("contest_submission_list_api"),
+                               data={"contest_id": self.contest.id, "limit": 10})
+        self.assertSuccess(resp)
+        return resp.data["data"]["total"]
+
+    def test_submission_list(self):
+        # 封榜的时候普通用户只能看到自己的提交
+        self.client.login(username="user0", password="test123")
+        self.assertEqual(self._submission_total(), 1)
+
+        self.client.login(username="admin", password="admin")
+        self.assertEqual(self._submission_total(), 7)
+
+    def test_submission_list_after_unfreeze(self):
+        Contest.objects.filter(id=self.contest.id).update(freeze_time=None)
+        self.client.login(username="user0", password="test123")
+        self.assertEqual(self._submission_total(), 7)
+
+    def test_toggle_real_time_rank(self):
+        contest_data = {"id": self.contest.id, "title": "title", "description": "description",
+                        "start_time": self.contest.start_time.isoformat(),
+                        "end_time": self.contest.end_time.isoformat(), "password": "",
+                        "visible": True, "real_time_rank": False, "allowed_ip_ranges": []}
+        self.client.login(username="admin", password="admin")
+        url = self.reverse("contest_admin_api")
+        self.assertSuccess(self.client.put(url, data=contest_data))
+        self.assertTrue(Contest.objects.get(id=self.contest.id).rank_frozen)
+
+        self.assertSuccess(self.client.put(url, data=dict(contest_data, real_time_rank=True)))
+        contest = Contest.objects.get(id=self.contest.id)
+        self.assertIsNone(contest.freeze_time)
+        self.assertFalse(contest.rank_frozen)
+
+        resp = self.client.put(url, data=dict(contest_data, freeze_time=(contest.end_time + timedelta(hours=1)).isoformat()))
+        self.assertFailed(resp, "Freeze time must be between start time and end time")
+
+
+class ContestRankTimelineTest(APITestCase):
+    # 与 ContestFreezeTest 使用相同的比赛和提交
+    setUp = ContestFreezeTest.setUp
+    tearDown = ContestFreezeTest.tearDown
+
+    def _timeline(self, **params):
+        resp = self.client.get(self.reverse("contest_rank_timeline_api"),
+                               data=dict(contest_id=self.contest.id, **params))
+        self.assertSuccess(resp)
+        return {item["user"]["username"]: item["points"] for item in resp.data["data"]["results"]}
+
+    def test_rebuild_records_changes(self):
+        events = ContestRankEvent.objects.filter(contest=self.contest).order_by("time") \
+            .values_list("user_id", "time", "accepted_number", "total_time")
+        user0, user1, user2 = (user.id for user in self.users)
+        # 只有 AC 会改变排名依据，错误的提交不记录
+        self.assertEqual(list(events), [(user0, 600, 1, 600), (user1, 1200, 1, 1200), (user1, 4800, 2, 7200),
+                                        (user2, 5400, 1, 6600), (user2, 6000, 2, 12600)])
+
+    def test_timeline(self):
+        self.client.login(username="admin", password="admin")
+        timeline = self._timeline()
+        self.assertEqual(list(timeline), ["user1", "user2", "user0"])
+        self.assertEqual(timeline["user0"], [[600, 1], [4800, 2], [6000, 3]])
+        self.assertEqual(timeline["user1"], [[1200, 2], [4800, 1]])
+        self.assertEqual(timeline["user2"], [[5400, 3], [6000, 2]])
+
+        self.assertEqual(self._timeline(top=1), {"user1": [[1200, 2], [4800, 1]]})
+        self.assertEqual(self._timeline(user_id=self.users[2].id), {"user2": [[5400, 3], [6000, 2]]})
+
+    def test_frozen_timeline(self):
+        # 封榜之后普通用户只能看到封榜之前的变化
+        self.client.login(username="user0", password="test123")
+        self.assertEqual(self._timeline(), {"user0": [[600, 1]], "user1": [[1200, 2]]})
+
+    def test_rebuild_ended_contest(self):
+        ContestRankEvent.objects.filter(contest=self.contest).delete()
+        Contest.objects.filter(id=self.contest.id).update(end_time=timezone.now() - timedelta(minutes=1))
+        self.client.login(username="admin", password="admin")
+        self.assertEqual(list(self._timeline()), ["user1", "user2", "user0"])
+        self.assertEqual(ContestRankEvent.objects.filter(contest=self.contest).count(), 5)
+
+        resp = self.client.post(self.reverse("contest_rank_timeline_admin_api"), data={"contest_id": self.contest.id})
+        self.assertSuccess(resp)
+        self.assertEqual(ContestRankEvent.objects.filter(contest=self.contest).count(), 5)
+
+
+class ContestBestScoreTest(SubmissionPrepare):
+    def setUp(self):
+        self._create_problem_and_submission()
+        data = copy.deepcopy(DEFAULT_CONTEST_DATA)
+        self.contest = Contest.objects.create(created_by=self.problem.created_by, **data)
+        self.problem.contest = self.contest
+        self.problem.test_case_score = [{"score": 10}, {"score": 20}, {"score": 30}]
+        self.problem.save()
+
+    def _submit(self, passed_cases, create_time=None):
+        info = {"err": None, "data": [{"test_case": str(i), "result": 0 if i in passed_cases else -1}
+                                      for i in range(1, 4)]}
+        submission = Submission.objects.create(**dict(self.submission_data, contest_id=self.contest.id, info=info))
+        if create_time:
+            Submission.objects.filter(id=submission.id).update(create_time=create_time)
+            submission.refresh_from_db()
+        return submission
+
+    def _best(self):
+        return ContestBestScore.objects.get(contest=self.contest, user_id=self.submission_data["user_id"],
+                                            problem=self.problem)
+
+    def test_submission_partial(self):
+        scores = {1: 10, 2: 20}
+        info = {"data": [{"test_case": 1, "result": 0}, {"test_case": "2", "result": "AC"},
+                         {"test_case": 3, "result": 0}, {"result": 0}, "invalid"]}
+        self.assertEqual(submission_partial(info, scores), (30, 3, 5))
+        self.assertEqual(submission_partial({}, scores), (0, 0, 0))
+
+    def test_update_best_score(self):
+        first = self._submit({1, 2})
+        update_best_score(first, self.problem)
+        self.assertEqual((self._best().score, self._best().passed, self._best().total), (30, 2, 3))
+
+        # 分数相同时保留最早的提交时间，分数更低时不更新
+        update_best_score(self._submit({3}), self.problem)
+        update_best_score(self._submit({1}), self.problem)
+        self.assertEqual((self._best().score, self._best().best_time), (30, first.create_time))
+
+        update_best_score(self._submit({1, 2, 3}), self.problem)
+        self.assertEqual(self._best().score, 60)
+
+    def test_rebuild_best_scores(self):
+        submission = self._submit({1, 2, 3})
+        update_best_score(submission, self.problem)
+        self._submit({2})
+        # 重判之后分数降低
+        Submission.objects.filter(id=submission.id).update(info={"err": None, "data": []})
+        rebuild_best_scores(self.contest.id, user_ids=[submission.user_id], problem_ids=[self.problem.id])
+        self.assertEqual(self._best().score, 20)
@@ -0,0 +1,123 @@
+import bisect
+
+from django.db import transaction
+
+from utils.constants import ContestRuleType
+from .models import Contest, ContestRankEvent
+from .scoreboard import contest_scoreboard
+
+BATCH_SIZE = 1000
+DEFAULT_TOP = 10
+MAX_TOP = 50
+
+
+def _sort_key(accepted_number, total_time, total_score, user_id):
+    # 另一种规则的字段都是 0，两种规则可以使用同一个排序方式
+    return -accepted_number, total_time, -total_score, user_id
+
+
+class ContestTimeline:
+    """
+    比赛排名随时间的变化。
+    评测时只在用户的排名依据变化时记录一条 ContestRankEvent，查询时按时间顺序重放这些事件，
+    维护一个有序的排名列表，得到指定用户每次名次变化的时间和名次。
+    用户在第一次 AC(OI 为第一次得分)之后才出现在曲线中，在此之前总是排在有成绩的用户之后。
+    """
+    @staticmethod
+    def state(contest, rank):
+        """
+        :param rank: ACMContestRank / OIContestRank 或者 replay_contest_rank 返回的字典
+        :return: (accepted_number, total_time, total_score)
+        """
+        get = rank.get if isinstance(rank, dict) else lambda name: getattr(rank, name)
+        if contest.rule_type == ContestRuleType.ACM:
+            return get("accepted_number"), int(get("total_time")), 0
+        return 0, 0, get("total_score")
+
+    @staticmethod
+    def _event(contest, user_id, create_time, state):
+        accepted_number, total_time, total_score = state
+        return ContestRankEvent(contest=contest, user_id=user_id,
+                                time=int((create_time - contest.start_time).total_seconds()),
+                                accepted_number=accepted_number, total_time=total_time, total_score=total_score)
+
+    def record(self, contest, rank, create_time, before):
+        """
+        评测更新排名之后调用
+        :param before: 更新之前的 state(contest, rank)，没有变化时不记录
+        """
+        state = self.state(contest, rank)
+        if state != before:
+            self._event(contest, rank.user_id, create_time, state).save()
+
+    def rebuild(self, contest):
+        """
+        按提交时间顺序重放一遍全部提交，重新生成比赛的全部事件，用于重判之后和已经结束、没有记录事件的比赛
+        """
+        # rejudge 依赖本模块，放在这里导入避免循环导入
+        from judge.rejudge import replay_contest_rank
+
+        events = []
+
+        def on_change(user_id, create_time, rank):
+            events.append(self._event(contest, user_id, create_time, self.state(contest, rank)))
+            if len(events) >= BATCH_SIZE:
+                ContestRankEvent.objects.bulk_create(events)
+                events.clear()
+
+        with transaction.atomic():
+            # 同一个比赛同时只有一个重建
+            list(Contest.objects.select_for_update().filter(id=contest.id).values_list("id", flat=True))
+            ContestRankEvent.objects.filter(contest=contest).delete()
+            replay_contest_rank(contest, on_change=on_change)
+            ContestRankEvent.objects.bulk_create(events)
+
+    def series(self, contest, user_ids=None, top=DEFAULT_TOP, until=None):
+        """
+        :param user_ids: 指定的用户，为空时返回最终排名前 top 的用户
+        :param until: 只使用这个时间之前的事件(封榜)
+        :return: {user_id: [[距离比赛开始的秒数, 名次], ...]}，名次从 1 开始，只包含名次变化的时间点；
+                 指定 user_ids 时按 user_ids 的顺序，否则按最终名次排列
+        """
+        # 与排行榜一致，只包含正常状态的普通用户
+        allowed = set(contest_scoreboard.ranks(contest).values_list("user_id", flat=True))
+        events = ContestRankEvent.objects.filter(contest=contest)
+        if until is not None:
+            events = events.filter(time__lt=(until - contest.start_time).total_seconds())
+        rows = events.order_by("time", "id") \
+            .values_list("user_id", "time", "accepted_number", "total_time", "total_score")
+
+        if user_ids is None:
+            final = {}
+            for user_id, _, *state in rows.iterator(chunk_size=BATCH_SIZE):
+                if user_id in allowed:
+                    final[user_id] = state
+            user_ids = sorted(final, key=lambda user_id: _sort_key(*final[user_id], user_id))[:top]
+        result = {user_id: [] for user_id in user_ids if user_id in allowed}
+        if not result:
+            return result
+
+        keys, order = {}, []
+        for user_id, time, *state in rows.iterator(chunk_size=BATCH_SIZE):
+            if user_id not in allowed:
+                continue
+            if user_id in keys:
+                del order[bisect.bisect_left(order, keys[user_id])]
+            keys[user_id] = _sort_key(*state, user_id)
+            bisect.insort(order, keys[user_id])
+            for tracked, points in result.items():
+                if tracked not in keys:
+                    continue
+                position = bisect.bisect_left(order, keys[tracked]) + 1
+                if points and points[-1][1] == position:
+                    continue
+                if points and points[-1][0] == time:
+                    # 同一秒内的多次变化只保留最后的名次
+                    points.pop()
+                    if points and points[-1][1] == position:
+                        continue
+                points.append([time, position])
+        return result
+
+
+contest_timeline = ContestTimeline()
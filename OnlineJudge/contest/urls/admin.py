@@ -1,10 +1,13 @@
 from django.conf.urls import url
 
-from ..views.admin import ContestAnnouncementAPI, ContestAPI, ACMContestHelper, DownloadContestSubmissions
+from ..views.admin import (ContestAnnouncementAPI, ContestAPI, ACMContestHelper, ContestRankReplayAPI,
+                           ContestRankTimelineAPI, DownloadContestSubmissions)
 
 urlpatterns = [
     url(r"^contest/?$", ContestAPI.as_view(), name="contest_admin_api"),
     url(r"^contest/announcement/?$", ContestAnnouncementAPI.as_view(), name="contest_announcement_admin_api"),
     url(r"^contest/acm_helper/?$", ACMContestHelper.as_view(), name="acm_contest_helper"),
+    url(r"^contest/rank_replay/?$", ContestRankReplayAPI.as_view(), name="contest_rank_replay_admin_api"),
+    url(r"^contest/rank_timeline/?$", ContestRankTimelineAPI.as_view(), name="contest_rank_timeline_admin_api"),
     url(r"^download_submissions/?$", DownloadContestSubmissions.as_view(), name="acm_contest_helper"),
 ]
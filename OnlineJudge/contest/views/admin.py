@@ -5,16 +5,18 @@ from ipaddress import ip_network
 
 import dateutil.parser
 from django.http import FileResponse
+from django.utils.timezone import now
 
 from account.decorators import check_contest_permission, ensure_created_by
 from account.models import User
 from submission.models import Submission, JudgeStatus
 from utils.api import APIView, validate_serializer
-from utils.cache import cache
-from utils.constants import CacheKey
-from utils.shortcuts import rand_str
+from utils.shortcuts import datetime2str, rand_str
 from utils.tasks import delete_files
+from ..freeze import contest_freeze
 from ..models import Contest, ContestAnnouncement, ACMContestRank
+from ..rank_snapshot import contest_rank_snapshot
+from ..timeline import contest_timeline
 from ..serializers import (ContestAnnouncementSerializer, ContestAdminSerializer,
                            CreateConetestSeriaizer, CreateContestAnnouncementSerializer,
                            EditConetestSeriaizer, EditContestAnnouncementSerializer,
@@ -30,6 +32,10 @@ class ContestAPI(APIView):
         data["created_by"] = request.user
         if data["end_time"] <= data["start_time"]:
             return self.error("Start time must occur earlier than end time")
+        if data.get("freeze_time"):
+            data["freeze_time"] = dateutil.parser.parse(data["freeze_time"])
+            if not data["start_time"] <= data["freeze_time"] <= data["end_time"]:
+                return self.error("Freeze time must be between start time and end time")
         if data.get("password") and data["password"] == "":
             data["password"] = None
         for ip_range in data["allowed_ip_ranges"]:
@@ -52,6 +58,10 @@ class ContestAPI(APIView):
         data["end_time"] = dateutil.parser.parse(data["end_time"])
         if data["end_time"] <= data["start_time"]:
             return self.error("Start time must occur earlier than end time")
+        if data.get("freeze_time"):
+            data["freeze_time"] = dateutil.parser.parse(data["freeze_time"])
+            if not data["start_time"] <= data["freeze_time"] <= data["end_time"]:
+                return self.error("Freeze time must be between start time and end time")
         if not data["password"]:
             data["password"] = None
         for ip_range in data["allowed_ip_ranges"]:
@@ -59,9 +69,12 @@ class ContestAPI(APIView):
                 ip_network(ip_range, strict=False)
             except ValueError:
                 return self.error(f"{ip_range} is not a valid cidr network")
-        if not contest.real_time_rank and data.get("real_time_rank"):
-            cache_key = f"{CacheKey.contest_rank_cache}:{contest.id}"
-            cache.delete(cache_key)
+        if "freeze_time" not in data and contest.real_time_rank != data["real_time_rank"]:
+            # 关闭实时排名时立即封榜，打开时解除封榜
+            data["freeze_time"] = None if data["real_time_rank"] else now()
+        if contest.real_time_rank != data["real_time_rank"] or \
+                ("freeze_time" in data and contest.freeze_time != data["freeze_time"]):
+            contest_rank_snapshot.invalidate(contest.id)
 
         for k, v in data.items():
             setattr(contest, k, v)
@@ -195,6 +208,36 @@ class ACMContestHelper(APIView):
         return self.success()
 
 
+class ContestRankReplayAPI(APIView):
+    def get(self, request):
+        """
+        解除封榜时按顺序揭晓封榜之后的提交
+        """
+        try:
+            contest = Contest.objects.get(id=request.GET.get("contest_id"))
+            ensure_created_by(contest, request.user)
+        except Contest.DoesNotExist:
+            return self.error("Contest does not exist")
+        if not contest.rank_frozen:
+            return self.error("Contest rank is not frozen")
+        events = contest_freeze.replay_events(contest)
+        return self.success({"freeze_time": datetime2str(contest.freeze_time), "events": events})
+
+
+class ContestRankTimelineAPI(APIView):
+    def post(self, request):
+        """
+        按提交时间重放全部提交，重新生成排名变化的记录
+        """
+        try:
+            contest = Contest.objects.get(id=request.data.get("contest_id"))
+            ensure_created_by(contest, request.user)
+        except Contest.DoesNotExist:
+            return self.error("Contest does not exist")
+        contest_timeline.rebuild(contest)
+        return self.success()
+
+
 class DownloadContestSubmissions(APIView):
     def _dump_submissions(self, contest, exclude_admin=True):
         problem_ids = contest.problem_set.all().values_list("id", "_id")
@@ -1,19 +1,22 @@
-import io
+import tempfile
 
 import xlsxwriter
-from django.http import HttpResponse
+from django.http import FileResponse
 from django.utils.timezone import now
-from django.core.cache import cache
 
 from problem.models import Problem
 from utils.api import APIView, validate_serializer
-from utils.constants import CacheKey, CONTEST_PASSWORD_SESSION_KEY
+from utils.constants import CONTEST_PASSWORD_SESSION_KEY
 from utils.shortcuts import datetime2str, check_is_id
-from account.models import AdminType
 from account.decorators import login_required, check_contest_permission, check_contest_password
+from account.models import User
 
 from utils.constants import ContestRuleType, ContestStatus
-from ..models import ContestAnnouncement, Contest, OIContestRank, ACMContestRank
+from ..freeze import contest_freeze
+from ..models import ContestAnnouncement, Contest, ContestRankEvent
+from ..rank_snapshot import RankSnapshotSequence, contest_rank_snapshot
+from ..scoreboard import contest_scoreboard
+from ..timeline import DEFAULT_TOP, MAX_TOP, contest_timeline
 from ..serializers import ContestAnnouncementSerializer
 from ..serializers import ContestSerializer, ContestPasswordVerifySerializer
 from ..serializers import OIContestRankSerializer, ACMContestRankSerializer
@@ -103,18 +106,6 @@ class ContestAccessAPI(APIView):
 
 
 class ContestRankAPI(APIView):
-    def get_rank(self):
-        if self.contest.rule_type == ContestRuleType.ACM:
-            return ACMContestRank.objects.filter(contest=self.contest,
-                                                 user__admin_type=AdminType.REGULAR_USER,
-                                                 user__is_disabled=False).\
-                select_related("user").order_by("-accepted_number", "total_time")
-        else:
-            return OIContestRank.objects.filter(contest=self.contest,
-                                                user__admin_type=AdminType.REGULAR_USER,
-                                                user__is_disabled=False). \
-                select_related("user").order_by("-total_score")
-
     def column_string(self, n):
         string = ""
         while n > 0:
@@ -125,68 +116,119 @@ class ContestRankAPI(APIView):
     @check_contest_permission(check_type="ranks")
     def get(self, request):
         download_csv = request.GET.get("download_csv")
-        force_refresh = request.GET.get("force_refresh")
         is_contest_admin = request.user.is_authenticated and request.user.is_contest_admin(self.contest)
         if self.contest.rule_type == ContestRuleType.OI:
             serializer = OIContestRankSerializer
         else:
             serializer = ACMContestRankSerializer
 
-        if force_refresh == "1" and is_contest_admin:
-            qs = self.get_rank()
+        # 比赛管理员可以强制从数据库重新构建排行榜和封榜快照
+        if request.GET.get("force_refresh") == "1" and is_contest_admin:
+            contest_scoreboard.invalidate([self.contest.id])
+            contest_rank_snapshot.invalidate(self.contest.id)
+
+        # 没有封榜直接读取 redis 中的排行榜，否则返回封榜时的快照；比赛管理员默认看到实时排名，frozen=1 时看到公开的排名
+        live = not self.contest.rank_frozen or (is_contest_admin and request.GET.get("frozen") != "1")
+        if not download_csv:
+            if live:
+                page_qs = self.paginate_data(request, contest_scoreboard.sequence(self.contest))
+                page_qs["results"] = serializer(page_qs["results"], many=True, is_contest_admin=is_contest_admin).data
+                if request.user.is_authenticated:
+                    page_qs["my_rank"] = contest_scoreboard.rank_of(self.contest, request.user.id)
+                return self.success(page_qs)
+            # 快照中已经是序列化之后的数据
+            return self.success(self.paginate_data(request, RankSnapshotSequence(self.contest, is_contest_admin)))
+
+        if live:
+            # 逐行序列化，不需要一次性把所有排名放到内存里
+            data = (serializer(rank, is_contest_admin=is_contest_admin).data
+                    for rank in contest_scoreboard.ordered_ranks(self.contest).iterator())
         else:
-            cache_key = f"{CacheKey.contest_rank_cache}:{self.contest.id}"
-            qs = cache.get(cache_key)
-            if not qs:
-                qs = self.get_rank()
-                cache.set(cache_key, qs)
-
-        if download_csv:
-            data = serializer(qs, many=True, is_contest_admin=is_contest_admin).data
-            contest_problems = Problem.objects.filter(contest=self.contest, visible=True).order_by("_id")
-            problem_ids = [item.id for item in contest_problems]
-
-            f = io.BytesIO()
-            workbook = xlsxwriter.Workbook(f)
-            worksheet = workbook.add_worksheet()
-            worksheet.write("A1", "User ID")
-            worksheet.write("B1", "Username")
-            worksheet.write("C1", "Real Name")
-            if self.contest.rule_type == ContestRuleType.OI:
-                worksheet.write("D1", "Total Score")
-                for item in range(contest_problems.count()):
-                    worksheet.write(self.column_string(5 + item) + "1", f"{contest_problems[item].title}")
-                for index, item in enumerate(data):
-                    worksheet.write_string(index + 1, 0, str(item["user"]["id"]))
-                    worksheet.write_string(index + 1, 1, item["user"]["username"])
-                    worksheet.write_string(index + 1, 2, item["user"]["real_name"] or "")
-                    worksheet.write_string(index + 1, 3, str(item["total_score"]))
-                    for k, v in item["submission_info"].items():
-                        worksheet.write_string(index + 1, 4 + problem_ids.index(int(k)), str(v))
-            else:
-                worksheet.write("D1", "AC")
-                worksheet.write("E1", "Total Submission")
-                worksheet.write("F1", "Total Time")
-                for item in range(contest_problems.count()):
-                    worksheet.write(self.column_string(7 + item) + "1", f"{contest_problems[item].title}")
-
-                for index, item in enumerate(data):
-                    worksheet.write_string(index + 1, 0, str(item["user"]["id"]))
-                    worksheet.write_string(index + 1, 1, item["user"]["username"])
-                    worksheet.write_string(index + 1, 2, item["user"]["real_name"] or "")
-                    worksheet.write_string(index + 1, 3, str(item["accepted_number"]))
-                    worksheet.write_string(index + 1, 4, str(item["submission_number"]))
-                    worksheet.write_string(index + 1, 5, str(item["total_time"]))
-                    for k, v in item["submission_info"].items():
-                        worksheet.write_string(index + 1, 6 + problem_ids.index(int(k)), str(v["is_ac"]))
-
-            workbook.close()
-            f.seek(0)
-            response = HttpResponse(f.read())
-            response["Content-Disposition"] = f"attachment; filename=content-{self.contest.id}-rank.xlsx"
-            response["Content-Type"] = "application/xlsx"
-            return response
-
-        page_qs = self.paginate_data(request, qs)
-        page_qs["results"] = serializer(page_qs["results"], many=True, is_contest_admin=is_contest_admin).data
-        return self.success(page_qs)
+            data = contest_rank_snapshot.rows(self.contest, is_contest_admin)
+
+        contest_problems = list(Problem.objects.filter(contest=self.contest, visible=True).order_by("_id"))
+        # submission_info 的 key 是 problem id，不可见的题目没有对应的列
+        problem_columns = {str(item.id): index for index, item in enumerate(contest_problems)}
+
+        # 写到临时文件中再流式返回，内存占用不随参赛人数增长
+        f = tempfile.TemporaryFile()
+        try:
+            self._write_rank_workbook(f, data, contest_problems, problem_columns)
+        except BaseException:
+            f.close()
+            raise
+        f.seek(0)
+        response = FileResponse(f)
+        response["Content-Disposition"] = f"attachment; filename=content-{self.contest.id}-rank.xlsx"
+        response["Content-Type"] = "application/xlsx"
+        return response
+
+    def _write_rank_workbook(self, f, data, contest_problems, problem_columns):
+        # 按行顺序写入，constant_memory 模式下写完的行会刷到临时文件中
+        workbook = xlsxwriter.Workbook(f, {"constant_memory": True})
+        worksheet = workbook.add_worksheet()
+        worksheet.write("A1", "User ID")
+        worksheet.write("B1", "Username")
+        worksheet.write("C1", "Real Name")
+        if self.contest.rule_type == ContestRuleType.OI:
+            worksheet.write("D1", "Total Score")
+            for index, problem in enumerate(contest_problems):
+                worksheet.write(self.column_string(5 + index) + "1", f"{problem.title}")
+            for index, item in enumerate(data):
+                worksheet.write_string(index + 1, 0, str(item["user"]["id"]))
+                worksheet.write_string(index + 1, 1, item["user"]["username"])
+                worksheet.write_string(index + 1, 2, item["user"]["real_name"] or "")
+                worksheet.write_string(index + 1, 3, str(item["total_score"]))
+                for k, v in item["submission_info"].items():
+                    if k in problem_columns:
+                        worksheet.write_string(index + 1, 4 + problem_columns[k], str(v))
+        else:
+            worksheet.write("D1", "AC")
+            worksheet.write("E1", "Total Submission")
+            worksheet.write("F1", "Total Time")
+            for index, problem in enumerate(contest_problems):
+                worksheet.write(self.column_string(7 + index) + "1", f"{problem.title}")
+
+            for index, item in enumerate(data):
+                worksheet.write_string(index + 1, 0, str(item["user"]["id"]))
+                worksheet.write_string(index + 1, 1, item["user"]["username"])
+                worksheet.write_string(index + 1, 2, item["user"]["real_name"] or "")
+                worksheet.write_string(index + 1, 3, str(item["accepted_number"]))
+                worksheet.write_string(index + 1, 4, str(item["submission_number"]))
+                worksheet.write_string(index + 1, 5, str(item["total_time"]))
+                for k, v in item["submission_info"].items():
+                    if k in problem_columns:
+                        worksheet.write_string(index + 1, 6 + problem_columns[k], str(v["is_ac"]))
+
+        workbook.close()
+
+
+class ContestRankTimelineAPI(APIView):
+    @check_contest_permission(check_type="ranks")
+    def get(self, request):
+        """
+        排名随时间的变化，指定 user_id 时返回这个用户的，否则返回最终排名前 top 的用户的
+        """
+        user_id = request.GET.get("user_id")
+        if user_id is not None and not check_is_id(user_id):
+            return self.error("Invalid user_id")
+        try:
+            top = min(max(int(request.GET.get("top", DEFAULT_TOP)), 1), MAX_TOP)
+        except ValueError:
+            return self.error("Invalid top")
+
+        # 已经结束的比赛在记录事件之前就有提交时，第一次查询时重放生成
+        if self.contest.status == ContestStatus.CONTEST_ENDED and \
+                not ContestRankEvent.objects.filter(contest=self.contest).exists():
+            contest_timeline.rebuild(self.contest)
+
+        is_contest_admin = request.user.is_authenticated and request.user.is_contest_admin(self.contest)
+        until = None
+        if self.contest.rank_frozen and not is_contest_admin:
+            until = contest_freeze.freeze_time(self.contest)
+        series = contest_timeline.series(self.contest, user_ids=None if user_id is None else [int(user_id)],
+                                         top=top, until=until)
+        usernames = dict(User.objects.filter(id__in=series.keys()).values_list("id", "username"))
+        return self.success({"start_time": datetime2str(self.contest.start_time),
+                             "results": [{"user": {"id": item, "username": usernames.get(item)}, "points": points}
+                                         for item, points in series.items()]})
@@ -0,0 +1,200 @@
+import json
+import uuid
+
+from utils.cache import cache
+from utils.constants import CacheKey
+
+# judge server 的心跳超时时间，与 JudgeServer.status 保持一致
+HEARTBEAT_TIMEOUT = 6
+# lease 的默认有效期(秒)，worker 崩溃时 slot 会在到期后自动释放
+DEFAULT_LEASE_TTL = 600
+# 熔断: CIRCUIT_FAILURE_WINDOW 秒内连续失败 CIRCUIT_FAILURE_THRESHOLD 次，则 CIRCUIT_OPEN_SECONDS 秒内不再分配该 server
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_FAILURE_WINDOW = 30
+CIRCUIT_OPEN_SECONDS = 30
+
+# The script is shared with micro-service-server/app/execution/scheduler.py,
+# keep the key layout and the return value in sync on both sides.
+#
+# KEYS[1]: server registry hash, server_id -> json
+# ARGV[1]: slot key prefix, ARGV[2]: lease id, ARGV[3]: lease ttl (seconds),
+# ARGV[4]: heartbeat timeout (seconds), ARGV[5]: circuit key prefix,
+# ARGV[6...]: server ids to skip
+ACQUIRE_SLOT_SCRIPT = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local heartbeat_timeout = tonumber(ARGV[4]) * 1000
+local excluded = {}
+for i = 6, #ARGV do
+    excluded[ARGV[i]] = true
+end
+local best, best_load
+for _, raw in ipairs(redis.call("HVALS", KEYS[1])) do
+    local server = cjson.decode(raw)
+    if not server["is_disabled"] and server["service_url"] ~= cjson.null
+            and now - server["last_heartbeat"] * 1000 <= heartbeat_timeout
+            and not excluded[tostring(server["id"])]
+            and redis.call("EXISTS", ARGV[5] .. ":" .. server["id"]) == 0 then
+        local slot_key = ARGV[1] .. ":" .. server["id"]
+        redis.call("ZREMRANGEBYSCORE", slot_key, "-inf", now)
+        local load = redis.call("ZCARD", slot_key)
+        if load <= server["cpu_core"] * 2 and (best_load == nil or load < best_load) then
+            best = server
+            best_load = load
+        end
+    end
+end
+if not best then
+    return nil
+end
+local slot_key = ARGV[1] .. ":" .. best["id"]
+redis.call("ZADD", slot_key, now + tonumber(ARGV[3]) * 1000, ARGV[2])
+-- the key expires with its longest lease; a short lease must not shorten it
+local last = redis.call("ZREVRANGE", slot_key, 0, 0, "WITHSCORES")
+redis.call("PEXPIREAT", slot_key, last[2])
+return {best["id"], best["service_url"]}
+"""
+
+# KEYS[1]: failure counter, KEYS[2]: circuit key
+# ARGV[1]: threshold, ARGV[2]: window (seconds), ARGV[3]: open time (seconds)
+REPORT_FAILURE_SCRIPT = """
+local failures = redis.call("INCR", KEYS[1])
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+if failures < tonumber(ARGV[1]) then
+    return 0
+end
+redis.call("SET", KEYS[2], 1, "EX", ARGV[3])
+-- half open: 熔断结束后再失败一次就重新熔断
+redis.call("SET", KEYS[1], tonumber(ARGV[1]) - 1, "EX", tonumber(ARGV[2]) + tonumber(ARGV[3]))
+return 1
+"""
+
+# 与 ACQUIRE_SLOT_SCRIPT 相同的过滤条件，返回所有可用 server 的空闲 slot 总数
+# KEYS[1]: server registry hash
+# ARGV[1]: slot key prefix, ARGV[2]: heartbeat timeout (seconds), ARGV[3]: circuit key prefix
+FREE_SLOTS_SCRIPT = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local heartbeat_timeout = tonumber(ARGV[2]) * 1000
+local free = 0
+for _, raw in ipairs(redis.call("HVALS", KEYS[1])) do
+    local server = cjson.decode(raw)
+    if not server["is_disabled"] and server["service_url"] ~= cjson.null
+            and now - server["last_heartbeat"] * 1000 <= heartbeat_timeout
+            and redis.call("EXISTS", ARGV[3] .. ":" .. server["id"]) == 0 then
+        local slot_key = ARGV[1] .. ":" .. server["id"]
+        redis.call("ZREMRANGEBYSCORE", slot_key, "-inf", now)
+        local capacity = server["cpu_core"] * 2 + 1
+        free = free + math.max(capacity - redis.call("ZCARD", slot_key), 0)
+    end
+end
+return free
+"""
+
+
+class Lease:
+    def __init__(self, server_id, service_url, lease_id):
+        self.id = server_id
+        self.service_url = service_url
+        self.lease_id = lease_id
+
+    def __repr__(self):
+        return f"<Lease server={self.id} lease={self.lease_id}>"
+
+
+class SlotAllocator:
+    """
+    基于 redis 的 judge server slot 分配器。
+    每个 server 的并发数由 sorted set 中未过期的 lease 个数表示，选择和占用在一个 lua 脚本中完成，
+    不再对 judge_server 表加行锁。
+    """
+    def __init__(self, redis_conn=cache):
+        self._redis_conn = redis_conn
+        self._acquire_script = None
+        self._report_failure_script = None
+        self._free_slots_script = None
+
+    @staticmethod
+    def _slot_key(server_id):
+        return f"{CacheKey.judge_server_slots}:{server_id}"
+
+    @staticmethod
+    def _circuit_key(server_id):
+        return f"{CacheKey.judge_server_circuit}:{server_id}"
+
+    @staticmethod
+    def _failure_key(server_id):
+        return f"{CacheKey.judge_server_failures}:{server_id}"
+
+    def register(self, server):
+        """
+        heartbeat、启用/禁用时同步 server 信息，分配时只读这里的数据
+        """
+        data = {"id": server.id,
+                "service_url": server.service_url,
+                "cpu_core": server.cpu_core,
+                "is_disabled": server.is_disabled,
+                "last_heartbeat": server.last_heartbeat.timestamp()}
+        self._redis_conn.hset(CacheKey.judge_server_registry, str(server.id), json.dumps(data))
+
+    def unregister(self, server_id):
+        self._redis_conn.hdel(CacheKey.judge_server_registry, str(server_id))
+        self._redis_conn.delete_many([self._slot_key(server_id), self._circuit_key(server_id),
+                                      self._failure_key(server_id)])
+
+    def acquire(self, ttl=DEFAULT_LEASE_TTL, exclude=()):
+        if self._acquire_script is None:
+            self._acquire_script = self._redis_conn.register_script(ACQUIRE_SLOT_SCRIPT)
+        lease_id = uuid.uuid4().hex
+        result = self._acquire_script(keys=[CacheKey.judge_server_registry],
+                                      args=[CacheKey.judge_server_slots, lease_id, ttl, HEARTBEAT_TIMEOUT,
+                                            CacheKey.judge_server_circuit, *exclude])
+        if not result:
+            return None
+        server_id, service_url = result
+        if isinstance(service_url, bytes):
+            service_url = service_url.decode("utf-8")
+        return Lease(int(server_id), service_url, lease_id)
+
+    def release(self, lease):
+        self._redis_conn.zrem(self._slot_key(lease.id), lease.lease_id)
+
+    def report_failure(self, server_id):
+        """
+        连接失败或超时，返回该 server 是否被熔断
+        """
+        if self._report_failure_script is None:
+            self._report_failure_script = self._redis_conn.register_script(REPORT_FAILURE_SCRIPT)
+        return bool(self._report_failure_script(keys=[self._failure_key(server_id), self._circuit_key(server_id)],
+                                                args=[CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_FAILURE_WINDOW,
+                                                      CIRCUIT_OPEN_SECONDS]))
+
+    def report_success(self, server_id):
+        self._redis_conn.delete(self._failure_key(server_id))
+
+    def free_slots(self):
+        """
+        当前还能分配出去的 slot 数，用于从等待队列中一次取出足够的任务
+        """
+        if self._free_slots_script is None:
+            self._free_slots_script = self._redis_conn.register_script(FREE_SLOTS_SCRIPT)
+        return self._free_slots_script(keys=[CacheKey.judge_server_registry],
+                                       args=[CacheKey.judge_server_slots, HEARTBEAT_TIMEOUT,
+                                             CacheKey.judge_server_circuit])
+
+    def usage(self, server_ids):
+        """
+        返回 {server_id: 正在执行的任务数}，用于后台展示
+        """
+        now = self._now_ms()
+        pipe = self._redis_conn.pipeline()
+        for server_id in server_ids:
+            pipe.zcount(self._slot_key(server_id), f"({now}", "+inf")
+        return dict(zip(server_ids, pipe.execute()))
+
+    def _now_ms(self):
+        seconds, microseconds = self._redis_conn.time()
+        return seconds * 1000 + microseconds // 1000
+
+
+slot_allocator = SlotAllocator()
@@ -1,70 +1,130 @@
 import hashlib
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
 
 import requests
 from django.db import transaction, IntegrityError
 from django.db.models import F
 
-from account.models import User
-from conf.models import JudgeServer
+from account.models import User, UserProfile
+from account.rank_index import user_rank_index
+from contest.best_score import rebuild_best_scores, update_best_score
 from contest.models import ContestRuleType, ACMContestRank, OIContestRank, ContestStatus
+from contest.rank_snapshot import contest_rank_snapshot
+from contest.scoreboard import contest_scoreboard
+from contest.timeline import contest_timeline
+from judge import transport
+from judge.allocator import Lease, slot_allocator
+from judge.progress import JudgeProgressEvent, judge_progress
+from judge.queue import JudgeQueueLane, waiting_queue
+from judge.rejudge import bulk_rejudge
+from judge.sharding import chunk_test_case, split_test_case
+from judge.verdict_cache import verdict_cache
 from options.options import SysOptions
-from problem.models import Problem, ProblemRuleType
+from problem.counters import problem_counter
+from problem.models import Problem, ProblemRuleType, UserProblemStatus
 from problem.utils import parse_problem_template
 from submission.models import JudgeStatus, Submission
-from utils.cache import cache
-from utils.constants import CacheKey
 
 logger = logging.getLogger(__name__)
 
+# OI 题目测试点数量达到 SHARD_MIN_TEST_CASES 时，分到多个空闲的 judge server 上并行评测，
+# 每个分片至少 SHARD_MIN_CASES_PER_SHARD 个测试点
+SHARD_MIN_TEST_CASES = 20
+SHARD_MIN_CASES_PER_SHARD = 5
+# ACM 题目测试点数量达到 EARLY_EXIT_MIN_TEST_CASES 时分块评测，第一块 EARLY_EXIT_FIRST_CHUNK 个测试点，
+# 之后每块是前一块的 EARLY_EXIT_CHUNK_GROWTH 倍，某一块出现错误后不再评测后面的测试点。
+# 通过的提交每一块都要编译和请求一次，测量过额外的开销之后再开启
+EARLY_EXIT_ENABLED = False
+EARLY_EXIT_MIN_TEST_CASES = 6
+EARLY_EXIT_FIRST_CHUNK = 3
+EARLY_EXIT_CHUNK_GROWTH = 4
 
-# 继续处理在队列中的问题
+
+# 继续处理在队列中的问题，有多少空闲 slot 就取出多少个任务
 def process_pending_task():
-    if cache.llen(CacheKey.waiting_queue):
-        # 防止循环引入
-        from judge.tasks import judge_task
-        tmp_data = cache.rpop(CacheKey.waiting_queue)
-        if tmp_data:
-            data = json.loads(tmp_data.decode("utf-8"))
-            judge_task.send(**data)
+    free = slot_allocator.free_slots()
+    if free <= 0:
+        return
+    # 防止循环引入
+    from judge.tasks import judge_task
+    for data in waiting_queue.pop(free):
+        judge_task.send(queued=True, **data)
 
 
 class ChooseJudgeServer:
-    def __init__(self):
+    def __init__(self, exclude=()):
         self.server = None
+        self.exclude = exclude
 
-    def __enter__(self) -> [JudgeServer, None]:
-        with transaction.atomic():
-            servers = JudgeServer.objects.select_for_update().filter(is_disabled=False).order_by("task_number")
-            servers = [s for s in servers if s.status == "normal"]
-            for server in servers:
-                if server.task_number <= server.cpu_core * 2:
-                    server.task_number = F("task_number") + 1
-                    server.save(update_fields=["task_number"])
-                    self.server = server
-                    return server
-        return None
+    def __enter__(self) -> [Lease, None]:
+        self.server = slot_allocator.acquire(exclude=self.exclude)
+        return self.server
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.server:
-            JudgeServer.objects.filter(id=self.server.id).update(task_number=F("task_number") - 1)
+            slot_allocator.release(self.server)
+
+
+class JudgeServerUnreachable(Exception):
+    """
+    连接 judge server 失败，请求没有被执行，可以换一台 server 重试
+    """
 
 
 class DispatcherBase(object):
     def __init__(self):
         self.token = hashlib.sha256(SysOptions.judge_server_token.encode("utf-8")).hexdigest()
 
-    def _request(self, url, data=None):
+    def _request(self, url, data=None, read_timeout=transport.JUDGE_READ_TIMEOUT):
+        """
+        连接失败时抛出 JudgeServerUnreachable；读取超时、返回内容无效时返回 None，
+        这时 judge server 可能已经执行了很久，不再换 server 重试
+        """
         kwargs = {"headers": {"X-Judge-Server-Token": self.token}}
         if data:
             kwargs["json"] = data
         try:
-            return requests.post(url, **kwargs).json()
+            return transport.post(url, read_timeout, **kwargs).json()
+        except requests.ConnectionError as e:
+            # 包括 ConnectTimeout
+            logger.warning("Failed to connect to judge server %s: %r", url, e)
+            raise JudgeServerUnreachable(url) from e
         except Exception as e:
             logger.exception(e)
 
+    def _request_with_failover(self, path, data, read_timeout=transport.JUDGE_READ_TIMEOUT, on_acquired=None,
+                               request=None):
+        """
+        连接失败时记录到熔断器，换下一台可用的 judge server 重试；
+        读取超时或者返回内容无效时不再重试，也不计入熔断
+        :param request: 替代 self._request 的请求函数，参数相同
+        :return: (resp, tried) resp 为 None 且 tried 为空说明当前没有可用的 judge server，
+                 tried 不为空说明请求失败
+        """
+        request = request or self._request
+        tried = []
+        while True:
+            with ChooseJudgeServer(exclude=tried) as server:
+                if not server:
+                    return None, tried
+                if on_acquired and not tried:
+                    on_acquired()
+                try:
+                    resp = request(urljoin(server.service_url, path), data=data, read_timeout=read_timeout)
+                except JudgeServerUnreachable:
+                    if slot_allocator.report_failure(server.id):
+                        logger.error("Judge server %s is unreachable, circuit opened", server.id)
+                    tried.append(server.id)
+                    continue
+                if resp is None:
+                    # judge server 可以连接，不计入熔断
+                    return None, tried + [server.id]
+                slot_allocator.report_success(server.id)
+                return resp, tried
+
 
 class SPJCompiler(DispatcherBase):
     def __init__(self, spj_code, spj_version, spj_language):
@@ -78,19 +138,21 @@ class SPJCompiler(DispatcherBase):
         }
 
     def compile_spj(self):
-        with ChooseJudgeServer() as server:
-            if not server:
-                return "No available judge_server"
-            result = self._request(urljoin(server.service_url, "compile_spj"), data=self.data)
-            if not result:
-                return "Failed to call judge server"
-            if result["err"]:
-                return result["data"]
+        result, tried = self._request_with_failover("compile_spj", self.data,
+                                                    read_timeout=transport.COMPILE_SPJ_READ_TIMEOUT)
+        if not result:
+            return "Failed to call judge server" if tried else "No available judge_server"
+        if result["err"]:
+            return result["data"]
 
 
 class JudgeDispatcher(DispatcherBase):
-    def __init__(self, submission_id, problem_id):
+    def __init__(self, submission_id, problem_id, rejudge_job=None):
+        """
+        :param rejudge_job: 批量重判的 job id，统计信息在全部评测结束后统一计算
+        """
         super().__init__()
+        self.rejudge_job = rejudge_job
         self.submission = Submission.objects.get(id=submission_id)
         self.contest_id = self.submission.contest_id
         self.last_result = self.submission.result if self.submission.info else None
@@ -101,6 +163,18 @@ class JudgeDispatcher(DispatcherBase):
         else:
             self.problem = Problem.objects.get(id=problem_id)
 
+    def _request(self, url, data=None, read_timeout=transport.JUDGE_READ_TIMEOUT):
+        # 分片、分块评测时每个请求返回后就推送已完成的测试点
+        resp = super()._request(url, data=data, read_timeout=read_timeout)
+        if resp and not resp["err"]:
+            judge_progress.test_cases(self.submission.id, resp["data"])
+        return resp
+
+    def _publish_finished(self):
+        judge_progress.publish(self.submission.id, [(JudgeProgressEvent.FINISHED,
+                                                     {"result": self.submission.result,
+                                                      "statistic_info": self.submission.statistic_info})])
+
     def _compute_statistic_info(self, resp_data):
         # 用时和内存占用保存为多个测试点中最长的那个
         self.submission.statistic_info["time_cost"] = max([x["cpu_time"] for x in resp_data])
@@ -122,7 +196,106 @@ class JudgeDispatcher(DispatcherBase):
                 return
             self.submission.statistic_info["score"] = score
 
-    def judge(self):
+    def _queue_lane(self):
+        if self.rejudge_job or self.last_result is not None:
+            return JudgeQueueLane.REJUDGE
+        if self.contest_id:
+            return JudgeQueueLane.CONTEST
+        return JudgeQueueLane.PRACTICE
+
+    def _judge_sharded(self, data, on_acquired=None):
+        """
+        只在有多个空闲 judge server 且没有任务排队时分片
+        :return: 与 _request_with_failover 相同的 (resp, tried)，(None, []) 表示没有分片或者没有可用的 judge server
+        """
+        test_case_number = len(self.problem.test_case_score or [])
+        if self.problem.rule_type != ProblemRuleType.OI or test_case_number < SHARD_MIN_TEST_CASES:
+            return None, []
+        if any(waiting_queue.size().values()):
+            return None, []
+        max_shards = test_case_number // SHARD_MIN_CASES_PER_SHARD
+
+        leases = []
+        try:
+            while len(leases) < max_shards:
+                lease = slot_allocator.acquire(exclude=[item.id for item in leases])
+                if not lease:
+                    break
+                leases.append(lease)
+            if len(leases) < 2:
+                return None, []
+            try:
+                shards = split_test_case(self.problem.test_case_id, len(leases))
+            except (OSError, ValueError, KeyError) as e:
+                logger.exception(e)
+                return None, []
+            if on_acquired:
+                on_acquired()
+            with ThreadPoolExecutor(max_workers=len(leases)) as pool:
+                futures = [pool.submit(self._request, urljoin(lease.service_url, "/judge"),
+                                       data=dict(data, test_case_id=shard))
+                           for lease, shard in zip(leases, shards)]
+                unreachable = []
+                results = []
+                for lease, future in zip(leases, futures):
+                    try:
+                        results.append(future.result())
+                    except JudgeServerUnreachable:
+                        unreachable.append(lease.id)
+                        results.append(None)
+        finally:
+            for lease in leases:
+                slot_allocator.release(lease)
+
+        for lease, resp in zip(leases, results):
+            if lease.id in unreachable:
+                slot_allocator.report_failure(lease.id)
+            elif resp is not None:
+                slot_allocator.report_success(lease.id)
+        # 有分片连接失败时整体重新评测，on_acquired 已经调用过，不再传入
+        if unreachable:
+            return self._request_with_failover("/judge", data)
+        failed = [lease.id for lease, resp in zip(leases, results) if resp is None]
+        if failed:
+            return None, failed
+        for resp in results:
+            if resp["err"]:
+                return resp, []
+        return {"err": None, "data": [item for resp in results for item in resp["data"]]}, []
+
+    def _early_exit_request(self):
+        """
+        ACM 模式下只取第一个错误的测试点，按顺序分块评测，在同一台 judge server 上执行，
+        出现错误的那一块之前的测试点全部正确，所以结果与完整评测相同
+        :return: 用于 _request_with_failover 的请求函数，不适用时返回 None
+        """
+        # 比赛的最好成绩、排名、导出和进度按 info 中的测试点计算部分分和通过数量，
+        # 没有评测的测试点会被漏掉，所以只用于练习题
+        if not EARLY_EXIT_ENABLED or self.contest_id or self.problem.rule_type != ProblemRuleType.ACM or \
+                len(self.problem.test_case_score or []) < EARLY_EXIT_MIN_TEST_CASES:
+            return None
+        try:
+            chunks = chunk_test_case(self.problem.test_case_id, EARLY_EXIT_FIRST_CHUNK, EARLY_EXIT_CHUNK_GROWTH)
+        except (OSError, ValueError, KeyError) as e:
+            logger.exception(e)
+            return None
+
+        def request(url, data=None, read_timeout=transport.JUDGE_READ_TIMEOUT):
+            ret = []
+            for chunk in chunks:
+                resp = self._request(url, data=dict(data, test_case_id=chunk), read_timeout=read_timeout)
+                if resp is None or resp["err"]:
+                    return resp
+                ret.extend(resp["data"])
+                if any(item["result"] != JudgeStatus.ACCEPTED for item in resp["data"]):
+                    break
+            return {"err": None, "data": ret}
+        return request
+
+    def judge(self, queued=False):
+        """
+        :param queued: 从等待队列中取出的任务，没有抢到 slot 时放回队首
+        """
         language = self.submission.language
         sub_config = list(filter(lambda item: language == item["name"], SysOptions.languages))[0]
         spj_config = {}
@@ -152,17 +325,45 @@ class JudgeDispatcher(DispatcherBase):
             "io_mode": self.problem.io_mode
         }
 
-        with ChooseJudgeServer() as server:
-            if not server:
-                data = {"submission_id": self.submission.id, "problem_id": self.problem.id}
-                cache.lpush(CacheKey.waiting_queue, json.dumps(data))
-                return
+        def set_judging():
             Submission.objects.filter(id=self.submission.id).update(result=JudgeStatus.JUDGING)
-            resp = self._request(urljoin(server.service_url, "/judge"), data=data)
+            judge_progress.publish(self.submission.id, [(JudgeProgressEvent.JUDGING,
+                                                         {"test_case_number": len(self.problem.test_case_score or [])})])
+
+        use_cache = not self.contest_id or self.contest.verdict_cache_enabled
+        fingerprint = verdict_cache.fingerprint(language, data)
+        # 重判需要重新评测，结果仍然写入缓存
+        resp = None
+        if use_cache and self.last_result is None and not self.rejudge_job:
+            resp = verdict_cache.get(self.problem.test_case_id, fingerprint)
+            if resp and not resp["err"]:
+                judge_progress.test_cases(self.submission.id, resp["data"])
+
+        if resp is None:
+            resp, tried = self._judge_sharded(data, on_acquired=set_judging)
+            if resp is None and not tried:
+                resp, tried = self._request_with_failover("/judge", data, on_acquired=set_judging,
+                                                          request=self._early_exit_request())
+                if not resp and not tried:
+                    data = {"submission_id": self.submission.id, "problem_id": self.problem.id}
+                    if self.rejudge_job:
+                        data["rejudge_job"] = self.rejudge_job
+                    waiting_queue.push(self._queue_lane(), data, front=queued)
+                    judge_progress.publish(self.submission.id, [(JudgeProgressEvent.PENDING, {})])
+                    return
 
-        if not resp:
-            Submission.objects.filter(id=self.submission.id).update(result=JudgeStatus.SYSTEM_ERROR)
-            return
+            # slot 已经释放，先让队列中的任务补上，再更新数据库
+            process_pending_task()
+
+            if not resp:
+                Submission.objects.filter(id=self.submission.id).update(result=JudgeStatus.SYSTEM_ERROR)
+                self.submission.result = JudgeStatus.SYSTEM_ERROR
+                self._publish_finished()
+                if self.rejudge_job:
+                    bulk_rejudge.submission_done(self.rejudge_job)
+                return
+            if use_cache:
+                verdict_cache.set(self.problem.test_case_id, fingerprint, resp)
 
         if resp["err"]:
             self.submission.result = JudgeStatus.COMPILE_ERROR
@@ -182,8 +383,18 @@ class JudgeDispatcher(DispatcherBase):
             else:
                 self.submission.result = JudgeStatus.PARTIALLY_ACCEPTED
         self.submission.save()
+        self._publish_finished()
+
+        if self.rejudge_job:
+            bulk_rejudge.submission_done(self.rejudge_job)
+            return
 
         if self.contest_id:
+            # 重判可能让最好成绩变低，需要从全部提交重新计算
+            if self.last_result is not None:
+                rebuild_best_scores(self.contest_id, user_ids=[self.submission.user_id], problem_ids=[self.problem.id])
+            else:
+                update_best_score(self.submission, self.problem)
             if User.objects.get(id=self.submission.user_id).is_contest_admin(self.contest):
                 logger.info(
                     "Contest admin submission skipped for rank update, contest id: %s, submission id: %s",
@@ -200,139 +411,85 @@ class JudgeDispatcher(DispatcherBase):
             else:
                 self.update_problem_status()
 
-        # 至此判题结束，尝试处理任务队列中剩余的任务
-        process_pending_task()
+    def _incr_problem_counter(self, results, submission=0, accepted=0):
+        # 题目的计数先写到 redis 中再批量写入数据库，事务提交之后再累加
+        transaction.on_commit(lambda: problem_counter.incr(self.problem.id, results,
+                                                           submission=submission, accepted=accepted))
+
+    def _lock_problem_status(self, score=0):
+        """
+        锁住当前用户在这道题上的状态，第一次提交时按本次的结果创建
+        :return: (UserProblemStatus, created)
+        """
+        lookup = {"user_id": self.submission.user_id, "problem_id": self.problem.id}
+        problem_status = UserProblemStatus.objects.select_for_update().filter(**lookup).first()
+        if problem_status:
+            return problem_status, False
+        problem_status, created = UserProblemStatus.objects.get_or_create(
+            **lookup, defaults={"contest_id": self.contest_id, "status": self.submission.result, "score": score})
+        if not created:
+            problem_status = UserProblemStatus.objects.select_for_update().get(**lookup)
+        return problem_status, created
+
+    def _update_user_problem_status(self, submission_number=0):
+        is_oi = self.problem.rule_type == ProblemRuleType.OI
+        score = self.submission.statistic_info["score"] if is_oi else 0
+        problem_status, created = self._lock_problem_status(score)
+        profile_fields = {}
+        if submission_number:
+            profile_fields["submission_number"] = F("submission_number") + submission_number
+        # AC 之后状态不再变化
+        if created or problem_status.status != JudgeStatus.ACCEPTED:
+            if self.submission.result == JudgeStatus.ACCEPTED:
+                profile_fields["accepted_number"] = F("accepted_number") + 1
+            if is_oi:
+                # minus last time score, add this time score
+                last_time_score = 0 if created else problem_status.score
+                profile_fields["total_score"] = F("total_score") - last_time_score + score
+            if not created:
+                problem_status.status = self.submission.result
+                problem_status.score = score
+                problem_status.save(update_fields=["status", "score"])
+        if profile_fields:
+            UserProfile.objects.filter(user_id=self.submission.user_id).update(**profile_fields)
+            user_rank_index.update_users([self.submission.user_id])
 
     def update_problem_status_rejudge(self):
-        result = str(self.submission.result)
-        problem_id = str(self.problem.id)
         with transaction.atomic():
             # update problem status
-            problem = Problem.objects.select_for_update().get(contest_id=self.contest_id, id=self.problem.id)
-            if self.last_result != JudgeStatus.ACCEPTED and self.submission.result == JudgeStatus.ACCEPTED:
-                problem.accepted_number += 1
-            problem_info = problem.statistic_info
-            problem_info[self.last_result] = problem_info.get(self.last_result, 1) - 1
-            problem_info[result] = problem_info.get(result, 0) + 1
-            problem.save(update_fields=["accepted_number", "statistic_info"])
-
-            profile = User.objects.select_for_update().get(id=self.submission.user_id).userprofile
-            if problem.rule_type == ProblemRuleType.ACM:
-                acm_problems_status = profile.acm_problems_status.get("problems", {})
-                if acm_problems_status[problem_id]["status"] != JudgeStatus.ACCEPTED:
-                    acm_problems_status[problem_id]["status"] = self.submission.result
-                    if self.submission.result == JudgeStatus.ACCEPTED:
-                        profile.accepted_number += 1
-                profile.acm_problems_status["problems"] = acm_problems_status
-                profile.save(update_fields=["accepted_number", "acm_problems_status"])
-
-            else:
-                oi_problems_status = profile.oi_problems_status.get("problems", {})
-                score = self.submission.statistic_info["score"]
-                if oi_problems_status[problem_id]["status"] != JudgeStatus.ACCEPTED:
-                    # minus last time score, add this tim score
-                    profile.add_score(this_time_score=score,
-                                      last_time_score=oi_problems_status[problem_id]["score"])
-                    oi_problems_status[problem_id]["score"] = score
-                    oi_problems_status[problem_id]["status"] = self.submission.result
-                    if self.submission.result == JudgeStatus.ACCEPTED:
-                        profile.accepted_number += 1
-                profile.oi_problems_status["problems"] = oi_problems_status
-                profile.save(update_fields=["accepted_number", "oi_problems_status"])
+            accepted = int(self.last_result != JudgeStatus.ACCEPTED and self.submission.result == JudgeStatus.ACCEPTED)
+            self._incr_problem_counter({str(self.last_result): -1, str(self.submission.result): 1},
+                                       accepted=accepted)
+            self._update_user_problem_status()
 
     def update_problem_status(self):
-        result = str(self.submission.result)
-        problem_id = str(self.problem.id)
         with transaction.atomic():
             # update problem status
-            problem = Problem.objects.select_for_update().get(contest_id=self.contest_id, id=self.problem.id)
-            problem.submission_number += 1
-            if self.submission.result == JudgeStatus.ACCEPTED:
-                problem.accepted_number += 1
-            problem_info = problem.statistic_info
-            problem_info[result] = problem_info.get(result, 0) + 1
-            problem.save(update_fields=["accepted_number", "submission_number", "statistic_info"])
-
+            self._incr_problem_counter({str(self.submission.result): 1}, submission=1,
+                                       accepted=int(self.submission.result == JudgeStatus.ACCEPTED))
             # update_userprofile
-            user = User.objects.select_for_update().get(id=self.submission.user_id)
-            user_profile = user.userprofile
-            user_profile.submission_number += 1
-            if problem.rule_type == ProblemRuleType.ACM:
-                acm_problems_status = user_profile.acm_problems_status.get("problems", {})
-                if problem_id not in acm_problems_status:
-                    acm_problems_status[problem_id] = {"status": self.submission.result, "_id": self.problem._id}
-                    if self.submission.result == JudgeStatus.ACCEPTED:
-                        user_profile.accepted_number += 1
-                elif acm_problems_status[problem_id]["status"] != JudgeStatus.ACCEPTED:
-                    acm_problems_status[problem_id]["status"] = self.submission.result
-                    if self.submission.result == JudgeStatus.ACCEPTED:
-                        user_profile.accepted_number += 1
-                user_profile.acm_problems_status["problems"] = acm_problems_status
-                user_profile.save(update_fields=["submission_number", "accepted_number", "acm_problems_status"])
-
-            else:
-                oi_problems_status = user_profile.oi_problems_status.get("problems", {})
-                score = self.submission.statistic_info["score"]
-                if problem_id not in oi_problems_status:
-                    user_profile.add_score(score)
-                    oi_problems_status[problem_id] = {"status": self.submission.result,
-                                                      "_id": self.problem._id,
-                                                      "score": score}
-                    if self.submission.result == JudgeStatus.ACCEPTED:
-                        user_profile.accepted_number += 1
-                elif oi_problems_status[problem_id]["status"] != JudgeStatus.ACCEPTED:
-                    # minus last time score, add this time score
-                    user_profile.add_score(this_time_score=score,
-                                           last_time_score=oi_problems_status[problem_id]["score"])
-                    oi_problems_status[problem_id]["score"] = score
-                    oi_problems_status[problem_id]["status"] = self.submission.result
-                    if self.submission.result == JudgeStatus.ACCEPTED:
-                        user_profile.accepted_number += 1
-                user_profile.oi_problems_status["problems"] = oi_problems_status
-                user_profile.save(update_fields=["submission_number", "accepted_number", "oi_problems_status"])
+            self._update_user_problem_status(submission_number=1)
 
     def update_contest_problem_status(self):
         with transaction.atomic():
-            user = User.objects.select_for_update().get(id=self.submission.user_id)
-            user_profile = user.userprofile
-            problem_id = str(self.problem.id)
-            if self.contest.rule_type == ContestRuleType.ACM:
-                contest_problems_status = user_profile.acm_problems_status.get("contest_problems", {})
-                if problem_id not in contest_problems_status:
-                    contest_problems_status[problem_id] = {"status": self.submission.result, "_id": self.problem._id}
-                elif contest_problems_status[problem_id]["status"] != JudgeStatus.ACCEPTED:
-                    contest_problems_status[problem_id]["status"] = self.submission.result
-                else:
+            is_oi = self.contest.rule_type == ContestRuleType.OI
+            score = self.submission.statistic_info["score"] if is_oi else 0
+            problem_status, created = self._lock_problem_status(score)
+            if not created:
+                if not is_oi and problem_status.status == JudgeStatus.ACCEPTED:
                     # 如果已AC， 直接跳过 不计入任何计数器
                     return
-                user_profile.acm_problems_status["contest_problems"] = contest_problems_status
-                user_profile.save(update_fields=["acm_problems_status"])
-
-            elif self.contest.rule_type == ContestRuleType.OI:
-                contest_problems_status = user_profile.oi_problems_status.get("contest_problems", {})
-                score = self.submission.statistic_info["score"]
-                if problem_id not in contest_problems_status:
-                    contest_problems_status[problem_id] = {"status": self.submission.result,
-                                                           "_id": self.problem._id,
-                                                           "score": score}
-                else:
-                    contest_problems_status[problem_id]["score"] = score
-                    contest_problems_status[problem_id]["status"] = self.submission.result
-                user_profile.oi_problems_status["contest_problems"] = contest_problems_status
-                user_profile.save(update_fields=["oi_problems_status"])
-
-            problem = Problem.objects.select_for_update().get(contest_id=self.contest_id, id=self.problem.id)
-            result = str(self.submission.result)
-            problem_info = problem.statistic_info
-            problem_info[result] = problem_info.get(result, 0) + 1
-            problem.submission_number += 1
-            if self.submission.result == JudgeStatus.ACCEPTED:
-                problem.accepted_number += 1
-            problem.save(update_fields=["submission_number", "accepted_number", "statistic_info"])
+                problem_status.status = self.submission.result
+                problem_status.score = score
+                problem_status.save(update_fields=["status", "score"])
+
+            self._incr_problem_counter({str(self.submission.result): 1}, submission=1,
+                                       accepted=int(self.submission.result == JudgeStatus.ACCEPTED))
 
     def update_contest_rank(self):
-        if self.contest.rule_type == ContestRuleType.OI or self.contest.real_time_rank:
-            cache.delete(f"{CacheKey.contest_rank_cache}:{self.contest.id}")
+        # 封榜之后只有封榜之前提交、之后才评测完的提交会改变快照
+        if self.contest.freeze_time is not None and self.submission.create_time < self.contest.freeze_time:
+            contest_rank_snapshot.invalidate(self.contest.id)
 
         def get_rank(model):
             return model.objects.select_for_update().get(user_id=self.submission.user_id, contest=self.contest)
@@ -352,12 +509,13 @@ class JudgeDispatcher(DispatcherBase):
                 rank = get_rank(model)
             except IntegrityError:
                 rank = get_rank(model)
+        before = contest_timeline.state(self.contest, rank)
         func(rank)
+        contest_timeline.record(self.contest, rank, self.submission.create_time, before)
+        contest_scoreboard.update(self.contest, rank)
 
     def _update_acm_contest_rank(self, rank):
         info = rank.submission_info.get(str(self.submission.problem_id))
-        # 因前面更改过，这里需要重新获取
-        problem = Problem.objects.select_for_update().get(contest_id=self.contest_id, id=self.problem.id)
         # 此题提交过
         if info:
             if info["is_ac"]:
@@ -370,7 +528,7 @@ class JudgeDispatcher(DispatcherBase):
                 info["ac_time"] = (self.submission.create_time - self.contest.start_time).total_seconds()
                 rank.total_time += info["ac_time"] + info["error_number"] * 20 * 60
 
-                if problem.accepted_number == 1:
+                if problem_counter.claim_first_ac(self.problem.id):
                     info["is_first_ac"] = True
             elif self.submission.result != JudgeStatus.COMPILE_ERROR:
                 info["error_number"] += 1
@@ -385,7 +543,7 @@ class JudgeDispatcher(DispatcherBase):
                 info["ac_time"] = (self.submission.create_time - self.contest.start_time).total_seconds()
                 rank.total_time += info["ac_time"]
 
-                if problem.accepted_number == 1:
+                if problem_counter.claim_first_ac(self.problem.id):
                     info["is_first_ac"] = True
 
             elif self.submission.result != JudgeStatus.COMPILE_ERROR:
@@ -0,0 +1,60 @@
+import json
+
+from utils.cache import cache
+from utils.constants import CacheKey
+
+# 评测结束后保留一段时间，晚订阅的客户端仍然可以读到完整的事件
+PROGRESS_STREAM_TTL = 10 * 60
+PROGRESS_STREAM_MAXLEN = 1000
+
+
+class JudgeProgressEvent:
+    PENDING = "pending"
+    JUDGING = "judging"
+    TEST_CASE = "test_case"
+    FINISHED = "finished"
+
+
+class JudgeProgress:
+    """
+    评测进度写入 redis stream(每个提交一个)，由 micro-service-server 转成 SSE 推送给前端。
+    test_case 事件以测试点编号区分，judge server 切换时可能重复发送，客户端按编号去重。
+    """
+    def __init__(self, redis_conn=cache):
+        self._redis_conn = redis_conn
+
+    @staticmethod
+    def _key(submission_id):
+        return f"{CacheKey.judge_progress}:{submission_id}"
+
+    def publish(self, submission_id, events):
+        """
+        :param events: [(event, data)]
+        """
+        if not events:
+            return
+        key = self._key(submission_id)
+        pipe = self._redis_conn.pipeline()
+        for event, data in events:
+            pipe.xadd(key, {"event": event, "data": json.dumps(data)}, maxlen=PROGRESS_STREAM_MAXLEN,
+                      approximate=True)
+        pipe.expire(key, PROGRESS_STREAM_TTL)
+        pipe.execute()
+
+    def reset(self, *submission_ids):
+        """
+        重判前删除上一次评测的事件，否则客户端从头读取时会读到旧的 finished 事件
+        """
+        if submission_ids:
+            self._redis_conn.delete_many([self._key(submission_id) for submission_id in submission_ids])
+
+    def test_cases(self, submission_id, resp_data):
+        events = []
+        for item in resp_data:
+            data = {"test_case": item["test_case"], "result": item["result"],
+                    "cpu_time": item["cpu_time"], "memory": item["memory"]}
+            events.append((JudgeProgressEvent.TEST_CASE, data))
+        self.publish(submission_id, events)
+
+
+judge_progress = JudgeProgress()
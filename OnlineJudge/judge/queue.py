@@ -0,0 +1,104 @@
+import json
+
+from utils.cache import cache
+from utils.constants import CacheKey
+
+
+class JudgeQueueLane:
+    CONTEST = "contest"
+    PRACTICE = "practice"
+    REJUDGE = "rejudge"
+
+
+# 有空闲 slot 时按权重从各个队列中取任务，比赛提交优先，重判不会饿死
+LANE_WEIGHTS = {
+    JudgeQueueLane.CONTEST: 6,
+    JudgeQueueLane.PRACTICE: 3,
+    JudgeQueueLane.REJUDGE: 1,
+}
+
+# Smooth weighted round robin (same as nginx upstream), only non-empty lanes take part.
+# KEYS[1..n]: lane lists, KEYS[n+1]: credit hash, KEYS[n+2]: legacy single waiting queue
+# ARGV[1]: max count, ARGV[2..n+1]: lane weights
+POP_SCRIPT = """
+local n = #KEYS - 2
+local credits_key = KEYS[n + 1]
+local legacy_key = KEYS[n + 2]
+local limit = tonumber(ARGV[1])
+local items = {}
+while #items < limit do
+    local item = redis.call("RPOP", legacy_key)
+    if not item then
+        break
+    end
+    table.insert(items, item)
+end
+while #items < limit do
+    local best, best_credit
+    local total = 0
+    local credits = {}
+    for i = 1, n do
+        if redis.call("LLEN", KEYS[i]) > 0 then
+            local weight = tonumber(ARGV[i + 1])
+            credits[i] = tonumber(redis.call("HGET", credits_key, KEYS[i]) or "0") + weight
+            total = total + weight
+            if best == nil or credits[i] > best_credit then
+                best = i
+                best_credit = credits[i]
+            end
+        else
+            redis.call("HDEL", credits_key, KEYS[i])
+        end
+    end
+    if best == nil then
+        break
+    end
+    credits[best] = credits[best] - total
+    for i, credit in pairs(credits) do
+        redis.call("HSET", credits_key, KEYS[i], credit)
+    end
+    table.insert(items, redis.call("RPOP", KEYS[best]))
+end
+return items
+"""
+
+
+class WaitingQueue:
+    """
+    没有空闲 judge server 时提交在这里排队，按 lane 分开存放，FIFO
+    """
+    def __init__(self, redis_conn=cache):
+        self._redis_conn = redis_conn
+        self._pop_script = None
+
+    @staticmethod
+    def lane_key(lane):
+        return f"{CacheKey.waiting_queue}:{lane}"
+
+    def push(self, lane, data, front=False):
+        """
+        :param front: 已经出队但没有抢到 slot 的任务放回队首，避免重新排队
+        """
+        if front:
+            self._redis_conn.rpush(self.lane_key(lane), json.dumps(data))
+        else:
+            self._redis_conn.lpush(self.lane_key(lane), json.dumps(data))
+
+    def pop(self, count):
+        if count <= 0:
+            return []
+        if self._pop_script is None:
+            self._pop_script = self._redis_conn.register_script(POP_SCRIPT)
+        lanes = list(LANE_WEIGHTS.keys())
+        keys = [self.lane_key(lane) for lane in lanes] + [CacheKey.waiting_queue_credits, CacheKey.waiting_queue]
+        items = self._pop_script(keys=keys, args=[count] + [LANE_WEIGHTS[lane] for lane in lanes])
+        return [json.loads(item.decode("utf-8")) for item in items]
+
+    def size(self):
+        pipe = self._redis_conn.pipeline()
+        for lane in LANE_WEIGHTS:
+            pipe.llen(self.lane_key(lane))
+        return dict(zip(LANE_WEIGHTS.keys(), pipe.execute()))
+
+
+waiting_queue = WaitingQueue()
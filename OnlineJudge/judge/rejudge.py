@@ -0,0 +1,375 @@
+import json
+import logging
+import time
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+
+from account.models import AdminType, User, UserProfile
+from account.rank_index import user_rank_index
+from contest.best_score import rebuild_best_scores
+from contest.models import ACMContestRank, Contest, ContestRuleType, OIContestRank
+from contest.rank_snapshot import contest_rank_snapshot
+from contest.scoreboard import contest_scoreboard
+from contest.timeline import contest_timeline
+from judge.progress import judge_progress
+from judge.queue import JudgeQueueLane, waiting_queue
+from problem.counters import problem_counter
+from problem.models import Problem, ProblemRuleType, UserProblemStatus
+from submission.models import JudgeStatus, Submission
+from utils.cache import cache
+from utils.constants import CacheKey
+from utils.shortcuts import rand_str
+
+logger = logging.getLogger(__name__)
+
+# 每秒发送给 judge 的提交数
+DEFAULT_REJUDGE_RATE = 5
+MAX_REJUDGE_RATE = 100
+TICK_SECONDS = 1
+# 全部发送后每隔 WAIT_SECONDS 检查一次，超过 STALL_TIMEOUT 没有进展则直接结束(例如 worker 崩溃)
+WAIT_SECONDS = 10
+STALL_TIMEOUT = 30 * 60
+JOB_TTL = 7 * 24 * 60 * 60
+BATCH_SIZE = 500
+
+
+class RejudgeJobStatus:
+    RUNNING = "running"
+    FINALIZING = "finalizing"
+    FINISHED = "finished"
+
+
+def _counted_submissions(problem_ids):
+    # 与 JudgeDispatcher 一致，比赛管理员的提交不计入比赛的统计
+    super_admins = User.objects.filter(admin_type=AdminType.SUPER_ADMIN).values_list("id", flat=True)
+    return Submission.objects.filter(problem_id__in=problem_ids) \
+        .exclude(result__in=[JudgeStatus.PENDING, JudgeStatus.JUDGING]) \
+        .exclude(Q(contest_id__isnull=False) & (Q(user_id__in=super_admins) | Q(user_id=F("contest__created_by_id"))))
+
+
+def _score(statistic_info):
+    return (statistic_info or {}).get("score", 0)
+
+
+def _until_first_ac(submissions, problem_ids):
+    """
+    与 JudgeDispatcher.update_contest_problem_status 一致，ACM 比赛题目在用户第一次 AC 之后的提交不计入统计
+    :param problem_ids: ACM 比赛题目的 id
+    """
+    if not problem_ids:
+        return submissions
+    first_ac = Submission.objects.filter(user_id=OuterRef("user_id"), problem_id=OuterRef("problem_id"),
+                                         result=JudgeStatus.ACCEPTED).order_by("create_time").values("create_time")[:1]
+    return submissions.annotate(first_ac_time=Subquery(first_ac)) \
+        .filter(~Q(problem_id__in=problem_ids) | Q(first_ac_time__isnull=True) | Q(create_time__lte=F("first_ac_time")))
+
+
+def recompute_problem_statistics(problem_ids):
+    """
+    根据提交记录重新计算 submission_number、accepted_number 和 statistic_info
+    """
+    # redis 中还没有写入的增量已经包含在提交记录里了，先写入数据库再覆盖
+    problem_counter.flush(problem_ids, blocking=True)
+    with transaction.atomic():
+        problems = list(Problem.objects.select_for_update().filter(id__in=problem_ids))
+        acm_contest_problem_ids = [problem.id for problem in problems
+                                   if problem.contest_id and problem.rule_type == ProblemRuleType.ACM]
+        statistic = {}
+        rows = _until_first_ac(_counted_submissions(problem_ids), acm_contest_problem_ids) \
+            .values("problem_id", "result").annotate(count=Count("id"))
+        for row in rows.order_by():
+            statistic.setdefault(row["problem_id"], {})[str(row["result"])] = row["count"]
+        for problem in problems:
+            problem.statistic_info = statistic.get(problem.id, {})
+            problem.submission_number = sum(problem.statistic_info.values())
+            problem.accepted_number = problem.statistic_info.get(str(JudgeStatus.ACCEPTED), 0)
+        Problem.objects.bulk_update(problems, ["submission_number", "accepted_number", "statistic_info"])
+
+
+def recompute_user_problem_status(problem_ids):
+    """
+    重新计算 UserProblemStatus 中的题目状态，与逐个评测时的规则一致:
+    AC 之后状态不再变化(OI 比赛题目除外)，否则取最后一次提交的结果
+    """
+    problems = {problem.id: problem for problem in Problem.objects.filter(id__in=problem_ids)}
+    counted = _counted_submissions(problem_ids)
+    fields = ("user_id", "problem_id", "result", "statistic_info")
+    latest = counted.order_by("user_id", "problem_id", "-create_time").distinct("user_id", "problem_id")
+    accepted = counted.filter(result=JudgeStatus.ACCEPTED) \
+        .order_by("user_id", "problem_id", "create_time").distinct("user_id", "problem_id")
+
+    status = {}
+    for user_id, problem_id, result, statistic_info in latest.values_list(*fields):
+        status.setdefault(user_id, {})[problem_id] = (result, _score(statistic_info))
+    for user_id, problem_id, result, statistic_info in accepted.values_list(*fields):
+        problem = problems[problem_id]
+        if problem.contest_id and problem.rule_type == ProblemRuleType.OI:
+            continue
+        status[user_id][problem_id] = (result, _score(statistic_info))
+
+    user_ids = sorted(status.keys())
+    for i in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[i:i + BATCH_SIZE]
+        with transaction.atomic():
+            profiles = list(UserProfile.objects.select_for_update().filter(user_id__in=batch))
+            existing = UserProblemStatus.objects.select_for_update().filter(user_id__in=batch, problem_id__in=problem_ids)
+            existing = {(item.user_id, item.problem_id): item for item in existing}
+            created, updated = [], []
+            for profile in profiles:
+                for problem_id, (result, score) in status[profile.user_id].items():
+                    problem = problems[problem_id]
+                    problem_status = existing.get((profile.user_id, problem_id))
+                    if problem_status is None:
+                        _apply_problem_status(profile, problem, None, 0, result, score)
+                        created.append(UserProblemStatus(user_id=profile.user_id, problem_id=problem_id,
+                                                         contest_id=problem.contest_id, status=result, score=score))
+                    else:
+                        _apply_problem_status(profile, problem, problem_status.status, problem_status.score,
+                                              result, score)
+                        problem_status.status, problem_status.score = result, score
+                        updated.append(problem_status)
+            UserProfile.objects.bulk_update(profiles, ["accepted_number", "total_score"])
+            user_rank_index.update_users(batch)
+            # 并发评测时 dispatcher 可能已经创建了同一行
+            UserProblemStatus.objects.bulk_create(created, ignore_conflicts=True)
+            UserProblemStatus.objects.bulk_update(updated, ["status", "score"])
+
+
+def _apply_problem_status(profile, problem, old_status, old_score, result, score):
+    # 比赛题目不计入个人的 AC 数和总分
+    if problem.contest_id:
+        return
+    profile.accepted_number += int(result == JudgeStatus.ACCEPTED) - int(old_status == JudgeStatus.ACCEPTED)
+    if problem.rule_type == ProblemRuleType.OI:
+        profile.total_score += score - old_score
+
+
+def replay_contest_rank(contest, until=None, on_change=None):
+    """
+    按提交时间顺序重放比赛中的提交
+    :param until: 只重放这个时间之前的提交，用于计算封榜时的排名
+    :param on_change: 用户的 AC 数、罚时或者总分变化之后调用 on_change(user_id, create_time, 排名的各个字段)
+    :return: {user_id: 排名的各个字段}
+    """
+    problem_ids = Problem.objects.filter(contest=contest).values_list("id", flat=True)
+    rows = _counted_submissions(problem_ids)
+    if until is not None:
+        rows = rows.filter(create_time__lt=until)
+    rows = rows.order_by("create_time") \
+        .values_list("user_id", "problem_id", "result", "create_time", "statistic_info")
+
+    ranks = {}
+    if contest.rule_type == ContestRuleType.ACM:
+        first_ac = set()
+        for user_id, problem_id, result, create_time, _ in rows.iterator(chunk_size=BATCH_SIZE):
+            rank = ranks.setdefault(user_id, {"submission_number": 0, "accepted_number": 0, "total_time": 0,
+                                              "submission_info": {}})
+            info = rank["submission_info"].setdefault(str(problem_id), {"is_ac": False, "ac_time": 0,
+                                                                        "error_number": 0, "is_first_ac": False})
+            if info["is_ac"]:
+                continue
+            rank["submission_number"] += 1
+            if result == JudgeStatus.ACCEPTED:
+                info["is_ac"] = True
+                info["ac_time"] = (create_time - contest.start_time).total_seconds()
+                rank["accepted_number"] += 1
+                rank["total_time"] += info["ac_time"] + info["error_number"] * 20 * 60
+                if problem_id not in first_ac:
+                    info["is_first_ac"] = True
+                    first_ac.add(problem_id)
+                if on_change is not None:
+                    on_change(user_id, create_time, rank)
+            elif result != JudgeStatus.COMPILE_ERROR:
+                info["error_number"] += 1
+    else:
+        for user_id, problem_id, _, create_time, statistic_info in rows.iterator(chunk_size=BATCH_SIZE):
+            rank = ranks.setdefault(user_id, {"submission_number": 0, "total_score": 0, "submission_info": {}})
+            rank["submission_number"] += 1
+            rank["submission_info"][str(problem_id)] = int(_score(statistic_info))
+            total_score = sum(rank["submission_info"].values())
+            if on_change is not None and total_score != rank["total_score"]:
+                rank["total_score"] = total_score
+                on_change(user_id, create_time, rank)
+            rank["total_score"] = total_score
+    return ranks
+
+
+def rebuild_contest_rank(contest):
+    """
+    重放比赛中的全部提交，重建排名
+    """
+    ranks = replay_contest_rank(contest)
+    if contest.rule_type == ContestRuleType.ACM:
+        model = ACMContestRank
+        fields = ["submission_number", "accepted_number", "total_time", "submission_info"]
+    else:
+        model = OIContestRank
+        fields = ["submission_number", "total_score", "submission_info"]
+
+    with transaction.atomic():
+        existing = {rank.user_id: rank for rank in model.objects.select_for_update().filter(contest=contest)}
+        updated, created = [], []
+        for user_id, data in ranks.items():
+            rank = existing.get(user_id)
+            if rank is None:
+                created.append(model(user_id=user_id, contest=contest, **data))
+            else:
+                for k, v in data.items():
+                    setattr(rank, k, v)
+                updated.append(rank)
+        model.objects.bulk_update(updated, fields, batch_size=BATCH_SIZE)
+        model.objects.bulk_create(created, batch_size=BATCH_SIZE)
+    contest_timeline.rebuild(contest)
+    contest_rank_snapshot.invalidate(contest.id)
+    contest_scoreboard.invalidate([contest.id])
+
+
+class BulkRejudge:
+    """
+    批量重判: 按固定速率把提交放入 judge 队列，全部评测结束后统一重新计算统计信息，
+    逐个评测时不再更新 Problem、UserProfile 和比赛排名
+    """
+    def __init__(self, redis_conn=cache):
+        self._redis_conn = redis_conn
+
+    @staticmethod
+    def _key(job_id):
+        return f"{CacheKey.rejudge_job}:{job_id}"
+
+    @staticmethod
+    def _pending_key(job_id):
+        return f"{CacheKey.rejudge_job}:{job_id}:pending"
+
+    def create(self, submissions, rate=DEFAULT_REJUDGE_RATE, created_by=None):
+        """
+        :return: job id，没有需要重判的提交时返回 None
+        """
+        items = list(submissions.values_list("id", "problem_id", "contest_id"))
+        if not items:
+            return None
+        job_id = rand_str(16)
+        now = time.time()
+        pipe = self._redis_conn.pipeline()
+        pipe.hset(self._key(job_id), mapping={
+            "id": job_id,
+            "status": RejudgeJobStatus.RUNNING,
+            "cancelled": 0,
+            "total": len(items),
+            "dispatched": 0,
+            "finished": 0,
+            "rate": rate,
+            "problem_ids": json.dumps(sorted({item[1] for item in items})),
+            "contest_ids": json.dumps(sorted({item[2] for item in items if item[2]})),
+            "created_by": created_by or "",
+            "create_time": now,
+            "last_progress": now,
+        })
+        for i in range(0, len(items), BATCH_SIZE):
+            pipe.rpush(self._pending_key(job_id), *[f"{item[0]}:{item[1]}" for item in items[i:i + BATCH_SIZE]])
+        pipe.expire(self._key(job_id), JOB_TTL)
+        pipe.expire(self._pending_key(job_id), JOB_TTL)
+        pipe.execute()
+
+        from judge.tasks import rejudge_tick_task
+        rejudge_tick_task.send(job_id)
+        return job_id
+
+    def get(self, job_id):
+        data = self._redis_conn.hgetall(self._key(job_id))
+        if not data:
+            return None
+        job = {k.decode("utf-8"): v.decode("utf-8") for k, v in data.items()}
+        for k in ("total", "dispatched", "finished", "rate", "cancelled"):
+            job[k] = int(job[k])
+        job["cancelled"] = bool(job["cancelled"])
+        for k in ("problem_ids", "contest_ids"):
+            job[k] = json.loads(job[k])
+        for k in ("create_time", "last_progress"):
+            job[k] = float(job[k])
+        return job
+
+    def cancel(self, job_id):
+        """
+        停止发送剩余的提交，已经发送的评测结束后照常重新计算统计信息
+        """
+        job = self.get(job_id)
+        if not job or job["status"] != RejudgeJobStatus.RUNNING:
+            return False
+        self._redis_conn.delete(self._pending_key(job_id))
+        pipe = self._redis_conn.pipeline()
+        pipe.hset(self._key(job_id), mapping={"cancelled": 1, "total": job["dispatched"]})
+        pipe.hget(self._key(job_id), "finished")
+        _, finished = pipe.execute()
+        if int(finished) >= job["dispatched"]:
+            self._start_finalize(job_id)
+        return True
+
+    def tick(self, job_id):
+        """
+        发送一批提交，返回下一次调用的间隔(秒)，返回 None 表示不需要再调用
+        """
+        job = self.get(job_id)
+        if not job or job["status"] != RejudgeJobStatus.RUNNING:
+            return None
+        if job["dispatched"] < job["total"]:
+            # 有正常提交在排队时暂停，优先处理正常提交
+            size = waiting_queue.size()
+            if size[JudgeQueueLane.CONTEST] or size[JudgeQueueLane.PRACTICE]:
+                return TICK_SECONDS
+            self._dispatch(job_id, job["rate"] * TICK_SECONDS)
+            return TICK_SECONDS
+        if time.time() - job["last_progress"] > STALL_TIMEOUT:
+            logger.error("Rejudge job %s stalled at %s/%s, finalizing", job_id, job["finished"], job["total"])
+            self._start_finalize(job_id)
+            return None
+        return WAIT_SECONDS
+
+    def _dispatch(self, job_id, count):
+        pipe = self._redis_conn.pipeline()
+        pipe.lrange(self._pending_key(job_id), 0, count - 1)
+        pipe.ltrim(self._pending_key(job_id), count, -1)
+        items, _ = pipe.execute()
+        if not items:
+            return
+        items = [item.decode("utf-8").split(":") for item in items]
+        Submission.objects.filter(id__in=[item[0] for item in items]).update(statistic_info={})
+        judge_progress.reset(*[item[0] for item in items])
+        pipe = self._redis_conn.pipeline()
+        pipe.hincrby(self._key(job_id), "dispatched", len(items))
+        pipe.hset(self._key(job_id), "last_progress", time.time())
+        pipe.execute()
+
+        from judge.tasks import judge_task
+        for submission_id, problem_id in items:
+            judge_task.send(submission_id, int(problem_id), rejudge_job=job_id)
+
+    def submission_done(self, job_id):
+        pipe = self._redis_conn.pipeline()
+        pipe.hincrby(self._key(job_id), "finished", 1)
+        pipe.hset(self._key(job_id), "last_progress", time.time())
+        pipe.hget(self._key(job_id), "total")
+        finished, _, total = pipe.execute()
+        if total is not None and finished >= int(total):
+            self._start_finalize(job_id)
+
+    def _start_finalize(self, job_id):
+        # hsetnx 保证只触发一次
+        if self._redis_conn.hsetnx(self._key(job_id), "finalize", 1):
+            self._redis_conn.hset(self._key(job_id), "status", RejudgeJobStatus.FINALIZING)
+            from judge.tasks import rejudge_finalize_task
+            rejudge_finalize_task.send(job_id)
+
+    def finalize(self, job_id):
+        job = self.get(job_id)
+        if not job:
+            return
+        recompute_problem_statistics(job["problem_ids"])
+        recompute_user_problem_status(job["problem_ids"])
+        for contest in Contest.objects.filter(id__in=job["contest_ids"]):
+            rebuild_contest_rank(contest)
+            rebuild_best_scores(contest.id, problem_ids=job["problem_ids"])
+        self._redis_conn.hset(self._key(job_id), "status", RejudgeJobStatus.FINISHED)
+
+
+bulk_rejudge = BulkRejudge()
@@ -0,0 +1,89 @@
+import glob
+import json
+import os
+import shutil
+
+from django.conf import settings
+
+from problem.models import Problem
+from utils.shortcuts import rand_str
+
+
+def _load_test_cases(test_case_id):
+    with open(os.path.join(settings.TEST_CASE_DIR, test_case_id, "info"), encoding="utf-8") as f:
+        info = json.load(f)
+    return info["spj"], sorted(info["test_cases"].items(), key=lambda item: int(item[0]))
+
+
+def _ensure_shards(test_case_id, name, spj, groups):
+    """
+    分片目录只创建一次，测试用例修改后 test_case_id 会变化，旧的目录由 remove_unused_shards 删除
+    """
+    test_case_dir = os.path.join(settings.TEST_CASE_DIR, test_case_id)
+    ret = []
+    for index, test_cases in enumerate(groups):
+        shard_id = f"{test_case_id}_{name}_{index}"
+        shard_dir = os.path.join(settings.TEST_CASE_DIR, shard_id)
+        if not os.path.exists(os.path.join(shard_dir, "info")):
+            _create_shard(test_case_dir, shard_dir, spj, test_cases)
+        ret.append(shard_id)
+    return ret
+
+
+def split_test_case(test_case_id, count):
+    """
+    把一组测试用例轮流分到 count 个目录中，judge server 可以分别评测。
+    文件使用硬链接，编号保持不变，各个分片的结果可以直接合并。
+    :return: 分片的 test_case_id 列表
+    """
+    spj, test_cases = _load_test_cases(test_case_id)
+    count = min(count, len(test_cases))
+    return _ensure_shards(test_case_id, str(count), spj, [test_cases[i::count] for i in range(count)])
+
+
+def chunk_test_case(test_case_id, first_size, growth):
+    """
+    按编号顺序切成连续的几块，第一块 first_size 个测试点，之后每块是前一块的 growth 倍
+    :return: 按顺序排列的分块 test_case_id 列表
+    """
+    spj, test_cases = _load_test_cases(test_case_id)
+    groups = []
+    start, size = 0, first_size
+    while start < len(test_cases):
+        groups.append(test_cases[start:start + size])
+        start += size
+        size *= growth
+    return _ensure_shards(test_case_id, f"c{first_size}x{growth}", spj, groups)
+
+
+def remove_unused_shards(test_case_id):
+    """
+    题目修改了测试用例或者被删除之后调用，已经没有题目使用 test_case_id 时删除由它生成的分片和分块目录。
+    原来的测试用例目录保持不变
+    """
+    if not test_case_id or Problem.objects.filter(test_case_id=test_case_id).exists():
+        return
+    # 分片目录为 {test_case_id}_{name}_{index}，包括创建失败时留下的临时目录
+    for path in glob.glob(os.path.join(settings.TEST_CASE_DIR, glob.escape(test_case_id) + "_*")):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _create_shard(test_case_dir, shard_dir, spj, test_cases):
+    # 先写到临时目录再 rename，其他 worker 不会看到写了一半的目录
+    tmp_dir = f"{shard_dir}.{rand_str(8)}"
+    os.mkdir(tmp_dir)
+    os.chmod(tmp_dir, 0o710)
+    try:
+        for _, item in test_cases:
+            for name in (item.get("input_name"), item.get("output_name")):
+                if name:
+                    os.link(os.path.join(test_case_dir, name), os.path.join(tmp_dir, name))
+        with open(os.path.join(tmp_dir, "info"), "w", encoding="utf-8") as f:
+            f.write(json.dumps({"spj": spj, "test_cases": dict(test_cases)}, indent=4))
+        os.chmod(os.path.join(tmp_dir, "info"), 0o640)
+        os.rename(tmp_dir, shard_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # 其他 worker 已经创建好了
+        if not os.path.exists(os.path.join(shard_dir, "info")):
+            raise
@@ -3,12 +3,27 @@ import dramatiq
 from account.models import User
 from submission.models import Submission
 from judge.dispatcher import JudgeDispatcher
+from judge.rejudge import bulk_rejudge
 from utils.shortcuts import DRAMATIQ_WORKER_ARGS
 
 
 @dramatiq.actor(**DRAMATIQ_WORKER_ARGS())
-def judge_task(submission_id, problem_id):
+def judge_task(submission_id, problem_id, queued=False, rejudge_job=None):
     uid = Submission.objects.get(id=submission_id).user_id
     if User.objects.get(id=uid).is_disabled:
+        if rejudge_job:
+            bulk_rejudge.submission_done(rejudge_job)
         return
-    JudgeDispatcher(submission_id, problem_id).judge()
+    JudgeDispatcher(submission_id, problem_id, rejudge_job=rejudge_job).judge(queued=queued)
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS())
+def rejudge_tick_task(job_id):
+    delay = bulk_rejudge.tick(job_id)
+    if delay is not None:
+        rejudge_tick_task.send_with_options(args=(job_id,), delay=delay * 1000)
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS())
+def rejudge_finalize_task(job_id):
+    bulk_rejudge.finalize(job_id)
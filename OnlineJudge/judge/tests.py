@@ -0,0 +1,680 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from conf.models import JudgeServer
+from contest.models import ACMContestRank, Contest, ContestRuleType
+from problem.models import Problem, UserProblemStatus
+from utils.cache import cache
+from utils.constants import CacheKey
+from .allocator import slot_allocator, CIRCUIT_FAILURE_THRESHOLD
+from submission.models import JudgeStatus, Submission
+from submission.tests import SubmissionPrepare
+from .dispatcher import ChooseJudgeServer, DispatcherBase, JudgeDispatcher, JudgeServerUnreachable, process_pending_task
+from .progress import JudgeProgressEvent
+from .queue import JudgeQueueLane, LANE_WEIGHTS, waiting_queue
+from .rejudge import (bulk_rejudge, rebuild_contest_rank, recompute_problem_statistics, recompute_user_problem_status,
+                      RejudgeJobStatus)
+from .sharding import chunk_test_case, remove_unused_shards, split_test_case
+from .verdict_cache import verdict_cache
+
+
+def create_judge_server(hostname, cpu_core=1, **kwargs):
+    data = {"hostname": hostname, "judger_version": "2.0.0", "cpu_core": cpu_core, "cpu_usage": 0,
+            "memory_usage": 0, "last_heartbeat": timezone.now(), "service_url": f"http://{hostname}:8080"}
+    data.update(kwargs)
+    server = JudgeServer.objects.create(**data)
+    slot_allocator.register(server)
+    return server
+
+
+class JudgeServerTestCase(TestCase):
+    def setUp(self):
+        cache.delete(CacheKey.judge_server_registry)
+
+    def tearDown(self):
+        for server in JudgeServer.objects.all():
+            slot_allocator.unregister(server.id)
+
+    def create_server(self, hostname, cpu_core=1, **kwargs):
+        return create_judge_server(hostname, cpu_core, **kwargs)
+
+
+class SlotAllocatorTest(JudgeServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = self.create_server("server1", cpu_core=1)
+
+    def test_acquire_and_release(self):
+        with ChooseJudgeServer() as server:
+            self.assertEqual(server.id, self.server.id)
+            self.assertEqual(server.service_url, self.server.service_url)
+            self.assertEqual(slot_allocator.usage([self.server.id]), {self.server.id: 1})
+        self.assertEqual(slot_allocator.usage([self.server.id]), {self.server.id: 0})
+
+    def test_capacity(self):
+        # 与原来的 task_number <= cpu_core * 2 一致
+        leases = [slot_allocator.acquire() for _ in range(3)]
+        self.assertTrue(all(leases))
+        self.assertIsNone(slot_allocator.acquire())
+        slot_allocator.release(leases[0])
+        self.assertIsNotNone(slot_allocator.acquire())
+
+    def test_least_loaded_server(self):
+        other = self.create_server("server2", cpu_core=4)
+        first = slot_allocator.acquire()
+        second = slot_allocator.acquire()
+        self.assertNotEqual(first.id, second.id)
+        self.assertEqual({first.id, second.id}, {self.server.id, other.id})
+
+    def test_skip_disabled_and_abnormal_server(self):
+        self.server.is_disabled = True
+        slot_allocator.register(self.server)
+        self.create_server("server2", last_heartbeat=timezone.now() - timedelta(seconds=60))
+        self.assertIsNone(slot_allocator.acquire())
+
+    def test_lease_expire(self):
+        leases = [slot_allocator.acquire(ttl=0) for _ in range(3)]
+        self.assertTrue(all(leases))
+        self.assertIsNotNone(slot_allocator.acquire())
+
+    def test_short_lease_keeps_long_expiry(self):
+        # run-code 的 60 秒 lease 和评测的 600 秒 lease 在同一个 key 中
+        slot_key = f"{CacheKey.judge_server_slots}:{self.server.id}"
+        long_lease = slot_allocator.acquire(ttl=600)
+        short_lease = slot_allocator.acquire(ttl=60)
+        self.assertGreater(cache.pttl(slot_key), 590 * 1000)
+        slot_allocator.release(long_lease)
+        slot_allocator.release(short_lease)
+
+        slot_allocator.acquire(ttl=60)
+        slot_allocator.acquire(ttl=600)
+        self.assertGreater(cache.pttl(slot_key), 590 * 1000)
+
+    def test_exclude(self):
+        self.assertIsNone(slot_allocator.acquire(exclude=[self.server.id]))
+        other = self.create_server("server2")
+        self.assertEqual(slot_allocator.acquire(exclude=[self.server.id]).id, other.id)
+
+    def test_circuit_breaker(self):
+        for _ in range(CIRCUIT_FAILURE_THRESHOLD - 1):
+            self.assertFalse(slot_allocator.report_failure(self.server.id))
+        self.assertTrue(slot_allocator.report_failure(self.server.id))
+        self.assertIsNone(slot_allocator.acquire())
+
+    def test_free_slots(self):
+        self.assertEqual(slot_allocator.free_slots(), 3)
+        lease = slot_allocator.acquire()
+        self.assertEqual(slot_allocator.free_slots(), 2)
+        slot_allocator.release(lease)
+        self.server.is_disabled = True
+        slot_allocator.register(self.server)
+        self.assertEqual(slot_allocator.free_slots(), 0)
+
+    def test_success_resets_failures(self):
+        for _ in range(CIRCUIT_FAILURE_THRESHOLD - 1):
+            slot_allocator.report_failure(self.server.id)
+        slot_allocator.report_success(self.server.id)
+        self.assertFalse(slot_allocator.report_failure(self.server.id))
+        self.assertIsNotNone(slot_allocator.acquire())
+
+
+@mock.patch("judge.dispatcher.SysOptions")
+class FailoverTest(JudgeServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.servers = [self.create_server(f"server{i}") for i in range(2)]
+
+    def test_move_to_next_server(self, sys_options):
+        sys_options.judge_server_token = "token"
+        dispatcher = DispatcherBase()
+        urls = []
+
+        def request(url, data=None, read_timeout=None):
+            urls.append(url)
+            if len(urls) == 1:
+                raise JudgeServerUnreachable(url)
+            return {"err": None, "data": []}
+
+        with mock.patch.object(dispatcher, "_request", side_effect=request):
+            resp, tried = dispatcher._request_with_failover("/judge", {})
+        self.assertEqual(resp, {"err": None, "data": []})
+        self.assertEqual(len(tried), 1)
+        self.assertEqual(len(set(urls)), 2)
+        self.assertEqual(slot_allocator.usage([s.id for s in self.servers]), {s.id: 0 for s in self.servers})
+
+    def test_all_servers_failed(self, sys_options):
+        sys_options.judge_server_token = "token"
+        dispatcher = DispatcherBase()
+        with mock.patch.object(dispatcher, "_request", side_effect=JudgeServerUnreachable):
+            resp, tried = dispatcher._request_with_failover("/judge", {})
+        self.assertIsNone(resp)
+        self.assertEqual(sorted(tried), sorted(s.id for s in self.servers))
+
+    def test_read_timeout_not_retried(self, sys_options):
+        sys_options.judge_server_token = "token"
+        dispatcher = DispatcherBase()
+        with mock.patch("judge.transport.post", side_effect=requests.ReadTimeout) as post, \
+                mock.patch.object(slot_allocator, "report_failure") as report_failure:
+            resp, tried = dispatcher._request_with_failover("/judge", {})
+        # 失败但不换 server，也不计入熔断
+        self.assertIsNone(resp)
+        self.assertEqual(len(tried), 1)
+        self.assertEqual(post.call_count, 1)
+        report_failure.assert_not_called()
+
+    def test_connect_error_retried(self, sys_options):
+        sys_options.judge_server_token = "token"
+        dispatcher = DispatcherBase()
+        response = mock.Mock(json=mock.Mock(return_value={"err": None, "data": []}))
+        with mock.patch("judge.transport.post", side_effect=[requests.ConnectTimeout(), response]) as post:
+            resp, tried = dispatcher._request_with_failover("/judge", {})
+        self.assertEqual(resp, {"err": None, "data": []})
+        self.assertEqual(len(tried), 1)
+        self.assertEqual(post.call_count, 2)
+
+
+class WaitingQueueTest(JudgeServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self._clear()
+
+    def tearDown(self):
+        self._clear()
+        super().tearDown()
+
+    def _clear(self):
+        cache.delete_many([waiting_queue.lane_key(lane) for lane in LANE_WEIGHTS] +
+                          [CacheKey.waiting_queue, CacheKey.waiting_queue_credits])
+
+    def _fill(self, lane, count):
+        for i in range(count):
+            waiting_queue.push(lane, {"submission_id": f"{lane}-{i}", "problem_id": 1})
+
+    def test_fifo(self):
+        self._fill(JudgeQueueLane.PRACTICE, 3)
+        items = waiting_queue.pop(10)
+        self.assertEqual([item["submission_id"] for item in items], ["practice-0", "practice-1", "practice-2"])
+        self.assertEqual(waiting_queue.pop(10), [])
+
+    def test_push_front(self):
+        self._fill(JudgeQueueLane.PRACTICE, 2)
+        waiting_queue.push(JudgeQueueLane.PRACTICE, {"submission_id": "requeued", "problem_id": 1}, front=True)
+        self.assertEqual(waiting_queue.pop(1)[0]["submission_id"], "requeued")
+
+    def test_weighted(self):
+        total = sum(LANE_WEIGHTS.values())
+        for lane in LANE_WEIGHTS:
+            self._fill(lane, total)
+        lanes = [item["submission_id"].split("-")[0] for item in waiting_queue.pop(total)]
+        self.assertEqual({lane: lanes.count(lane) for lane in LANE_WEIGHTS}, LANE_WEIGHTS)
+        # 平滑加权，比赛提交不会一次性全部排在最前面
+        self.assertIn(JudgeQueueLane.PRACTICE, lanes[:3])
+
+    def test_rejudge_not_starved(self):
+        self._fill(JudgeQueueLane.CONTEST, 100)
+        self._fill(JudgeQueueLane.REJUDGE, 1)
+        lanes = [item["submission_id"].split("-")[0] for item in waiting_queue.pop(10)]
+        self.assertIn(JudgeQueueLane.REJUDGE, lanes)
+
+    def test_legacy_queue_first(self):
+        self._fill(JudgeQueueLane.CONTEST, 1)
+        cache.lpush(CacheKey.waiting_queue, json.dumps({"submission_id": "legacy", "problem_id": 1}))
+        self.assertEqual([item["submission_id"] for item in waiting_queue.pop(2)], ["legacy", "contest-0"])
+
+    def test_size(self):
+        self._fill(JudgeQueueLane.CONTEST, 2)
+        self.assertEqual(waiting_queue.size(), {JudgeQueueLane.CONTEST: 2, JudgeQueueLane.PRACTICE: 0,
+                                                JudgeQueueLane.REJUDGE: 0})
+
+    @mock.patch("judge.tasks.judge_task")
+    def test_drain_fills_free_slots(self, judge_task):
+        self.create_server("server1", cpu_core=1)
+        self._fill(JudgeQueueLane.PRACTICE, 5)
+        process_pending_task()
+        self.assertEqual(judge_task.send.call_count, 3)
+        judge_task.send.assert_any_call(queued=True, submission_id="practice-0", problem_id=1)
+        self.assertEqual(waiting_queue.size()[JudgeQueueLane.PRACTICE], 2)
+
+    @mock.patch("judge.tasks.judge_task")
+    def test_drain_without_server(self, judge_task):
+        self._fill(JudgeQueueLane.PRACTICE, 1)
+        process_pending_task()
+        judge_task.send.assert_not_called()
+        self.assertEqual(waiting_queue.size()[JudgeQueueLane.PRACTICE], 1)
+
+
+class VerdictCacheTest(SubmissionPrepare):
+    def setUp(self):
+        self._create_problem_and_submission()
+        self.submission_data["user_id"] = self.problem.created_by_id
+        Submission.objects.filter(id=self.submission.id).update(user_id=self.problem.created_by_id)
+        verdict_cache.invalidate(self.problem.test_case_id)
+        self.resp = {"err": None, "data": [{"test_case": "1", "result": JudgeStatus.ACCEPTED, "cpu_time": 1,
+                                            "real_time": 1, "memory": 1024, "signal": 0, "exit_code": 0}]}
+
+    def tearDown(self):
+        verdict_cache.invalidate(self.problem.test_case_id)
+
+    def test_fingerprint(self):
+        data = {"src": "code", "max_cpu_time": 1000, "max_memory": 1024, "spj_version": None, "io_mode": {}}
+        fingerprint = verdict_cache.fingerprint("C", data)
+        self.assertEqual(fingerprint, verdict_cache.fingerprint("C", dict(data)))
+        self.assertNotEqual(fingerprint, verdict_cache.fingerprint("C++", data))
+        self.assertNotEqual(fingerprint, verdict_cache.fingerprint("C", dict(data, max_cpu_time=2000)))
+        self.assertNotEqual(fingerprint, verdict_cache.fingerprint("C", dict(data, src="code ")))
+
+    def test_not_cache_system_error(self):
+        self.resp["data"][0]["result"] = JudgeStatus.SYSTEM_ERROR
+        verdict_cache.set(self.problem.test_case_id, "fingerprint", self.resp)
+        self.assertIsNone(verdict_cache.get(self.problem.test_case_id, "fingerprint"))
+        verdict_cache.set(self.problem.test_case_id, "fingerprint", {"err": "JudgeClientError", "data": "error"})
+        self.assertIsNone(verdict_cache.get(self.problem.test_case_id, "fingerprint"))
+
+    def test_invalidate(self):
+        verdict_cache.set(self.problem.test_case_id, "fingerprint", self.resp)
+        self.assertEqual(verdict_cache.get(self.problem.test_case_id, "fingerprint"), self.resp)
+        verdict_cache.invalidate(self.problem.test_case_id)
+        self.assertIsNone(verdict_cache.get(self.problem.test_case_id, "fingerprint"))
+
+    def _judge(self, submission):
+        with mock.patch.object(JudgeDispatcher, "_request_with_failover", return_value=(self.resp, [])) as request:
+            JudgeDispatcher(submission.id, self.problem.id).judge()
+        return request
+
+    def test_identical_submission(self):
+        self.assertTrue(self._judge(self.submission).called)
+        submission = Submission.objects.create(**self.submission_data)
+        self.assertFalse(self._judge(submission).called)
+        submission.refresh_from_db()
+        self.assertEqual(submission.result, JudgeStatus.ACCEPTED)
+        self.assertEqual(submission.info, self.resp)
+
+    def test_rejudge_skip_cache(self):
+        self._judge(self.submission)
+        self.submission.refresh_from_db()
+        self.assertTrue(self._judge(self.submission).called)
+
+
+class BulkRejudgeTest(SubmissionPrepare):
+    def setUp(self):
+        self._create_problem_and_submission()
+        self.user = self.problem.created_by
+        Submission.objects.all().delete()
+
+    def _submit(self, result, problem=None, **kwargs):
+        data = dict(self.submission_data, user_id=self.user.id, result=result)
+        data.update(kwargs)
+        data["problem_id"] = (problem or self.problem).id
+        return Submission.objects.create(**data)
+
+    def test_recompute_problem_statistics(self):
+        self._submit(JudgeStatus.ACCEPTED)
+        self._submit(JudgeStatus.WRONG_ANSWER)
+        self._submit(JudgeStatus.WRONG_ANSWER)
+        self._submit(JudgeStatus.PENDING)
+        Problem.objects.filter(id=self.problem.id).update(accepted_number=10, statistic_info={"0": 10})
+        recompute_problem_statistics([self.problem.id])
+        self.problem.refresh_from_db()
+        self.assertEqual(self.problem.accepted_number, 1)
+        self.assertEqual(self.problem.submission_number, 3)
+        self.assertEqual(self.problem.statistic_info, {"0": 1, "-1": 2})
+
+    def test_recompute_acm_contest_problem_statistics(self):
+        user = self.create_user("contestant", "contestant", login=False)
+        contest = Contest.objects.create(title="contest", description="contest", real_time_rank=True,
+                                         rule_type=ContestRuleType.ACM, created_by=self.user,
+                                         start_time=timezone.now() - timedelta(hours=1),
+                                         end_time=timezone.now() + timedelta(hours=1))
+        problem = Problem.objects.create(**dict(Problem.objects.values().get(id=self.problem.id), id=None,
+                                                _id="contest-A", contest_id=contest.id))
+        # 第一次 AC 之后的提交不计入统计
+        for result in (JudgeStatus.WRONG_ANSWER, JudgeStatus.ACCEPTED, JudgeStatus.ACCEPTED, JudgeStatus.WRONG_ANSWER):
+            self._submit(result, problem=problem, contest_id=contest.id, user_id=user.id)
+        other = self.create_user("other", "other", login=False)
+        self._submit(JudgeStatus.WRONG_ANSWER, problem=problem, contest_id=contest.id, user_id=other.id)
+        recompute_problem_statistics([problem.id])
+        problem.refresh_from_db()
+        self.assertEqual((problem.submission_number, problem.accepted_number), (3, 1))
+        self.assertEqual(problem.statistic_info, {"0": 1, "-1": 2})
+
+    def test_recompute_user_problem_status(self):
+        profile = self.user.userprofile
+        profile.accepted_number = 1
+        profile.save()
+        problem_status = UserProblemStatus.objects.create(user=self.user, problem=self.problem,
+                                                          status=JudgeStatus.ACCEPTED)
+        self._submit(JudgeStatus.WRONG_ANSWER)
+        self._submit(JudgeStatus.RUNTIME_ERROR)
+        recompute_user_problem_status([self.problem.id])
+        profile.refresh_from_db()
+        problem_status.refresh_from_db()
+        self.assertEqual(profile.accepted_number, 0)
+        self.assertEqual(problem_status.status, JudgeStatus.RUNTIME_ERROR)
+
+        self._submit(JudgeStatus.ACCEPTED)
+        self._submit(JudgeStatus.WRONG_ANSWER)
+        recompute_user_problem_status([self.problem.id])
+        profile.refresh_from_db()
+        problem_status.refresh_from_db()
+        self.assertEqual(profile.accepted_number, 1)
+        self.assertEqual(problem_status.status, JudgeStatus.ACCEPTED)
+
+    def test_rebuild_acm_contest_rank(self):
+        user = self.create_user("contestant", "contestant", login=False)
+        contest = Contest.objects.create(title="contest", description="contest", real_time_rank=True,
+                                         rule_type=ContestRuleType.ACM, created_by=self.user,
+                                         start_time=timezone.now() - timedelta(hours=1),
+                                         end_time=timezone.now() + timedelta(hours=1))
+        problem = Problem.objects.create(**dict(Problem.objects.values().get(id=self.problem.id), id=None,
+                                                _id="contest-A", contest_id=contest.id))
+        for result in (JudgeStatus.WRONG_ANSWER, JudgeStatus.COMPILE_ERROR, JudgeStatus.ACCEPTED, JudgeStatus.ACCEPTED):
+            self._submit(result, problem=problem, contest_id=contest.id, user_id=user.id)
+        # 比赛创建者的提交不计入排名
+        self._submit(JudgeStatus.ACCEPTED, problem=problem, contest_id=contest.id)
+        rebuild_contest_rank(contest)
+        rank = ACMContestRank.objects.get(contest=contest)
+        self.assertEqual(rank.user_id, user.id)
+        self.assertEqual(rank.submission_number, 3)
+        self.assertEqual(rank.accepted_number, 1)
+        info = rank.submission_info[str(problem.id)]
+        self.assertTrue(info["is_ac"] and info["is_first_ac"])
+        self.assertEqual(info["error_number"], 1)
+        self.assertEqual(rank.total_time, int(info["ac_time"] + 20 * 60))
+
+    @mock.patch("judge.tasks.rejudge_finalize_task")
+    @mock.patch("judge.tasks.judge_task")
+    @mock.patch("judge.tasks.rejudge_tick_task")
+    def test_job(self, tick_task, judge_task, finalize_task):
+        for _ in range(3):
+            self._submit(JudgeStatus.ACCEPTED, statistic_info={"score": 0})
+        job_id = bulk_rejudge.create(Submission.objects.all(), rate=2)
+        tick_task.send.assert_called_once_with(job_id)
+        job = bulk_rejudge.get(job_id)
+        self.assertEqual((job["total"], job["dispatched"], job["problem_ids"]), (3, 0, [self.problem.id]))
+
+        self.assertEqual(bulk_rejudge.tick(job_id), 1)
+        self.assertEqual(judge_task.send.call_count, 2)
+        judge_task.send.assert_called_with(mock.ANY, self.problem.id, rejudge_job=job_id)
+        self.assertEqual(Submission.objects.filter(statistic_info={}).count(), 2)
+        bulk_rejudge.tick(job_id)
+        self.assertEqual(bulk_rejudge.get(job_id)["dispatched"], 3)
+
+        for _ in range(3):
+            bulk_rejudge.submission_done(job_id)
+        finalize_task.send.assert_called_once_with(job_id)
+        self.assertEqual(bulk_rejudge.get(job_id)["status"], RejudgeJobStatus.FINALIZING)
+        self.assertIsNone(bulk_rejudge.tick(job_id))
+        bulk_rejudge.finalize(job_id)
+        self.assertEqual(bulk_rejudge.get(job_id)["status"], RejudgeJobStatus.FINISHED)
+
+    @mock.patch("judge.tasks.rejudge_finalize_task")
+    @mock.patch("judge.tasks.judge_task")
+    @mock.patch("judge.tasks.rejudge_tick_task")
+    def test_cancel(self, tick_task, judge_task, finalize_task):
+        for _ in range(3):
+            self._submit(JudgeStatus.ACCEPTED)
+        job_id = bulk_rejudge.create(Submission.objects.all(), rate=1)
+        bulk_rejudge.tick(job_id)
+        self.assertTrue(bulk_rejudge.cancel(job_id))
+        finalize_task.send.assert_not_called()
+        bulk_rejudge.submission_done(job_id)
+        finalize_task.send.assert_called_once_with(job_id)
+        self.assertEqual(judge_task.send.call_count, 1)
+
+    @mock.patch("judge.tasks.judge_task")
+    @mock.patch("judge.tasks.rejudge_tick_task")
+    def test_live_traffic_first(self, tick_task, judge_task):
+        self._submit(JudgeStatus.ACCEPTED)
+        job_id = bulk_rejudge.create(Submission.objects.all())
+        waiting_queue.push(JudgeQueueLane.PRACTICE, {"submission_id": "live", "problem_id": 1})
+        try:
+            bulk_rejudge.tick(job_id)
+        finally:
+            waiting_queue.pop(1)
+        judge_task.send.assert_not_called()
+
+
+class UserProblemStatusTest(SubmissionPrepare):
+    def setUp(self):
+        self._create_problem_and_submission()
+        self.user = self.problem.created_by
+        Submission.objects.filter(id=self.submission.id).update(user_id=self.user.id)
+
+    def _update(self, result):
+        dispatcher = JudgeDispatcher(self.submission.id, self.problem.id)
+        dispatcher.submission.result = result
+        dispatcher.update_problem_status()
+        return UserProblemStatus.objects.get(user=self.user, problem=self.problem)
+
+    def test_update_problem_status(self):
+        self.assertEqual(self._update(JudgeStatus.WRONG_ANSWER).status, JudgeStatus.WRONG_ANSWER)
+        self.assertEqual(self._update(JudgeStatus.ACCEPTED).status, JudgeStatus.ACCEPTED)
+        # AC 之后不再变化
+        self.assertEqual(self._update(JudgeStatus.WRONG_ANSWER).status, JudgeStatus.ACCEPTED)
+        profile = self.user.userprofile
+        profile.refresh_from_db()
+        self.assertEqual((profile.submission_number, profile.accepted_number), (3, 1))
+
+    def test_problem_list_status(self):
+        self._update(JudgeStatus.ACCEPTED)
+        self.client.force_login(self.user)
+        resp = self.client.get(self.reverse("problem_api"), data={"limit": 10})
+        self.assertSuccess(resp)
+        self.assertEqual(resp.data["data"]["results"][0]["my_status"], JudgeStatus.ACCEPTED)
+
+
+class TestCaseDirTestCase(SubmissionPrepare):
+    rule_type = "OI"
+    failed_test_cases = ()
+
+    def setUp(self):
+        self.test_case_dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(TEST_CASE_DIR=self.test_case_dir.name)
+        self.settings.enable()
+        cache.delete(CacheKey.judge_server_registry)
+        self._create_problem_and_submission()
+        test_cases = {}
+        for i in range(1, 21):
+            test_cases[str(i)] = {"input_name": f"{i}.in", "output_name": f"{i}.out"}
+        self.test_case_id = "sharded"
+        os.mkdir(os.path.join(self.test_case_dir.name, self.test_case_id))
+        for item in test_cases.values():
+            for name in item.values():
+                open(os.path.join(self.test_case_dir.name, self.test_case_id, name), "w").close()
+        with open(os.path.join(self.test_case_dir.name, self.test_case_id, "info"), "w") as f:
+            json.dump({"spj": False, "test_cases": test_cases}, f)
+        Problem.objects.filter(id=self.problem.id).update(rule_type=self.rule_type, test_case_id=self.test_case_id,
+                                                          test_case_score=[{"score": 5}] * 20)
+        Submission.objects.filter(id=self.submission.id).update(user_id=self.problem.created_by_id)
+        verdict_cache.invalidate(self.test_case_id)
+
+    def tearDown(self):
+        for server in JudgeServer.objects.all():
+            slot_allocator.unregister(server.id)
+        verdict_cache.invalidate(self.test_case_id)
+        self.settings.disable()
+        self.test_case_dir.cleanup()
+
+    def _request(self, url, data=None, read_timeout=None):
+        with open(os.path.join(self.test_case_dir.name, data["test_case_id"], "info")) as f:
+            cases = json.load(f)["test_cases"]
+        return {"err": None, "data": [{"test_case": k, "cpu_time": 1, "real_time": 1, "memory": 1, "signal": 0,
+                                       "exit_code": 0,
+                                       "result": JudgeStatus.WRONG_ANSWER if int(k) in self.failed_test_cases
+                                       else JudgeStatus.ACCEPTED} for k in cases]}
+
+    def _judge(self):
+        dispatcher = JudgeDispatcher(self.submission.id, self.problem.id)
+        with mock.patch.object(dispatcher, "_request", side_effect=self._request) as request:
+            dispatcher.judge()
+        self.submission.refresh_from_db()
+        return request
+
+
+class ShardedJudgeTest(TestCaseDirTestCase):
+    def test_split_test_case(self):
+        shards = split_test_case(self.test_case_id, 3)
+        self.assertEqual(shards, split_test_case(self.test_case_id, 3))
+        numbers = []
+        for shard in shards:
+            with open(os.path.join(self.test_case_dir.name, shard, "info")) as f:
+                info = json.load(f)
+            numbers.extend(int(k) for k in info["test_cases"])
+            for item in info["test_cases"].values():
+                self.assertTrue(os.path.exists(os.path.join(self.test_case_dir.name, shard, item["input_name"])))
+        self.assertEqual(sorted(numbers), list(range(1, 21)))
+
+    def test_remove_unused_shards(self):
+        shards = split_test_case(self.test_case_id, 3) + chunk_test_case(self.test_case_id, 2, 2)
+        remove_unused_shards(self.test_case_id)
+        for shard in shards:
+            self.assertTrue(os.path.isdir(os.path.join(self.test_case_dir.name, shard)))
+
+        Problem.objects.filter(id=self.problem.id).update(test_case_id="new")
+        remove_unused_shards(self.test_case_id)
+        self.assertEqual(os.listdir(self.test_case_dir.name), [self.test_case_id])
+
+    def test_sharded(self):
+        for i in range(3):
+            create_judge_server(f"server{i}")
+        request = self._judge()
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(self.submission.result, JudgeStatus.ACCEPTED)
+        self.assertEqual([int(item["test_case"]) for item in self.submission.info["data"]], list(range(1, 21)))
+        self.assertEqual(self.submission.statistic_info["score"], 100)
+
+    def test_single_server(self):
+        create_judge_server("server0")
+        request = self._judge()
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(len(self.submission.info["data"]), 20)
+
+    def _judge_with_failed_shard(self, error):
+        servers = [create_judge_server(f"server{i}") for i in range(3)]
+        failed = []
+
+        def request(url, data=None, read_timeout=None):
+            if url.startswith(servers[0].service_url) and not failed:
+                failed.append(url)
+                if error:
+                    raise error(url)
+                return None
+            return self._request(url, data=data, read_timeout=read_timeout)
+
+        dispatcher = JudgeDispatcher(self.submission.id, self.problem.id)
+        with mock.patch.object(dispatcher, "_request", side_effect=request) as mocked, \
+                mock.patch.object(slot_allocator, "report_failure", return_value=False) as report_failure:
+            dispatcher.judge()
+        self.submission.refresh_from_db()
+        return mocked, report_failure
+
+    def test_unreachable_shard(self):
+        # 连接失败，整体重新评测
+        key = f"{CacheKey.judge_progress}:{self.submission.id}"
+        cache.delete(key)
+        request, report_failure = self._judge_with_failed_shard(JudgeServerUnreachable)
+        self.assertEqual(request.call_count, 4)
+        self.assertEqual(report_failure.call_count, 1)
+        self.assertEqual(self.submission.result, JudgeStatus.ACCEPTED)
+        # 只设置一次评测中的状态
+        events = [fields[b"event"].decode() for _, fields in cache.xrange(key)]
+        cache.delete(key)
+        self.assertEqual(events.count(JudgeProgressEvent.JUDGING), 1)
+
+    def test_shard_read_timeout(self):
+        # 读取超时，不再重新评测，也不计入熔断
+        request, report_failure = self._judge_with_failed_shard(None)
+        self.assertEqual(request.call_count, 3)
+        report_failure.assert_not_called()
+        self.assertEqual(self.submission.result, JudgeStatus.SYSTEM_ERROR)
+
+
+class EarlyExitJudgeTest(TestCaseDirTestCase):
+    rule_type = "ACM"
+
+    def setUp(self):
+        super().setUp()
+        create_judge_server("server0")
+        patcher = mock.patch("judge.dispatcher.EARLY_EXIT_ENABLED", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_chunk_test_case(self):
+        chunks = chunk_test_case(self.test_case_id, 3, 4)
+        numbers = []
+        for chunk in chunks:
+            with open(os.path.join(self.test_case_dir.name, chunk, "info")) as f:
+                numbers.append(sorted(int(k) for k in json.load(f)["test_cases"]))
+        self.assertEqual(numbers, [[1, 2, 3], list(range(4, 16)), list(range(16, 21))])
+
+    def test_accepted(self):
+        request = self._judge()
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(self.submission.result, JudgeStatus.ACCEPTED)
+        self.assertEqual(len(self.submission.info["data"]), 20)
+
+    def test_stop_at_failed_chunk(self):
+        self.failed_test_cases = (5, 9)
+        request = self._judge()
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(self.submission.result, JudgeStatus.WRONG_ANSWER)
+        self.assertEqual(len(self.submission.info["data"]), 15)
+
+    def test_disabled(self):
+        self.failed_test_cases = (5,)
+        with mock.patch("judge.dispatcher.EARLY_EXIT_ENABLED", False):
+            request = self._judge()
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(len(self.submission.info["data"]), 20)
+
+    def test_not_used_in_contest(self):
+        # 比赛中按全部测试点计算部分分
+        dispatcher = JudgeDispatcher(self.submission.id, self.problem.id)
+        dispatcher.contest_id = 1
+        self.assertIsNone(dispatcher._early_exit_request())
+
+
+class JudgeProgressTest(TestCaseDirTestCase):
+    rule_type = "ACM"
+    failed_test_cases = (5,)
+
+    def setUp(self):
+        super().setUp()
+        create_judge_server("server0")
+        patcher = mock.patch("judge.dispatcher.EARLY_EXIT_ENABLED", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.key = f"{CacheKey.judge_progress}:{self.submission.id}"
+        cache.delete(self.key)
+
+    def tearDown(self):
+        cache.delete(self.key)
+        super().tearDown()
+
+    def test_events(self):
+        with mock.patch("judge.dispatcher.DispatcherBase._request", side_effect=self._request):
+            JudgeDispatcher(self.submission.id, self.problem.id).judge()
+        events = [(fields[b"event"].decode(), json.loads(fields[b"data"])) for _, fields in cache.xrange(self.key)]
+        self.assertEqual(events[0], (JudgeProgressEvent.JUDGING, {"test_case_number": 20}))
+        test_cases = [data["test_case"] for event, data in events if event == JudgeProgressEvent.TEST_CASE]
+        # 分块评测，第二块出错后停止
+        self.assertEqual(test_cases, [str(i) for i in range(1, 16)])
+        self.assertEqual(events[-1][0], JudgeProgressEvent.FINISHED)
+        self.assertEqual(events[-1][1]["result"], JudgeStatus.WRONG_ANSWER)
+
+    @mock.patch("judge.tasks.judge_task")
+    @mock.patch("judge.tasks.rejudge_tick_task")
+    def test_rejudge_resets_events(self, tick_task, judge_task):
+        self.test_events()
+        job_id = bulk_rejudge.create(Submission.objects.filter(id=self.submission.id))
+        bulk_rejudge.tick(job_id)
+        judge_task.send.assert_called_once()
+        # 旧的 finished 事件不能再被读到
+        self.assertEqual(cache.xlen(self.key), 0)
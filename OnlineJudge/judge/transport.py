@@ -0,0 +1,38 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = 3
+# judge 的耗时与测试点数量相关，超过这个时间认为 judge server 已经无响应
+JUDGE_READ_TIMEOUT = 300
+COMPILE_SPJ_READ_TIMEOUT = 60
+# 与 judge server 的并发上限(cpu_core * 2)同一个量级即可
+POOL_MAXSIZE = 32
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def get_session(url):
+    """
+    每个 judge server 一个 session，连接在同一个 worker 进程内复用(keep-alive)
+    """
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    session = _sessions.get(origin)
+    if session is None:
+        with _lock:
+            session = _sessions.get(origin)
+            if session is None:
+                session = requests.Session()
+                # 失败后由 dispatcher 切换 server，这里不重试
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+                session.mount(origin, adapter)
+                _sessions[origin] = session
+    return session
+
+
+def post(url, read_timeout, **kwargs):
+    return get_session(url).post(url, timeout=(CONNECT_TIMEOUT, read_timeout), **kwargs)
@@ -0,0 +1,59 @@
+import hashlib
+import json
+
+from submission.models import JudgeStatus
+from utils.cache import cache
+from utils.constants import CacheKey
+
+VERDICT_CACHE_TTL = 24 * 60 * 60
+
+
+class VerdictCache:
+    """
+    相同代码重复提交时直接复用之前的评测结果。
+    同一组测试用例的结果放在一个 hash 中，field 是评测参数(代码、语言、时间内存限制、spj、io_mode)的摘要，
+    测试用例或者限制修改后摘要不同，旧结果不会再命中，invalidate 用来提前清理。
+    """
+    def __init__(self, redis_conn=cache):
+        self._redis_conn = redis_conn
+
+    @staticmethod
+    def _key(test_case_id):
+        return f"{CacheKey.verdict_cache}:{test_case_id}"
+
+    @staticmethod
+    def fingerprint(language, judge_data):
+        """
+        :param judge_data: 发送给 judge server 的数据
+        """
+        data = dict(judge_data, language=language)
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def cacheable(resp):
+        # 只缓存确定的结果，judge server 自身的错误需要重新评测
+        if resp["err"]:
+            return resp["err"] == "CompileError"
+        return all(item["result"] != JudgeStatus.SYSTEM_ERROR for item in resp["data"])
+
+    def get(self, test_case_id, fingerprint):
+        data = self._redis_conn.hget(self._key(test_case_id), fingerprint)
+        if data is None:
+            return None
+        return json.loads(data.decode("utf-8"))
+
+    def set(self, test_case_id, fingerprint, resp):
+        if not self.cacheable(resp):
+            return
+        key = self._key(test_case_id)
+        pipe = self._redis_conn.pipeline()
+        pipe.hset(key, fingerprint, json.dumps(resp))
+        pipe.expire(key, VERDICT_CACHE_TTL)
+        pipe.execute()
+
+    def invalidate(self, test_case_id):
+        if test_case_id:
+            self._redis_conn.delete(self._key(test_case_id))
+
+
+verdict_cache = VerdictCache()
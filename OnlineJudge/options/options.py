@@ -5,6 +5,8 @@ import time
 
 from django.db import transaction, IntegrityError
 
+from utils.cache import cache
+from utils.constants import CacheKey
 from utils.shortcuts import rand_str
 from judge.languages import languages
 from .models import SysOptions as SysOptionsModel
@@ -105,6 +107,15 @@ class OptionKeys:
     languages = "languages"
 
 
+# micro-service-server 缓存了这些选项，修改之后增加版本号并通过同名的 redis channel 通知它重新读取
+JUDGE_CONFIG_OPTION_KEYS = (OptionKeys.languages, OptionKeys.judge_server_token)
+
+
+def publish_judge_config_version():
+    version = cache.redis_incr(CacheKey.judge_config_version)
+    cache.publish(CacheKey.judge_config_version, version)
+
+
 class OptionDefaultValue:
     website_base_url = "http://127.0.0.1"
     website_name = "Online Judge"
@@ -153,6 +164,9 @@ class _SysOptionsMeta(type):
                 option = SysOptionsModel.objects.select_for_update().get(key=option_key)
                 option.value = option_value
                 option.save()
+                if option_key in JUDGE_CONFIG_OPTION_KEYS:
+                    # 提交之后再通知，micro-service-server 重新读取时可以读到新的值
+                    transaction.on_commit(publish_judge_config_version)
         except SysOptionsModel.DoesNotExist:
             mcs._init_option()
             mcs._set_option(option_key, option_value)
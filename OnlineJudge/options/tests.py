@@ -1 +1,42 @@
-# Create your tests here.
+from django.test import TestCase
+
+from utils.cache import cache
+from utils.constants import CacheKey
+from .options import SysOptions
+
+
+class JudgeConfigVersionTest(TestCase):
+    def setUp(self):
+        cache.delete_many([CacheKey.judge_config_version])
+        self.pubsub = cache.pubsub()
+        self.pubsub.subscribe(CacheKey.judge_config_version)
+        self.pubsub.get_message(timeout=1)
+
+    def tearDown(self):
+        self.pubsub.close()
+
+    def _messages(self):
+        messages = []
+        while True:
+            message = self.pubsub.get_message(timeout=0.5)
+            if message is None:
+                return messages
+            messages.append(int(message["data"]))
+
+    def test_publish_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            SysOptions.languages = SysOptions.languages
+            # 事务提交之前不通知
+            self.assertEqual(self._messages(), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self._messages(), [1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SysOptions.judge_server_token = "token"
+        self.assertEqual(self._messages(), [2])
+
+    def test_other_options_not_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            SysOptions.website_name = "oj"
+        self.assertEqual(self._messages(), [])
@@ -0,0 +1,175 @@
+from django.db import transaction
+
+from problem.models import Problem
+from utils.cache import cache
+from utils.constants import CacheKey
+
+# 增量在 redis 中最多停留 FLUSH_INTERVAL 秒再写入数据库
+FLUSH_INTERVAL = 5
+FLUSH_BATCH_SIZE = 200
+FLUSH_LOCK_TIMEOUT = 60
+# 首个 AC 的标记只需要保留到增量写入数据库之后
+FIRST_AC_TTL = 24 * 60 * 60
+
+SUBMISSION_FIELD = "submission_number"
+ACCEPTED_FIELD = "accepted_number"
+RESULT_FIELD_PREFIX = "result:"
+
+# 扣除已经写入数据库的增量，扣到 0 的 field 删除，hash 为空时移出 dirty 集合。
+# 这期间新增的增量会留在 hash 中，等下一次 flush
+#
+# KEYS[1]: 增量 hash, KEYS[2]: dirty 集合
+# ARGV[1]: problem id, ARGV[2...]: field, delta, field, delta ...
+SUBTRACT_SCRIPT = """
+for i = 2, #ARGV, 2 do
+    if redis.call("HINCRBY", KEYS[1], ARGV[i], -tonumber(ARGV[i + 1])) == 0 then
+        redis.call("HDEL", KEYS[1], ARGV[i])
+    end
+end
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    redis.call("SREM", KEYS[2], ARGV[1])
+end
+"""
+
+
+class ProblemCounter:
+    """
+    题目的 submission_number, accepted_number 和 statistic_info 先累加到 redis 中(每个题目一个 hash)，
+    再定期批量写入数据库，避免热门题目的每次评测都要锁住 Problem 这一行。
+    读取时使用 merge 把还没有写入数据库的增量加上。
+    """
+    def __init__(self, redis_conn=cache):
+        self._redis_conn = redis_conn
+        self._subtract_script = None
+
+    @staticmethod
+    def _key(problem_id):
+        return f"{CacheKey.problem_counter}:{problem_id}"
+
+    def incr(self, problem_id, results, submission=0, accepted=0):
+        """
+        :param results: {result: delta}，statistic_info 中各个结果的增量
+        """
+        fields = {RESULT_FIELD_PREFIX + str(result): delta for result, delta in results.items() if delta}
+        if submission:
+            fields[SUBMISSION_FIELD] = submission
+        if accepted:
+            fields[ACCEPTED_FIELD] = accepted
+        if not fields:
+            return
+        key = self._key(problem_id)
+        pipe = self._redis_conn.pipeline()
+        for field, delta in fields.items():
+            pipe.hincrby(key, field, delta)
+        pipe.sadd(CacheKey.problem_counter_dirty, problem_id)
+        pipe.set(CacheKey.problem_counter_flush, 1, nx=True, ex=FLUSH_INTERVAL)
+        if pipe.execute()[-1]:
+            self._schedule_flush()
+
+    @staticmethod
+    def _schedule_flush():
+        from problem.tasks import flush_problem_counters_task
+        flush_problem_counters_task.send_with_options(delay=FLUSH_INTERVAL * 1000)
+
+    def pending(self, problem_ids):
+        """
+        :return: {problem_id: {"submission_number": n, "accepted_number": n, "statistic_info": {result: n}}}
+        """
+        problem_ids = list(problem_ids)
+        if not problem_ids:
+            return {}
+        pipe = self._redis_conn.pipeline()
+        for problem_id in problem_ids:
+            pipe.hgetall(self._key(problem_id))
+        ret = {}
+        for problem_id, fields in zip(problem_ids, pipe.execute()):
+            if not fields:
+                continue
+            delta = {SUBMISSION_FIELD: 0, ACCEPTED_FIELD: 0, "statistic_info": {}}
+            for field, value in fields.items():
+                field, value = field.decode("utf-8"), int(value)
+                if field.startswith(RESULT_FIELD_PREFIX):
+                    delta["statistic_info"][field[len(RESULT_FIELD_PREFIX):]] = value
+                else:
+                    delta[field] = value
+            ret[problem_id] = delta
+        return ret
+
+    @staticmethod
+    def _apply(submission_number, accepted_number, statistic_info, delta):
+        statistic_info = dict(statistic_info or {})
+        for result, value in delta["statistic_info"].items():
+            statistic_info[result] = max(statistic_info.get(result, 0) + value, 0)
+        return (submission_number + delta[SUBMISSION_FIELD], accepted_number + delta[ACCEPTED_FIELD],
+                statistic_info)
+
+    def merge(self, problems):
+        """
+        把未写入数据库的增量合并到序列化之后的题目数据中
+        :param problems: ProblemSerializer 等输出的 dict 列表
+        """
+        deltas = self.pending(problem["id"] for problem in problems)
+        for problem in problems:
+            if problem["id"] in deltas:
+                problem[SUBMISSION_FIELD], problem[ACCEPTED_FIELD], problem["statistic_info"] = \
+                    self._apply(problem[SUBMISSION_FIELD], problem[ACCEPTED_FIELD], problem["statistic_info"],
+                                deltas[problem["id"]])
+        return problems
+
+    def claim_first_ac(self, problem_id):
+        """
+        比赛中是否为这道题的第一个 AC，数据库和 redis 中都还没有 AC 时，只有一个提交能拿到标记
+        """
+        accepted_number = Problem.objects.filter(id=problem_id).values_list("accepted_number", flat=True).first()
+        if (accepted_number or 0) + self.pending([problem_id]).get(problem_id, {}).get(ACCEPTED_FIELD, 0) > 0:
+            return False
+        return bool(self._redis_conn.set(f"{CacheKey.problem_first_ac}:{problem_id}", 1,
+                                         timeout=FIRST_AC_TTL, nx=True))
+
+    def flush(self, problem_ids=None, blocking=False):
+        """
+        :param problem_ids: 只写入这些题目的增量，默认为全部
+        :param blocking: 其他 worker 正在 flush 时是否等待，否则直接返回 None
+        :return: 写入后是否还有未写入的增量
+        """
+        lock = self._redis_conn.lock(CacheKey.problem_counter_flush_lock, timeout=FLUSH_LOCK_TIMEOUT,
+                                     blocking_timeout=FLUSH_LOCK_TIMEOUT if blocking else 0)
+        if not lock.acquire():
+            return None
+        try:
+            if problem_ids is None:
+                problem_ids = [int(item) for item in self._redis_conn.smembers(CacheKey.problem_counter_dirty)]
+            problem_ids = sorted(problem_ids)
+            for i in range(0, len(problem_ids), FLUSH_BATCH_SIZE):
+                self._flush_batch(problem_ids[i:i + FLUSH_BATCH_SIZE])
+        finally:
+            lock.release()
+        return self._redis_conn.scard(CacheKey.problem_counter_dirty) > 0
+
+    def _flush_batch(self, problem_ids):
+        deltas = self.pending(problem_ids)
+        if not deltas:
+            return
+        # 按 id 顺序加锁，与其他批量更新 Problem 的地方不会死锁
+        with transaction.atomic():
+            problems = list(Problem.objects.select_for_update().filter(id__in=deltas.keys()).order_by("id"))
+            for problem in problems:
+                problem.submission_number, problem.accepted_number, problem.statistic_info = \
+                    self._apply(problem.submission_number, problem.accepted_number, problem.statistic_info,
+                                deltas[problem.id])
+            Problem.objects.bulk_update(problems, [SUBMISSION_FIELD, ACCEPTED_FIELD, "statistic_info"])
+        # 提交之后再扣除，读取的时候只可能短暂地多算，不会丢失增量。
+        # 题目已经被删除的增量也一并丢弃
+        if self._subtract_script is None:
+            self._subtract_script = self._redis_conn.register_script(SUBTRACT_SCRIPT)
+        for problem_id, delta in deltas.items():
+            args = [problem_id]
+            for result, value in delta["statistic_info"].items():
+                args += [RESULT_FIELD_PREFIX + result, value]
+            for field in (SUBMISSION_FIELD, ACCEPTED_FIELD):
+                if delta[field]:
+                    args += [field, delta[field]]
+            self._subtract_script(keys=[self._key(problem_id), CacheKey.problem_counter_dirty], args=args)
+
+
+problem_counter = ProblemCounter()
@@ -0,0 +1,92 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:40
+
+import json
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def copy_profile_problems_status(apps, schema_editor):
+    Problem = apps.get_model("problem", "Problem")
+    UserProblemStatus = apps.get_model("problem", "UserProblemStatus")
+
+    problem_contest = dict(Problem.objects.values_list("id", "contest_id"))
+    rows = []
+    # account/0013 只修改 UserProfile 的 state，这里直接读写数据库中的 json 列
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT user_id, acm_problems_status, oi_problems_status FROM user_profile")
+        for user_id, acm_problems_status, oi_problems_status in cursor.fetchall():
+            # 直接查询得到的 jsonb 是字符串
+            for problems_status in (json.loads(acm_problems_status), json.loads(oi_problems_status)):
+                for key in ("problems", "contest_problems"):
+                    for problem_id, item in problems_status.get(key, {}).items():
+                        # 题目已经被删除
+                        if int(problem_id) not in problem_contest:
+                            continue
+                        rows.append(UserProblemStatus(user_id=user_id, problem_id=int(problem_id),
+                                                      contest_id=problem_contest[int(problem_id)],
+                                                      status=item["status"], score=item.get("score", 0)))
+            if len(rows) >= BATCH_SIZE:
+                UserProblemStatus.objects.bulk_create(rows, ignore_conflicts=True)
+                rows = []
+    UserProblemStatus.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def restore_profile_problems_status(apps, schema_editor):
+    UserProblemStatus = apps.get_model("problem", "UserProblemStatus")
+
+    profiles = {}
+    rows = UserProblemStatus.objects.values_list("user_id", "problem_id", "problem___id", "problem__rule_type",
+                                                 "contest_id", "status", "score")
+    for user_id, problem_id, _id, rule_type, contest_id, status, score in rows.iterator():
+        acm_problems_status, oi_problems_status = profiles.setdefault(user_id, ({}, {}))
+        key = "contest_problems" if contest_id else "problems"
+        if rule_type == "ACM":
+            acm_problems_status.setdefault(key, {})[str(problem_id)] = {"status": status, "_id": _id}
+        else:
+            oi_problems_status.setdefault(key, {})[str(problem_id)] = {"status": status, "_id": _id, "score": score}
+    with schema_editor.connection.cursor() as cursor:
+        for user_id, (acm_problems_status, oi_problems_status) in profiles.items():
+            cursor.execute("UPDATE user_profile SET acm_problems_status = %s, oi_problems_status = %s "
+                           "WHERE user_id = %s", [json.dumps(acm_problems_status), json.dumps(oi_problems_status),
+                                                  user_id])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('account', '0012_userprofile_language'),
+        ('contest', '0011_contest_verdict_cache_enabled'),
+        ('problem', '0014_problem_share_submission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProblemStatus',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.IntegerField()),
+                ('score', models.IntegerField(default=0)),
+                ('contest', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='contest.contest')),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='problem.problem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'user_problem_status',
+                'unique_together': {('user', 'problem')},
+                'index_together': {('user', 'contest')},
+            },
+        ),
+        migrations.RunPython(copy_profile_problems_status, reverse_code=restore_profile_problems_status),
+        # 复制之后再删除旧的列。在这里删除而不是在 account/0013 中，
+        # 这样 account 不需要依赖 problem，新建数据库时 migration 的顺序不变
+        migrations.RunSQL(
+            "ALTER TABLE user_profile DROP COLUMN acm_problems_status, DROP COLUMN oi_problems_status",
+            "ALTER TABLE user_profile ADD COLUMN acm_problems_status jsonb NOT NULL DEFAULT '{}', "
+            "ADD COLUMN oi_problems_status jsonb NOT NULL DEFAULT '{}'",
+        ),
+    ]
@@ -94,3 +94,23 @@ class Problem(models.Model):
     def add_ac_number(self):
         self.accepted_number = models.F("accepted_number") + 1
         self.save(update_fields=["accepted_number"])
+
+
+class UserProblemStatus(models.Model):
+    """
+    用户在每道题目上的状态，取代 UserProfile 中的 acm_problems_status 和 oi_problems_status，
+    评测时只需要更新一行，题目列表也只查询当前页的题目
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE)
+    # 与 problem.contest 相同，按比赛查询时不需要 join problem
+    contest = models.ForeignKey(Contest, null=True, on_delete=models.CASCADE)
+    status = models.IntegerField()
+    # for OI mode
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "user_problem_status"
+        # problem 已经确定了 contest，contest 为 NULL 时也能保证唯一
+        unique_together = (("user", "problem"),)
+        index_together = (("user", "contest"),)
@@ -0,0 +1,12 @@
+import dramatiq
+
+from problem.counters import FLUSH_INTERVAL, problem_counter
+from utils.shortcuts import DRAMATIQ_WORKER_ARGS
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS())
+def flush_problem_counters_task():
+    # 没有新的提交时不会再触发 flush，剩下的增量由这里继续处理。
+    # 其他 worker 正在 flush 时(返回 None)也不知道它之后是否还有增量，同样需要继续
+    if problem_counter.flush() is not False:
+        flush_problem_counters_task.send_with_options(delay=FLUSH_INTERVAL * 1000)
@@ -5,15 +5,22 @@ import shutil
 from datetime import timedelta
 from zipfile import ZipFile
 
+from unittest import mock
+
 from django.conf import settings
 
 from utils.api.tests import APITestCase
+from utils.cache import cache
+from utils.constants import CacheKey
 
 from .models import ProblemTag, ProblemIOMode
 from .models import Problem, ProblemRuleType
-from contest.models import Contest
+from contest.models import Contest, ContestBestScore
 from contest.tests import DEFAULT_CONTEST_DATA
+from submission.models import JudgeStatus, Submission
 
+from .counters import ProblemCounter, problem_counter
+from .tasks import flush_problem_counters_task
 from .views.admin import TestCaseAPI
 from .utils import parse_problem_template
 
@@ -193,6 +200,60 @@ class ProblemAPITest(ProblemCreateTestBase):
         self.assertSuccess(resp)
 
 
+@mock.patch.object(ProblemCounter, "_schedule_flush")
+class ProblemCounterTest(ProblemCreateTestBase):
+    def setUp(self):
+        admin = self.create_admin(login=False)
+        self.problem = self.add_problem(DEFAULT_PROBLEM_DATA, admin)
+        Problem.objects.filter(id=self.problem.id).update(submission_number=3, accepted_number=1,
+                                                          statistic_info={"0": 1, "-1": 2})
+        problem_counter.flush(blocking=True)
+        cache.delete_many([CacheKey.problem_counter_flush, f"{CacheKey.problem_first_ac}:{self.problem.id}"])
+
+    def tearDown(self):
+        problem_counter.flush(blocking=True)
+
+    def test_merge_pending_increments(self, schedule_flush):
+        problem_counter.incr(self.problem.id, {0: 1}, submission=1, accepted=1)
+        problem_counter.incr(self.problem.id, {-1: -1, 0: 1}, accepted=1)
+        schedule_flush.assert_called_once_with()
+
+        resp = self.client.get(self.reverse("problem_api") + "?problem_id=" + self.problem._id)
+        self.assertSuccess(resp)
+        data = resp.data["data"]
+        self.assertEqual((data["submission_number"], data["accepted_number"]), (4, 3))
+        self.assertEqual(data["statistic_info"], {"0": 3, "-1": 1})
+
+        self.problem.refresh_from_db()
+        self.assertEqual(self.problem.accepted_number, 1)
+
+    def test_flush(self, schedule_flush):
+        problem_counter.incr(self.problem.id, {-1: 1}, submission=1)
+        self.assertFalse(problem_counter.flush())
+        self.problem.refresh_from_db()
+        self.assertEqual((self.problem.submission_number, self.problem.accepted_number), (4, 1))
+        self.assertEqual(self.problem.statistic_info, {"0": 1, "-1": 3})
+        self.assertEqual(problem_counter.pending([self.problem.id]), {})
+
+    @mock.patch.object(flush_problem_counters_task, "send_with_options")
+    def test_flush_task_reschedules_while_locked(self, send_with_options, schedule_flush):
+        flush_problem_counters_task()
+        send_with_options.assert_not_called()
+
+        lock = cache.lock(CacheKey.problem_counter_flush_lock)
+        lock.acquire()
+        try:
+            flush_problem_counters_task()
+        finally:
+            lock.release()
+        send_with_options.assert_called_once()
+
+    def test_claim_first_ac(self, schedule_flush):
+        Problem.objects.filter(id=self.problem.id).update(accepted_number=0)
+        self.assertTrue(problem_counter.claim_first_ac(self.problem.id))
+        self.assertFalse(problem_counter.claim_first_ac(self.problem.id))
+
+
 class ContestProblemAdminTest(APITestCase):
     def setUp(self):
         self.url = self.reverse("contest_problem_admin_api")
@@ -220,6 +281,25 @@ class ContestProblemAdminTest(APITestCase):
         resp = self.client.get(f"{self.url}?contest_id={contest_id}&id={problem_id}")
         self.assertSuccess(resp)
 
+    def test_edit_score_rebuilds_best_scores(self):
+        data = copy.deepcopy(DEFAULT_PROBLEM_DATA)
+        data.update(contest_id=self.contest["id"], languages=["C"])
+        problem = self.client.post(self.url, data=data).data["data"]
+        Submission.objects.create(user_id=1, username="test", code="", problem_id=problem["id"],
+                                  contest_id=self.contest["id"], result=JudgeStatus.ACCEPTED, language="C",
+                                  info={"data": [{"test_case": "1", "result": 0}]})
+        ContestBestScore.objects.create(contest_id=self.contest["id"], user_id=1, problem_id=problem["id"],
+                                        score=0, passed=1, total=1, best_time=problem["create_time"])
+
+        data["id"] = problem["id"]
+        self.assertSuccess(self.client.put(self.url, data=data))
+        # 测试点分数没有变化时不重新计算
+        self.assertEqual(ContestBestScore.objects.get(problem_id=problem["id"]).score, 0)
+
+        data["test_case_score"][0]["score"] = 100
+        self.assertSuccess(self.client.put(self.url, data=data))
+        self.assertEqual(ContestBestScore.objects.get(problem_id=problem["id"]).score, 100)
+
 
 class ContestProblemTest(ProblemCreateTestBase):
     def setUp(self):
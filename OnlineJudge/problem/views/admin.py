@@ -12,15 +12,19 @@ from django.db.models import Q
 from django.http import StreamingHttpResponse, FileResponse
 
 from account.decorators import problem_permission_required, ensure_created_by
+from contest.best_score import rebuild_best_scores
 from contest.models import Contest, ContestStatus
 from fps.parser import FPSHelper, FPSParser
 from judge.dispatcher import SPJCompiler
+from judge.sharding import remove_unused_shards
+from judge.verdict_cache import verdict_cache
 from options.options import SysOptions
 from submission.models import Submission, JudgeStatus
 from utils.api import APIView, CSRFExemptAPIView, validate_serializer, APIError
 from utils.constants import Difficulty
 from utils.shortcuts import rand_str, natural_sort_key
 from utils.tasks import delete_files
+from ..counters import problem_counter
 from ..models import Problem, ProblemRuleType, ProblemTag
 from ..serializers import (CreateContestProblemSerializer, CompileSPJSerializer,
                            CreateProblemSerializer, EditProblemSerializer, EditContestProblemSerializer,
@@ -233,7 +237,7 @@ class ProblemAPI(ProblemBase):
             try:
                 problem = Problem.objects.get(id=problem_id)
                 ensure_created_by(problem, request.user)
-                return self.success(ProblemAdminSerializer(problem).data)
+                return self.success(problem_counter.merge([ProblemAdminSerializer(problem).data])[0])
             except Problem.DoesNotExist:
                 return self.error("Problem does not exist")
 
@@ -249,7 +253,9 @@ class ProblemAPI(ProblemBase):
             problems = problems.filter(Q(title__icontains=keyword) | Q(_id__icontains=keyword))
         if not user.can_mgmt_all_problem():
             problems = problems.filter(created_by=user)
-        return self.success(self.paginate_data(request, problems, ProblemAdminSerializer))
+        data = self.paginate_data(request, problems, ProblemAdminSerializer)
+        problem_counter.merge(data["results"])
+        return self.success(data)
 
     @problem_permission_required
     @validate_serializer(EditProblemSerializer)
@@ -276,9 +282,14 @@ class ProblemAPI(ProblemBase):
         tags = data.pop("tags")
         data["languages"] = list(data["languages"])
 
+        # 测试用例或者限制可能被修改，丢弃旧的评测结果
+        verdict_cache.invalidate(problem.test_case_id)
+        test_case_id = problem.test_case_id
         for k, v in data.items():
             setattr(problem, k, v)
         problem.save()
+        if problem.test_case_id != test_case_id:
+            remove_unused_shards(test_case_id)
 
         problem.tags.remove(*problem.tags.all())
         for tag in tags:
@@ -304,6 +315,7 @@ class ProblemAPI(ProblemBase):
         # if os.path.isdir(d):
         #     shutil.rmtree(d, ignore_errors=True)
         problem.delete()
+        remove_unused_shards(problem.test_case_id)
         return self.success()
 
 
@@ -355,7 +367,7 @@ class ContestProblemAPI(ProblemBase):
                 ensure_created_by(problem.contest, user)
             except Problem.DoesNotExist:
                 return self.error("Problem does not exist")
-            return self.success(ProblemAdminSerializer(problem).data)
+            return self.success(problem_counter.merge([ProblemAdminSerializer(problem).data])[0])
 
         if not contest_id:
             return self.error("Contest id is required")
@@ -370,7 +382,9 @@ class ContestProblemAPI(ProblemBase):
         keyword = request.GET.get("keyword")
         if keyword:
             problems = problems.filter(title__contains=keyword)
-        return self.success(self.paginate_data(request, problems, ProblemAdminSerializer))
+        data = self.paginate_data(request, problems, ProblemAdminSerializer)
+        problem_counter.merge(data["results"])
+        return self.success(data)
 
     @validate_serializer(EditContestProblemSerializer)
     def put(self, request):
@@ -406,9 +420,17 @@ class ContestProblemAPI(ProblemBase):
         tags = data.pop("tags")
         data["languages"] = list(data["languages"])
 
+        # 测试用例或者限制可能被修改，丢弃旧的评测结果
+        verdict_cache.invalidate(problem.test_case_id)
+        test_case = (problem.test_case_id, problem.test_case_score)
         for k, v in data.items():
             setattr(problem, k, v)
         problem.save()
+        if problem.test_case_id != test_case[0]:
+            remove_unused_shards(test_case[0])
+        # 最好成绩按评测时的测试点分数计算，分数或测试用例修改之后按新的分数重新计算
+        if (problem.test_case_id, problem.test_case_score) != test_case:
+            rebuild_best_scores(contest.id, problem_ids=[problem.id])
 
         problem.tags.remove(*problem.tags.all())
         for tag in tags:
@@ -434,6 +456,7 @@ class ContestProblemAPI(ProblemBase):
         # if os.path.isdir(d):
         #    shutil.rmtree(d, ignore_errors=True)
         problem.delete()
+        remove_unused_shards(problem.test_case_id)
         return self.success()
 
 
@@ -2,9 +2,9 @@ import random
 from django.db.models import Q, Count
 from utils.api import APIView
 from account.decorators import check_contest_permission
-from ..models import ProblemTag, Problem, ProblemRuleType
+from ..counters import problem_counter
+from ..models import ProblemTag, Problem, UserProblemStatus
 from ..serializers import ProblemSerializer, TagSerializer, ProblemSafeSerializer
-from contest.models import ContestRuleType
 
 
 class ProblemTagAPI(APIView):
@@ -30,20 +30,18 @@ class ProblemAPI(APIView):
     @staticmethod
     def _add_problem_status(request, queryset_values):
         if request.user.is_authenticated:
-            profile = request.user.userprofile
-            acm_problems_status = profile.acm_problems_status.get("problems", {})
-            oi_problems_status = profile.oi_problems_status.get("problems", {})
             # paginate data
             results = queryset_values.get("results")
             if results is not None:
                 problems = results
             else:
                 problems = [queryset_values, ]
+            # 只查询当前页的题目
+            problem_ids = [problem["id"] for problem in problems]
+            problems_status = dict(UserProblemStatus.objects.filter(user=request.user, problem_id__in=problem_ids)
+                                   .values_list("problem_id", "status"))
             for problem in problems:
-                if problem["rule_type"] == ProblemRuleType.ACM:
-                    problem["my_status"] = acm_problems_status.get(str(problem["id"]), {}).get("status")
-                else:
-                    problem["my_status"] = oi_problems_status.get(str(problem["id"]), {}).get("status")
+                problem["my_status"] = problems_status.get(problem["id"])
 
     def get(self, request):
         # 问题详情页
@@ -53,6 +51,7 @@ class ProblemAPI(APIView):
                 problem = Problem.objects.select_related("created_by") \
                     .get(_id=problem_id, contest_id__isnull=True, visible=True)
                 problem_data = ProblemSerializer(problem).data
+                problem_counter.merge([problem_data])
                 self._add_problem_status(request, problem_data)
                 return self.success(problem_data)
             except Problem.DoesNotExist:
@@ -79,6 +78,7 @@ class ProblemAPI(APIView):
             problems = problems.filter(difficulty=difficulty)
         # 根据profile 为做过的题目添加标记
         data = self.paginate_data(request, problems, ProblemSerializer)
+        problem_counter.merge(data["results"])
         self._add_problem_status(request, data)
         return self.success(data)
 
@@ -86,13 +86,12 @@ class ProblemAPI(APIView):
 class ContestProblemAPI(APIView):
     def _add_problem_status(self, request, queryset_values):
         if request.user.is_authenticated:
-            profile = request.user.userprofile
-            if self.contest.rule_type == ContestRuleType.ACM:
-                problems_status = profile.acm_problems_status.get("contest_problems", {})
-            else:
-                problems_status = profile.oi_problems_status.get("contest_problems", {})
+            problem_ids = [problem["id"] for problem in queryset_values]
+            problems_status = dict(UserProblemStatus.objects.filter(user=request.user, contest=self.contest,
+                                                                    problem_id__in=problem_ids)
+                                   .values_list("problem_id", "status"))
             for problem in queryset_values:
-                problem["my_status"] = problems_status.get(str(problem["id"]), {}).get("status")
+                problem["my_status"] = problems_status.get(problem["id"])
 
     @check_contest_permission(check_type="problems")
     def get(self, request):
@@ -106,6 +105,7 @@ class ContestProblemAPI(APIView):
                 return self.error("Problem does not exist.")
             if self.contest.problem_details_permission(request.user):
                 problem_data = ProblemSerializer(problem).data
+                problem_counter.merge([problem_data])
                 self._add_problem_status(request, [problem_data, ])
             else:
                 problem_data = ProblemSafeSerializer(problem).data
@@ -114,6 +114,7 @@ class ContestProblemAPI(APIView):
         contest_problems = Problem.objects.select_related("created_by").filter(contest=self.contest, visible=True)
         if self.contest.problem_details_permission(request.user):
             data = ProblemSerializer(contest_problems, many=True).data
+            problem_counter.merge(data)
             self._add_problem_status(request, data)
         else:
             data = ProblemSafeSerializer(contest_problems, many=True).data
@@ -1,3 +1,4 @@
+from judge.rejudge import DEFAULT_REJUDGE_RATE, MAX_REJUDGE_RATE
 from .models import Submission
 from utils.api import serializers
 from utils.serializers import LanguageNameChoiceField
@@ -11,6 +12,16 @@ class CreateSubmissionSerializer(serializers.Serializer):
     captcha = serializers.CharField(required=False)
 
 
+class BulkRejudgeSerializer(serializers.Serializer):
+    problem_id = serializers.IntegerField(required=False)
+    contest_id = serializers.IntegerField(required=False)
+    submission_ids = serializers.ListField(child=serializers.CharField(max_length=32), required=False)
+    result = serializers.IntegerField(required=False)
+    language = LanguageNameChoiceField(required=False)
+    user_id = serializers.IntegerField(required=False)
+    rate = serializers.IntegerField(min_value=1, max_value=MAX_REJUDGE_RATE, default=DEFAULT_REJUDGE_RATE)
+
+
 class ShareSubmissionSerializer(serializers.Serializer):
     id = serializers.CharField()
     shared = serializers.BooleanField()
@@ -1,8 +1,11 @@
 from copy import deepcopy
 from unittest import mock
 
+from judge.progress import JudgeProgressEvent, judge_progress
 from problem.models import Problem, ProblemTag
 from utils.api.tests import APITestCase
+from utils.cache import cache
+from utils.constants import CacheKey
 from .models import Submission
 
 DEFAULT_PROBLEM_DATA = {"_id": "A-110", "title": "test", "description": "<p>test</p>", "input_description": "test",
@@ -76,3 +79,46 @@ class SubmissionAPITest(SubmissionPrepare):
         self.assertDictEqual(resp.data, {"error": "error",
                                          "data": "Python3 is now allowed in the problem"})
         judge_task.assert_not_called()
+
+
+@mock.patch("submission.views.admin.judge_task.send")
+class SubmissionRejudgeAPITest(SubmissionPrepare):
+    def setUp(self):
+        self._create_problem_and_submission()
+        self.create_super_admin()
+        self.url = self.reverse("submission_rejudge_api")
+        self.key = f"{CacheKey.judge_progress}:{self.submission.id}"
+
+    def tearDown(self):
+        cache.delete(self.key)
+
+    def test_rejudge_resets_progress(self, judge_task):
+        judge_progress.publish(self.submission.id, [(JudgeProgressEvent.FINISHED, {"result": 0})])
+        resp = self.client.get(self.url, {"id": self.submission.id})
+        self.assertSuccess(resp)
+        judge_task.assert_called_once_with(self.submission.id, self.problem.id)
+        self.assertEqual(cache.xlen(self.key), 0)
+
+
+@mock.patch("judge.tasks.rejudge_tick_task.send")
+class SubmissionBulkRejudgeAPITest(SubmissionPrepare):
+    def setUp(self):
+        self._create_problem_and_submission()
+        self.create_super_admin()
+        self.url = self.reverse("submission_bulk_rejudge_api")
+
+    def test_rejudge_problem(self, tick_task):
+        resp = self.client.post(self.url, {"problem_id": self.problem.id})
+        self.assertSuccess(resp)
+        job = resp.data["data"]
+        self.assertEqual(job["total"], 1)
+        tick_task.assert_called_once_with(job["id"])
+
+        resp = self.client.get(self.url, {"id": job["id"]})
+        self.assertSuccess(resp)
+        self.assertEqual(resp.data["data"]["status"], "running")
+
+    def test_filter_required(self, tick_task):
+        self.assertFailed(self.client.post(self.url, {}))
+        self.assertFailed(self.client.post(self.url, {"problem_id": self.problem.id + 1}))
+        tick_task.assert_not_called()
@@ -1,7 +1,8 @@
 from django.conf.urls import url
 
-from ..views.admin import SubmissionRejudgeAPI
+from ..views.admin import SubmissionRejudgeAPI, SubmissionBulkRejudgeAPI
 
 urlpatterns = [
     url(r"^submission/rejudge?$", SubmissionRejudgeAPI.as_view(), name="submission_rejudge_api"),
+    url(r"^submission/bulk_rejudge/?$", SubmissionBulkRejudgeAPI.as_view(), name="submission_bulk_rejudge_api"),
 ]
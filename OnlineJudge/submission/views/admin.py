@@ -1,8 +1,11 @@
 from account.decorators import super_admin_required
+from judge.progress import judge_progress
+from judge.rejudge import bulk_rejudge
 from judge.tasks import judge_task
 # from judge.dispatcher import JudgeDispatcher
-from utils.api import APIView
+from utils.api import APIView, validate_serializer
 from ..models import Submission
+from ..serializers import BulkRejudgeSerializer
 
 
 class SubmissionRejudgeAPI(APIView):
@@ -17,6 +20,43 @@ class SubmissionRejudgeAPI(APIView):
             return self.error("Submission does not exists")
         submission.statistic_info = {}
         submission.save()
+        judge_progress.reset(submission.id)
 
         judge_task.send(submission.id, submission.problem.id)
         return self.success()
+
+
+class SubmissionBulkRejudgeAPI(APIView):
+    @validate_serializer(BulkRejudgeSerializer)
+    @super_admin_required
+    def post(self, request):
+        """
+        重判一道题、一场比赛或者按条件筛选出的提交，返回 job 用于查询进度
+        """
+        data = request.data
+        filters = {}
+        for field in ("problem_id", "contest_id", "result", "language", "user_id"):
+            if data.get(field) is not None:
+                filters[field] = data[field]
+        if data.get("submission_ids"):
+            filters["id__in"] = data["submission_ids"]
+        if not filters:
+            return self.error("At least one filter is required")
+        job_id = bulk_rejudge.create(Submission.objects.filter(**filters), rate=data["rate"],
+                                     created_by=request.user.username)
+        if not job_id:
+            return self.error("No submission to rejudge")
+        return self.success(bulk_rejudge.get(job_id))
+
+    @super_admin_required
+    def get(self, request):
+        job = bulk_rejudge.get(request.GET.get("id"))
+        if not job:
+            return self.error("Rejudge job does not exist")
+        return self.success(job)
+
+    @super_admin_required
+    def delete(self, request):
+        if not bulk_rejudge.cancel(request.GET.get("id")):
+            return self.error("Rejudge job is not running")
+        return self.success()
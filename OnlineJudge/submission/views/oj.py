@@ -1,7 +1,7 @@
 import ipaddress
 
 from account.decorators import login_required, check_contest_permission
-from contest.models import ContestStatus, ContestRuleType
+from contest.models import ContestStatus
 from judge.tasks import judge_task
 from options.options import SysOptions
 # from judge.dispatcher import JudgeDispatcher
@@ -185,9 +185,8 @@ class ContestSubmissionListAPI(APIView):
             submissions = submissions.filter(create_time__gte=contest.start_time)
 
         # 封榜的时候只能看到自己的提交
-        if contest.rule_type == ContestRuleType.ACM:
-            if not contest.real_time_rank and not request.user.is_contest_admin(contest):
-                submissions = submissions.filter(user_id=request.user.id)
+        if contest.rank_frozen and not request.user.is_contest_admin(contest):
+            submissions = submissions.filter(user_id=request.user.id)
 
         data = self.paginate_data(request, submissions)
         data["results"] = SubmissionListSerializer(data["results"], many=True, user=request.user).data
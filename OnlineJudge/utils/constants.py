@@ -23,8 +23,26 @@ class ContestRuleType(Choices):
 
 class CacheKey:
     waiting_queue = "waiting_queue"
+    waiting_queue_credits = "waiting_queue_credits"
     contest_rank_cache = "contest_rank_cache"
+    contest_rank_cache_version = "contest_rank_cache_version"
+    contest_rank_cache_lock = "contest_rank_cache_lock"
+    contest_scoreboard = "contest_scoreboard"
     website_config = "website_config"
+    judge_server_registry = "judge_server_registry"
+    judge_server_slots = "judge_server_slots"
+    judge_server_circuit = "judge_server_circuit"
+    judge_server_failures = "judge_server_failures"
+    verdict_cache = "verdict_cache"
+    rejudge_job = "rejudge_job"
+    judge_progress = "judge_progress"
+    problem_counter = "problem_counter"
+    problem_counter_dirty = "problem_counter_dirty"
+    problem_counter_flush = "problem_counter_flush"
+    problem_counter_flush_lock = "problem_counter_flush_lock"
+    problem_first_ac = "problem_first_ac"
+    user_rank = "user_rank"
+    judge_config_version = "judge_config_version"
 
 
 class Difficulty(Choices):
@@ -53,6 +53,39 @@ class OIContestRank(AbstractContestRank):
     submission_info: Mapped[dict] = mapped_column(JSONB, default=dict)
 
 
+class ContestBestScore(Base):
+    """
+    Best partial score of each user on each contest problem, maintained by the judge (Django side).
+    """
+    __tablename__ = "contest_best_score"
+    __table_args__ = {"schema": "public"}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    contest_id: Mapped[int] = mapped_column(Integer, ForeignKey("public.contest.id"), nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    problem_id: Mapped[int] = mapped_column(Integer, ForeignKey("public.problem.id"), nullable=False)
+    score: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    passed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    best_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class ContestRankEvent(Base):
+    """
+    Rank-key change of a user during a contest, recorded by the judge (Django side) for the rank timeline.
+    """
+    __tablename__ = "contest_rank_event"
+    __table_args__ = {"schema": "public"}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    contest_id: Mapped[int] = mapped_column(Integer, ForeignKey("public.contest.id"), nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    time: Mapped[int] = mapped_column(Integer, nullable=False)
+    accepted_number: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_time: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_score: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
 class ContestLanguage(BaseEntity, Base):
     __tablename__ = "micro_contest_language"
     __table_args__ = {"schema": "public"}
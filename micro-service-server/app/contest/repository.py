@@ -6,8 +6,9 @@ from typing import List, Tuple
 from sqlalchemy import and_
 from app.contest.models import *
 
+from app.organization.models import Organization
 from app.user.models import User, UserData
-from app.problem.models import Problem, problem_tags_association_table
+from app.problem.models import Problem, UserProblemStatus, problem_tags_association_table
 from app.submission.models import Submission
 
 from sqlalchemy import delete
@@ -147,6 +148,58 @@ async def get_all_contests_with_languages(
     return result.all()
 
 
+async def get_contest_summaries(
+        contest_ids: List[int],
+        db: AsyncSession) -> dict:
+    """
+    Everything a contest list row needs besides the contest itself, for a whole page in one query:
+    creator, languages, organization, participant and visible problem counts and the approval policy.
+    Returns {contest_id: row}.
+    """
+    if not contest_ids:
+        return {}
+    participants = (
+        select(func.count()).select_from(ContestUser)
+        .where(ContestUser.contest_id == Contest.id)
+        .correlate(Contest)
+        .scalar_subquery()
+    )
+    problem_count = (
+        select(func.count()).select_from(Problem)
+        .where(Problem.contest_id == Contest.id, Problem.visible.is_(True))
+        .correlate(Contest)
+        .scalar_subquery()
+    )
+    policy_status = (
+        select(ContestUser.status)
+        .where(ContestUser.contest_id == Contest.id, ContestUser.user_id == 0)
+        .correlate(Contest)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(
+            Contest.id.label("contest_id"),
+            User.id.label("creator_id"),
+            User.username.label("creator_username"),
+            ContestLanguage.languages,
+            OrganizationContest.organization_id,
+            OrganizationContest.is_organization_only,
+            OrganizationContest.is_public,
+            Organization.name.label("organization_name"),
+            participants.label("participants"),
+            problem_count.label("problem_count"),
+            policy_status.label("policy_status"),
+        )
+        .join(User, Contest.created_by_id == User.id)
+        .outerjoin(ContestLanguage, Contest.id == ContestLanguage.contest_id)
+        .outerjoin(OrganizationContest, Contest.id == OrganizationContest.contest_id)
+        .outerjoin(Organization, OrganizationContest.organization_id == Organization.id)
+        .where(Contest.id.in_(contest_ids))
+    )
+    result = await db.execute(stmt)
+    return {row.contest_id: row for row in result}
+
+
 async def count_contest_participants_by_contest_id(
         contest_id,
         db: AsyncSession):
@@ -228,6 +281,35 @@ async def delete_contest_ranks(
     await db.execute(delete(OIContestRank).where(OIContestRank.contest_id == contest_id))
 
 
+async def delete_contest_best_scores(
+        contest_id: int,
+        db: AsyncSession) -> None:
+    await db.execute(delete(ContestBestScore).where(ContestBestScore.contest_id == contest_id))
+
+
+async def delete_contest_rank_events(
+        contest_id: int,
+        db: AsyncSession) -> None:
+    await db.execute(delete(ContestRankEvent).where(ContestRankEvent.contest_id == contest_id))
+
+
+async def find_best_scores_by_contest_id(
+        contest_id: int,
+        db: AsyncSession,
+        user_id: Optional[int] = None) -> List[ContestBestScore]:
+    stmt = select(ContestBestScore).where(ContestBestScore.contest_id == contest_id)
+    if user_id is not None:
+        stmt = stmt.where(ContestBestScore.user_id == user_id)
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+
+async def delete_contest_user_problem_status(
+        contest_id: int,
+        db: AsyncSession) -> None:
+    await db.execute(delete(UserProblemStatus).where(UserProblemStatus.contest_id == contest_id))
+
+
 async def delete_contest_submissions(
         contest_id: int,
         db: AsyncSession) -> None:
@@ -438,10 +520,14 @@ async def get_policy(
         )
     )
     result = await db.execute(stmt)
-    status = result.scalar_one_or_none()
-    if status is None:
+    return policy_requires_approval(result.scalar_one_or_none())
+
+
+def policy_requires_approval(policy_status: Optional[str]) -> bool:
+    # The policy is stored as a ContestUser row with user_id 0; contests without one require approval
+    if policy_status is None:
         return True
-    return status == "policy_requires"
+    return policy_status == "policy_requires"
 
 
 async def get_contest_by_id(
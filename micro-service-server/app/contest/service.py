@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timezone
 import app.contest.repository as contest_repo
 import app.organization.service as organization_service
+import app.problem.counters as problem_counters
 import app.problem.repository as problem_repo
 import app.organization.repository as organization_repo
 import app.submission.repository as submission_repo
@@ -176,10 +177,9 @@ async def get_contest_detail(contest_id: int, user_profile: UserProfile, db: Asy
         if not org_member and not contest_user and not is_system_admin:
             contest_exception.contest_access_forbidden()
 
-    contest_language = await contest_repo.find_contest_language_by_contest_id(contest_id, db)
-    languages = contest_language.languages if contest_language else []
-    contest_participants_num = await contest_repo.count_contest_participants_by_contest_id(contest_id, db)
-    return await _create_contest_data_dto_from_entity(contest, languages, contest_participants_num, db)
+    summaries = await contest_repo.get_contest_summaries([contest.id], db)
+    summary = summaries[contest.id]
+    return _build_contest_data_dto(contest, summary, summary.languages or [], summary.participants)
 
 
 async def _clone_and_add_problem(db: AsyncSession, contest_id: int, problem_id: int, display_id: str, user_id: int,
@@ -229,6 +229,7 @@ async def get_contest_problems(contest_id: int, user_profile: UserProfile, db: A
     )
     solved_set = set(solved_problem_ids)
     attempted_set = set(attempted_problem_ids)
+    pending = await problem_counters.pending_counts(problem_ids)
 
     return [
         ContestProblemDTO(
@@ -236,8 +237,8 @@ async def get_contest_problems(contest_id: int, user_profile: UserProfile, db: A
             display_id=problem._id,
             title=problem.title,
             difficulty=problem.difficulty,
-            submission_number=problem.submission_number or 0,
-            accepted_number=problem.accepted_number or 0,
+            submission_number=(problem.submission_number or 0) + pending.get(problem.id, (0, 0))[0],
+            accepted_number=(problem.accepted_number or 0) + pending.get(problem.id, (0, 0))[1],
             status=2 if problem.id in solved_set else (1 if problem.id in attempted_set else 0),
         )
         for problem in problems
@@ -261,6 +262,9 @@ async def delete_contest(contest_id: int, user_profile: UserProfile, db: AsyncSe
 async def delete_contest_data(contest_id: int, db: AsyncSession):
     await contest_repo.delete_contest_announcements(contest_id, db)
     await contest_repo.delete_contest_ranks(contest_id, db)
+    await contest_repo.delete_contest_best_scores(contest_id, db)
+    await contest_repo.delete_contest_rank_events(contest_id, db)
+    await contest_repo.delete_contest_user_problem_status(contest_id, db)
     await contest_repo.delete_contest_submissions(contest_id, db)
     await contest_repo.delete_contest_languages(contest_id, db)
     await contest_repo.delete_contest_users(contest_id, db)
@@ -309,25 +313,12 @@ def _create_contest_entity_from_dto(create_contest_dto, user_id):
 
 async def _create_contest_data_dto_from_entity(contest: Contest, languages: List[str], participants_num: int,
                                                db) -> ContestDataDTO:
-    creator_user = await user_repo.find_user_by_id(contest.created_by_id, db)
-    created_by_dto = ContestCreatedByDTO(
-        id=creator_user.id,
-        username=creator_user.username,
-    )
-    org_contest = await contest_repo.find_organization_contest_by_contest_id(contest.id, db)
-    is_organization_only = org_contest.is_organization_only if org_contest else False
-    is_public = org_contest.is_public if org_contest and org_contest.is_public is not None else False
-
-    organization_id = org_contest.organization_id if org_contest else None
-    organization_name = None
-    if organization_id:
-        org = await organization_repo.find_by_id(organization_id, db)
-        if org:
-            organization_name = org.name
+    summaries = await contest_repo.get_contest_summaries([contest.id], db)
+    return _build_contest_data_dto(contest, summaries[contest.id], languages, participants_num)
 
-    policy = await contest_repo.get_policy(contest.id, db)
-    problem_count = await problem_repo.count_contest_problems(db, contest.id)
 
+def _build_contest_data_dto(contest: Contest, summary, languages: List[str], participants_num: int) -> ContestDataDTO:
+    is_public = summary.is_public if summary.is_public is not None else False
     return ContestDataDTO(
         id=contest.id,
         title=contest.title,
@@ -342,27 +333,26 @@ async def _create_contest_data_dto_from_entity(contest: Contest, languages: List
         password=contest.password,
         status="0",
         participants=participants_num or 0,
-        createdBy=created_by_dto,
+        createdBy=ContestCreatedByDTO(id=summary.creator_id, username=summary.creator_username),
         languages=languages,
-        problemCount=problem_count,
-        is_organization_only=is_organization_only,
+        problemCount=summary.problem_count,
+        is_organization_only=summary.is_organization_only or False,
         is_public=is_public,
-        requires_approval=policy,
-        organization_id=organization_id,
-        organization_name=organization_name
+        requires_approval=contest_repo.policy_requires_approval(summary.policy_status),
+        organization_id=summary.organization_id,
+        organization_name=summary.organization_name
     )
 
 
 async def _process_contest_response(
         page: Page,
         db: AsyncSession) -> PaginatedContestResponse:
+    # One query for the whole page instead of several per contest
+    summaries = await contest_repo.get_contest_summaries([contest.id for contest in page.items], db)
     dtos = []
     for contest in page.items:
-        contest_participants_num = await contest_repo.count_contest_participants_by_contest_id(contest.id, db)
-        contest_language = await contest_repo.find_contest_language_by_contest_id(contest.id, db)
-        languages = contest_language.languages if contest_language else []
-        dto = await _create_contest_data_dto_from_entity(contest, languages, contest_participants_num, db)
-        dtos.append(dto)
+        summary = summaries[contest.id]
+        dtos.append(_build_contest_data_dto(contest, summary, summary.languages or [], summary.participants))
     return PaginatedContestResponse(
         items=dtos,
         total=page.total,
@@ -807,9 +797,10 @@ async def ensure_user_joined_contest(contest_id, user_profile: UserProfile, db)
 
 
 async def get_contest_progress(contest_id, user_profile, db) -> ContestProgressResponse:
-    solved: int = await (submission_repo
-                         .count_solved_problem_by_contest_id_and_user_id(contest_id, user_profile.user_id, db))
-    score: int = await submission_repo.get_score_by_contest_id_and_user_id(contest_id, user_profile.user_id, db)
+    best_scores = await contest_repo.find_best_scores_by_contest_id(contest_id, db, user_id=user_profile.user_id)
+    # every judged test case passed, i.e. the submission was accepted
+    solved: int = sum(1 for best in best_scores if best.total and best.passed == best.total)
+    score: int = sum(best.score for best in best_scores)
     total: int = await submission_repo.count_problem_by_contest_id(contest_id, db)
     return ContestProgressResponse(
         solved=solved,
@@ -29,6 +29,8 @@ class Settings(BaseSettings):
 
     # Judge
     JUDGE_SERVER_TOKEN: str = "token"
+    # Problems of one zip import whose solutions are validated at the same time
+    PROBLEM_IMPORT_VALIDATION_CONCURRENCY: int = 4
 
     # SSO & Auth
     SSO_INTROSPECT_URL: str = "http://localhost:8000/api/sso"
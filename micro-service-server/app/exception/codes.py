@@ -54,6 +54,11 @@ class ErrorCode(str, Enum):
     SUBMISSION_NOT_FOUND = "SUBMISSION_404"
     SUBMISSION_TOO_FREQUENT = "SUBMISSION_429"
 
+    # Execution
+    EXECUTION_TOO_FREQUENT = "EXECUTION_429"
+    EXECUTION_JUDGE_BUSY = "EXECUTION_503"
+    EXECUTION_JUDGE_TIMEOUT = "EXECUTION_504"
+
     # Organization
     USER_NOT_IN_ORGANIZATION = "ORGANIZATION_400_1"
     ORGANIZATION_FORBIDDEN = "ORGANIZATION_401"
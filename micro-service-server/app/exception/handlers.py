@@ -3,8 +3,8 @@ from fastapi import HTTPException
 from app.exception.codes import ErrorCode
 
 
-def raise_http_exception(status_code: int, message: str, error_code: ErrorCode):
-    raise HTTPException(status_code=status_code, detail={"code": error_code, "message": message})
+def raise_http_exception(status_code: int, message: str, error_code: ErrorCode, headers: dict | None = None):
+    raise HTTPException(status_code=status_code, detail={"code": error_code, "message": message}, headers=headers)
 
 
 def bad_request(message: str ="bad_request", error_code: ErrorCode = ErrorCode.BAD_REQUEST):
@@ -27,5 +27,17 @@ def conflict(message: str, error_code: ErrorCode = ErrorCode.CONFLICT):
     raise_http_exception(409, message, error_code)
 
 
+def too_many_requests(message: str, error_code: ErrorCode, retry_after: int):
+    raise_http_exception(429, message, error_code, headers={"Retry-After": str(retry_after)})
+
+
+def service_unavailable(message: str, error_code: ErrorCode, retry_after: int):
+    raise_http_exception(503, message, error_code, headers={"Retry-After": str(retry_after)})
+
+
+def gateway_timeout(message: str, error_code: ErrorCode):
+    raise_http_exception(504, message, error_code)
+
+
 def internal_server_error(message: str, error_code: ErrorCode = ErrorCode.INTERNAL_SERVER_ERROR):
     raise_http_exception(500, message, error_code)
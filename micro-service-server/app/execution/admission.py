@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict
+
+from app.core.redis import redis_client
+
+# Per-user admission: at most USER_CONCURRENCY runs in flight, and a token bucket of
+# USER_BURST runs refilled at USER_RATE_PER_SECOND, so one user retrying in a loop
+# cannot hold every judge slot.
+USER_INFLIGHT_KEY = "run_code_user_inflight"
+USER_BUCKET_KEY = "run_code_user_bucket"
+USER_CONCURRENCY = 2
+USER_BURST = 10
+USER_RATE_PER_SECOND = 0.5
+# Leases only have to outlive the run; they expire on their own if a worker dies
+USER_LEASE_TTL_SECONDS = 120
+USER_CONCURRENCY_RETRY_AFTER_SECONDS = 1
+
+# Runs that find every judge slot taken wait in a bounded queue for up to
+# QUEUE_TIMEOUT_SECONDS before they are shed.
+QUEUE_KEY = "run_code_queue"
+QUEUE_MAX_DEPTH = 64
+QUEUE_TIMEOUT_SECONDS = 5.0
+QUEUE_POLL_INTERVAL_SECONDS = 0.1
+QUEUE_RETRY_AFTER_SECONDS = 2
+
+ADMISSION_STATS_KEY = "run_code_admission_stats"
+
+# Returns {0, 0} when admitted, {1, retry after ms} over the concurrency cap, {2, retry after ms} out of tokens.
+#
+# KEYS[1]: in-flight leases of the user, KEYS[2]: token bucket of the user
+# ARGV[1]: lease id, ARGV[2]: lease ttl ms, ARGV[3]: concurrency, ARGV[4]: burst,
+# ARGV[5]: tokens per second, ARGV[6]: retry after ms over the concurrency cap
+ADMIT_SCRIPT = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now)
+if redis.call("ZCARD", KEYS[1]) >= tonumber(ARGV[3]) then
+    return {1, tonumber(ARGV[6])}
+end
+local burst = tonumber(ARGV[4])
+local rate = tonumber(ARGV[5])
+local bucket = redis.call("HMGET", KEYS[2], "tokens", "ts")
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate / 1000)
+local bucket_ttl = math.ceil(burst * 1000 / rate)
+if tokens < 1 then
+    redis.call("HSET", KEYS[2], "tokens", tostring(tokens), "ts", now)
+    redis.call("PEXPIRE", KEYS[2], bucket_ttl)
+    return {2, math.ceil((1 - tokens) * 1000 / rate)}
+end
+redis.call("HSET", KEYS[2], "tokens", tostring(tokens - 1), "ts", now)
+redis.call("PEXPIRE", KEYS[2], bucket_ttl)
+redis.call("ZADD", KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+redis.call("PEXPIRE", KEYS[1], tonumber(ARGV[2]))
+return {0, 0}
+"""
+
+# Returns 1 when the waiter joined the queue, 0 when the queue is full.
+#
+# KEYS[1]: queue, ARGV[1]: waiter id, ARGV[2]: deadline ms, ARGV[3]: max depth
+ENTER_QUEUE_SCRIPT = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now)
+if redis.call("ZCARD", KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call("ZADD", KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+redis.call("PEXPIRE", KEYS[1], tonumber(ARGV[2]))
+return 1
+"""
+
+
+class AdmissionRejected(Exception):
+    """A run was refused; retry_after is the number of seconds the client should wait."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class QueueTicket:
+    waiter_id: str
+    entered_at: float
+    deadline: float
+
+
+class RunCodeAdmission:
+    """
+    Admission control for run-code: a per-user concurrency cap and token bucket checked in one
+    atomic script, and a bounded wait queue with a deadline for runs that find every judge slot taken.
+    Counters and the wait time are kept in Redis for the stats endpoint.
+    """
+
+    def __init__(self, redis=redis_client):
+        self._redis = redis
+        self._admit_script = None
+        self._enter_queue_script = None
+
+    @asynccontextmanager
+    async def admit(self, user_id: int) -> AsyncIterator[None]:
+        if self._admit_script is None:
+            self._admit_script = self._redis.register_script(ADMIT_SCRIPT)
+        lease_id = uuid.uuid4().hex
+        inflight_key = f"{USER_INFLIGHT_KEY}:{user_id}"
+        status, retry_after_ms = await self._admit_script(
+            keys=[inflight_key, f"{USER_BUCKET_KEY}:{user_id}"],
+            args=[lease_id, USER_LEASE_TTL_SECONDS * 1000, USER_CONCURRENCY, USER_BURST, USER_RATE_PER_SECOND,
+                  USER_CONCURRENCY_RETRY_AFTER_SECONDS * 1000],
+        )
+        if int(status):
+            reason = "rejected_concurrency" if int(status) == 1 else "rejected_rate"
+            await self._count(reason)
+            raise AdmissionRejected(reason, max(1, math.ceil(int(retry_after_ms) / 1000)))
+        await self._count("admitted")
+        try:
+            yield
+        finally:
+            await self._redis.zrem(inflight_key, lease_id)
+
+    async def enter_queue(self) -> QueueTicket:
+        if self._enter_queue_script is None:
+            self._enter_queue_script = self._redis.register_script(ENTER_QUEUE_SCRIPT)
+        ticket = QueueTicket(uuid.uuid4().hex, time.monotonic(), time.monotonic() + QUEUE_TIMEOUT_SECONDS)
+        joined = await self._enter_queue_script(
+            keys=[QUEUE_KEY], args=[ticket.waiter_id, int(QUEUE_TIMEOUT_SECONDS * 1000), QUEUE_MAX_DEPTH])
+        if not int(joined):
+            await self._count("shed_queue_full")
+            raise AdmissionRejected("shed_queue_full", QUEUE_RETRY_AFTER_SECONDS)
+        await self._count("queued")
+        return ticket
+
+    async def wait(self, ticket: QueueTicket) -> None:
+        """Sleep before the next slot attempt; sheds the run once the deadline has passed."""
+        if time.monotonic() >= ticket.deadline:
+            await self._count("shed_deadline")
+            raise AdmissionRejected("shed_deadline", QUEUE_RETRY_AFTER_SECONDS)
+        await asyncio.sleep(min(QUEUE_POLL_INTERVAL_SECONDS, max(0.0, ticket.deadline - time.monotonic())))
+
+    async def leave_queue(self, ticket: QueueTicket) -> None:
+        wait_ms = int((time.monotonic() - ticket.entered_at) * 1000)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zrem(QUEUE_KEY, ticket.waiter_id)
+            pipe.hincrby(ADMISSION_STATS_KEY, "wait_ms_total", wait_ms)
+            pipe.hincrby(ADMISSION_STATS_KEY, "waits", 1)
+            await pipe.execute()
+
+    async def stats(self) -> Dict[str, object]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(ADMISSION_STATS_KEY)
+            pipe.zcount(QUEUE_KEY, int(time.time() * 1000), "+inf")
+            raw, depth = await pipe.execute()
+        raw = raw or {}
+        stats: Dict[str, object] = {
+            name: int(raw.get(name, 0))
+            for name in ("admitted", "rejected_concurrency", "rejected_rate", "queued", "shed_queue_full",
+                         "shed_deadline", "waits", "wait_ms_total")
+        }
+        stats["queue_depth"] = int(depth)
+        stats["avg_wait_ms"] = stats["wait_ms_total"] / stats["waits"] if stats["waits"] else 0.0
+        return stats
+
+    async def _count(self, name: str) -> None:
+        await self._redis.hincrby(ADMISSION_STATS_KEY, name, 1)
+
+
+run_code_admission = RunCodeAdmission()
+
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.logger import logger
+from app.core.redis import redis_client
+from app.execution.schemas import RunCodeRequest
+
+RUN_CODE_CACHE_KEY = "run_code_cache"
+RUN_CODE_CACHE_STATS_KEY = "run_code_cache_stats"
+# Long enough for repeated presses of "Run", short enough that nondeterministic programs are rerun soon
+RUN_CODE_CACHE_TTL_SECONDS = 60
+# Judge result for a failure on the judge side; such runs are retried instead of cached
+SYSTEM_ERROR = 5
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class RunCodeCache:
+    """
+    Short-lived cache of run-code results, keyed by language, source, stdin and limits.
+    Results are shared by all workers through Redis. Identical requests running at the same time
+    in one worker wait for a single judge call instead of each leasing a judge slot.
+    Hits, misses and shared runs are counted in Redis for the hit rate.
+    """
+
+    def __init__(self, redis=redis_client, ttl: int = RUN_CODE_CACHE_TTL_SECONDS):
+        self._redis = redis
+        self._ttl = ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def key(req: RunCodeRequest) -> str:
+        return ":".join((RUN_CODE_CACHE_KEY, req.language, _sha256(req.src), _sha256(req.stdin),
+                         str(req.max_cpu_time), str(req.max_memory_mb)))
+
+    @staticmethod
+    def cacheable(result: Any) -> bool:
+        if not isinstance(result, dict):
+            return False
+        if result.get("err"):
+            return result["err"] == "CompileError"
+        data = result.get("data")
+        return isinstance(data, list) and all(
+            isinstance(item, dict) and item.get("result") != SYSTEM_ERROR for item in data)
+
+    async def get_or_run(self, req: RunCodeRequest, run: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        key = self.key(req)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            await self._count("shared")
+            try:
+                # shield: a waiter going away must not cancel the run the others wait for
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The request that owned the run failed or was cancelled; its error may not apply
+                # to this request (e.g. a per-user limit), so run it again
+                return await self.get_or_run(req, run)
+
+        # Registered before the first await so concurrent requests find it
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._get(key)
+            if result is not None:
+                await self._count("hits")
+            else:
+                await self._count("misses")
+                result = await run()
+                if self.cacheable(result):
+                    await self._set(key, result)
+            future.set_result(result)
+            return result
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def stats(self) -> Dict[str, Any]:
+        raw = await self._redis.hgetall(RUN_CODE_CACHE_STATS_KEY) or {}
+        counts = {name: int(raw.get(name, 0)) for name in ("hits", "misses", "shared")}
+        total = sum(counts.values())
+        counts["hit_rate"] = (counts["hits"] + counts["shared"]) / total if total else 0.0
+        return counts
+
+    # Redis problems only cost the cache, the run itself goes on
+
+    async def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = await self._redis.get(key)
+        except Exception as e:
+            logger.warning(f"Run code cache read failed: {e!r}")
+            return None
+        return json.loads(raw) if raw else None
+
+    async def _set(self, key: str, result: Dict[str, Any]) -> None:
+        try:
+            await self._redis.set(key, json.dumps(result), ex=self._ttl)
+        except Exception as e:
+            logger.warning(f"Run code cache write failed: {e!r}")
+
+    async def _count(self, name: str) -> None:
+        try:
+            await self._redis.hincrby(RUN_CODE_CACHE_STATS_KEY, name, 1)
+        except Exception as e:
+            logger.warning(f"Run code cache stats update failed: {e!r}")
+
+
+run_code_cache = RunCodeCache()
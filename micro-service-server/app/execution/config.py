@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logger import logger
+from app.core.redis import redis_client
+from app.core.settings import settings
+from app.execution import exceptions
+from app.execution.models import SysOption
+
+# Django bumps this counter and publishes the new value on the channel of the same name
+# after SysOptions.languages or SysOptions.judge_server_token is saved
+JUDGE_CONFIG_VERSION_KEY = "judge_config_version"
+JUDGE_CONFIG_OPTION_KEYS = ("languages", "judge_server_token")
+LISTENER_RETRY_SECONDS = 5
+
+
+def _normalize(config: Dict[str, Any]) -> Dict[str, Any]:
+    norm_config = copy.deepcopy(config)
+    if isinstance(norm_config.get("run", {}).get("seccomp_rule"), dict):
+        norm_config["run"]["seccomp_rule"] = "c_cpp"
+    return norm_config
+
+
+@dataclass(frozen=True)
+class JudgeConfigSnapshot:
+    version: int
+    hashed_token: Optional[str]
+    # Normalized language configs by language name; shared by every run, so callers must not modify them
+    languages: Dict[str, Dict[str, Any]]
+
+
+class JudgeConfigCache:
+    """
+    In-process snapshot of the judge token and language configs.
+    Runs read the snapshot without a database or Redis round trip. The listener drops it when Django
+    publishes a newer version, and the next run loads it again in one query.
+    """
+
+    def __init__(self, redis=redis_client):
+        self._redis = redis
+        self._snapshot: Optional[JudgeConfigSnapshot] = None
+        # Newest version seen by the listener, so a load racing with a bump is not kept
+        self._published = 0
+        self._lock = asyncio.Lock()
+
+    async def get(self, session: AsyncSession, language: str) -> Tuple[Dict[str, Any], str]:
+        snapshot = self._snapshot or await self._load(session)
+        if not snapshot.hashed_token:
+            logger.critical("Missing JUDGE_SERVER_TOKEN")
+            exceptions.internal_server_error()
+        config = snapshot.languages.get(language)
+        if not config:
+            logger.error(f"Language not found: {language}")
+            exceptions.language_not_found()
+        return config, snapshot.hashed_token
+
+    def invalidate(self, version: Optional[int] = None) -> None:
+        """Drops the snapshot unless it is already at least at version."""
+        if version is not None:
+            self._published = max(self._published, version)
+        snapshot = self._snapshot
+        if snapshot is not None and (version is None or version > snapshot.version):
+            self._snapshot = None
+
+    async def _load(self, session: AsyncSession) -> JudgeConfigSnapshot:
+        # Concurrent runs after an invalidation share one load
+        async with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            # The version is read first: a bump during the load leaves this snapshot older than the message
+            version = int(await self._redis.get(JUDGE_CONFIG_VERSION_KEY) or 0)
+            rows = await session.execute(
+                select(SysOption.key, SysOption.value).where(SysOption.key.in_(JUDGE_CONFIG_OPTION_KEYS)))
+            options = dict(rows.all())
+            token = settings.JUDGE_SERVER_TOKEN or options.get("judge_server_token")
+            snapshot = JudgeConfigSnapshot(
+                version=version,
+                hashed_token=hashlib.sha256(token.encode("utf-8")).hexdigest() if token else None,
+                languages={item["name"]: _normalize(item["config"]) for item in options.get("languages") or []
+                           if item.get("config")},
+            )
+            # Incomplete options are not kept so the next run reads them again
+            if snapshot.hashed_token and snapshot.languages and version >= self._published:
+                self._snapshot = snapshot
+            return snapshot
+
+    async def listen(self) -> None:
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(JUDGE_CONFIG_VERSION_KEY)
+                # Versions published while unsubscribed were missed
+                self.invalidate()
+                logger.info(f"listener subscribed to {JUDGE_CONFIG_VERSION_KEY}")
+                async for msg in pubsub.listen():
+                    if msg["type"] == "message":
+                        self.invalidate(int(msg["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Judge config listener failed, resubscribing: {e!r}")
+                await asyncio.sleep(LISTENER_RETRY_SECONDS)
+            finally:
+                await pubsub.close()
+
+
+judge_config_cache = JudgeConfigCache()
+
+
+async def judge_config_listener() -> None:
+    await judge_config_cache.listen()
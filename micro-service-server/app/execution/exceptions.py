@@ -5,5 +5,22 @@ def language_not_found():
     handlers.bad_request("Wrong Language option", ErrorCode.BAD_REQUEST)
 
 
+def forbidden():
+    handlers.forbidden("Permission denied", ErrorCode.FORBIDDEN)
+
+
+def too_many_runs(retry_after: int):
+    handlers.too_many_requests("Too many runs, try again later", ErrorCode.EXECUTION_TOO_FREQUENT, retry_after)
+
+
+def judge_busy(retry_after: int):
+    handlers.service_unavailable("Judge servers are busy, try again later", ErrorCode.EXECUTION_JUDGE_BUSY,
+                                 retry_after)
+
+
+def judge_timeout():
+    handlers.gateway_timeout("Judge server did not respond in time", ErrorCode.EXECUTION_JUDGE_TIMEOUT)
+
+
 def internal_server_error():
     handlers.internal_server_error("Internal Server Error", ErrorCode.INTERNAL_SERVER_ERROR)
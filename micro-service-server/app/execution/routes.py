@@ -27,6 +27,41 @@ async def run_code(
             stdin=req.input,
             max_cpu_time=MAX_CPU_TIME,
             max_memory_mb=MAX_MEMORY_MB
-        )
+        ),
+        user_id=user_profile.user_id
     )
     return result
+
+
+@router.post("/run/batch")
+async def run_code_batch(
+        req: RunBatchRequest,
+        session: AsyncSession = Depends(get_database),
+        user_profile: UserProfile = Depends(get_userdata)
+):
+    result = await execution_service.run_code_batch_service(
+        session=session,
+        req=RunCodeBatchRequest(
+            language=req.language,
+            src=req.code,
+            stdins=req.inputs,
+            max_cpu_time=MAX_CPU_TIME,
+            max_memory_mb=MAX_MEMORY_MB
+        ),
+        user_id=user_profile.user_id
+    )
+    return result
+
+
+@router.get("/cache/stats")
+async def run_code_cache_stats(
+        user_profile: UserProfile = Depends(get_userdata)
+):
+    return await execution_service.get_run_code_cache_stats(user_profile)
+
+
+@router.get("/admission/stats")
+async def run_code_admission_stats(
+        user_profile: UserProfile = Depends(get_userdata)
+):
+    return await execution_service.get_run_code_admission_stats(user_profile)
@@ -1,69 +1,132 @@
 from __future__ import annotations
 
+import uuid
 from contextlib import AbstractAsyncContextManager
 from dataclasses import dataclass
-from typing import Optional
+from typing import Iterable, Optional
 
-from sqlalchemy import select, update
-from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.redis import redis_client
 
-from app.judge_server.models import JudgeServer
-from app.core.database import SessionLocal
+# Key layout shared with the Django dispatcher (OnlineJudge/judge/allocator.py).
+# Servers are registered by the Django heartbeat API; both sides lease slots
+# from the same sorted sets, so the limits hold across the two services.
+JUDGE_SERVER_REGISTRY_KEY = "judge_server_registry"
+JUDGE_SERVER_SLOTS_KEY = "judge_server_slots"
+JUDGE_SERVER_CIRCUIT_KEY = "judge_server_circuit"
+JUDGE_SERVER_FAILURES_KEY = "judge_server_failures"
+HEARTBEAT_TIMEOUT_SECONDS = 6
+# Run-code requests are bounded by the httpx timeout; the lease only has to outlive it.
+DEFAULT_LEASE_TTL_SECONDS = 60
+# A server failing CIRCUIT_FAILURE_THRESHOLD times within CIRCUIT_FAILURE_WINDOW_SECONDS
+# is skipped by both services for CIRCUIT_OPEN_SECONDS.
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_FAILURE_WINDOW_SECONDS = 30
+CIRCUIT_OPEN_SECONDS = 30
+
+ACQUIRE_SLOT_SCRIPT = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local heartbeat_timeout = tonumber(ARGV[4]) * 1000
+local excluded = {}
+for i = 6, #ARGV do
+    excluded[ARGV[i]] = true
+end
+local best, best_load
+for _, raw in ipairs(redis.call("HVALS", KEYS[1])) do
+    local server = cjson.decode(raw)
+    if not server["is_disabled"] and server["service_url"] ~= cjson.null
+            and now - server["last_heartbeat"] * 1000 <= heartbeat_timeout
+            and not excluded[tostring(server["id"])]
+            and redis.call("EXISTS", ARGV[5] .. ":" .. server["id"]) == 0 then
+        local slot_key = ARGV[1] .. ":" .. server["id"]
+        redis.call("ZREMRANGEBYSCORE", slot_key, "-inf", now)
+        local load = redis.call("ZCARD", slot_key)
+        if load <= server["cpu_core"] * 2 and (best_load == nil or load < best_load) then
+            best = server
+            best_load = load
+        end
+    end
+end
+if not best then
+    return nil
+end
+local slot_key = ARGV[1] .. ":" .. best["id"]
+redis.call("ZADD", slot_key, now + tonumber(ARGV[3]) * 1000, ARGV[2])
+-- the key expires with its longest lease; a short lease must not shorten it
+local last = redis.call("ZREVRANGE", slot_key, 0, 0, "WITHSCORES")
+redis.call("PEXPIREAT", slot_key, last[2])
+return {best["id"], best["service_url"]}
+"""
+
+REPORT_FAILURE_SCRIPT = """
+local failures = redis.call("INCR", KEYS[1])
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+if failures < tonumber(ARGV[1]) then
+    return 0
+end
+redis.call("SET", KEYS[2], 1, "EX", ARGV[3])
+redis.call("SET", KEYS[1], tonumber(ARGV[1]) - 1, "EX", tonumber(ARGV[2]) + tonumber(ARGV[3]))
+return 1
+"""
+
+_acquire_script = redis_client.register_script(ACQUIRE_SLOT_SCRIPT)
+_report_failure_script = redis_client.register_script(REPORT_FAILURE_SCRIPT)
 
 
 @dataclass
 class SelectedServer:
     id: int
     service_url: str
-    cpu_core: int
-    task_number: int
+    lease_id: str
+
+
+def _slot_key(server_id: int) -> str:
+    return f"{JUDGE_SERVER_SLOTS_KEY}:{server_id}"
+
+
+async def acquire_judge_slot(
+        ttl: int = DEFAULT_LEASE_TTL_SECONDS,
+        exclude: Iterable[int] = ()) -> Optional[SelectedServer]:
+    # Selection and lease happen in one atomic script: one round trip, no row locks.
+    lease_id = uuid.uuid4().hex
+    result = await _acquire_script(
+        keys=[JUDGE_SERVER_REGISTRY_KEY],
+        args=[JUDGE_SERVER_SLOTS_KEY, lease_id, ttl, HEARTBEAT_TIMEOUT_SECONDS, JUDGE_SERVER_CIRCUIT_KEY, *exclude],
+    )
+    if not result:
+        return None
+    server_id, service_url = result
+    return SelectedServer(id=int(server_id), service_url=service_url, lease_id=lease_id)
+
+
+async def release_judge_slot(server: SelectedServer) -> None:
+    await redis_client.zrem(_slot_key(server.id), server.lease_id)
+
+
+async def report_judge_failure(server_id: int) -> bool:
+    """Record a transport failure; returns True when the circuit for the server opens."""
+    opened = await _report_failure_script(
+        keys=[f"{JUDGE_SERVER_FAILURES_KEY}:{server_id}", f"{JUDGE_SERVER_CIRCUIT_KEY}:{server_id}"],
+        args=[CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_FAILURE_WINDOW_SECONDS, CIRCUIT_OPEN_SECONDS],
+    )
+    return bool(opened)
+
+
+async def report_judge_success(server_id: int) -> None:
+    await redis_client.delete(f"{JUDGE_SERVER_FAILURES_KEY}:{server_id}")
 
 
 class ChooseJudgeServerAsync(AbstractAsyncContextManager):
-    def __init__(self, session: Optional[AsyncSession] = None):
-        # A dedicated short-lived session is used for selection/increment/decrement
-        # to avoid nested transaction issues with a caller-held session.
-        self._external_session = session
+    def __init__(self, ttl: int = DEFAULT_LEASE_TTL_SECONDS, exclude: Iterable[int] = ()):
+        self._ttl = ttl
+        self._exclude = exclude
         self.server: Optional[SelectedServer] = None
 
     async def __aenter__(self) -> Optional[SelectedServer]:
-        # Single transactional selection + increment
-        async with SessionLocal() as session:
-            async with session.begin():
-                stmt = (
-                    select(JudgeServer)
-                    .where(JudgeServer.is_disabled.is_(False))
-                    .order_by(JudgeServer.task_number)
-                    .with_for_update()
-                )
-                result = await session.execute(stmt)
-                servers = [s for s in result.scalars().all() if s.status == "normal"]
-
-                for s in servers:
-                    # Use same heuristic: allow up to cpu_core * 2 concurrent tasks
-                    if (s.task_number or 0) <= (s.cpu_core or 0) * 2:
-                        # Atomic increment using UPDATE judge_server SET task_number = task_number + 1 WHERE id = ...
-                        await session.execute(
-                            update(JudgeServer)
-                            .where(JudgeServer.id == s.id)
-                            .values(task_number=JudgeServer.task_number + 1)
-                        )
-                        self.server = SelectedServer(
-                            id=s.id,
-                            service_url=s.service_url,
-                            cpu_core=s.cpu_core,
-                            task_number=(s.task_number or 0) + 1,
-                        )
-                        return self.server
-        return None
+        self.server = await acquire_judge_slot(self._ttl, self._exclude)
+        return self.server
 
     async def __aexit__(self, exc_type, exc, tb):
         if self.server:
-            async with SessionLocal() as session:
-                async with session.begin():
-                    await session.execute(
-                        update(JudgeServer)
-                        .where(JudgeServer.id == self.server.id)
-                        .values(task_number=JudgeServer.task_number - 1)
-                    )
+            await release_judge_slot(self.server)
         return False
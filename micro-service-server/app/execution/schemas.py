@@ -1,14 +1,26 @@
 from pydantic import BaseModel, Field
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 class RunRequest(BaseModel):
     language: str = Field(..., description="Language name : Python3, C, C++, JavaScript, Golang")
     code: str = Field(..., description="Source code to execute")
     input: str = Field("", description="Stdin for the program")
 
+class RunBatchRequest(BaseModel):
+    language: str = Field(..., description="Language name : Python3, C, C++, JavaScript, Golang")
+    code: str = Field(..., description="Source code to execute")
+    inputs: List[str] = Field(..., min_length=1, max_length=10, description="Stdin for each run")
+
 class RunCodeRequest(BaseModel):
     language: str
     src: str
     stdin: str
     max_cpu_time: int
-    max_memory_mb: int
\ No newline at end of file
+    max_memory_mb: int
+
+class RunCodeBatchRequest(BaseModel):
+    language: str
+    src: str
+    stdins: List[str]
+    max_cpu_time: int
+    max_memory_mb: int
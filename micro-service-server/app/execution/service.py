@@ -1,99 +1,226 @@
-import hashlib, copy, os, uuid, json, httpx
-from sqlalchemy import select
+import hashlib, os, shutil, uuid, json, httpx
+from contextlib import nullcontext
+from typing import Awaitable, Callable
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.execution.models import SysOption
+from app.execution.admission import AdmissionRejected, run_code_admission
+from app.execution.cache import run_code_cache
+from app.execution.config import judge_config_cache
 from app.execution.schemas import *
-from app.execution.scheduler import ChooseJudgeServerAsync
+from app.execution.scheduler import (DEFAULT_LEASE_TTL_SECONDS, ChooseJudgeServerAsync, report_judge_failure,
+                                     report_judge_success)
+from app.execution.transport import CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS, get_judge_client
 from app.execution import exceptions
 from app.core.logger import logger
 from app.core.settings import settings
-
-async def _get_sys_option(session: AsyncSession, key: str) -> Optional[Any]:
-    stmt = select(SysOption.value).where(SysOption.key == key)
-    res = await session.execute(stmt)
-    row = res.first()
-    return row[0] if row else None
+from app.user.schemas import UserProfile
 
 async def _get_judge_config(session: AsyncSession, language: str):
-    token = settings.JUDGE_SERVER_TOKEN or await _get_sys_option(session, "judge_server_token")
-    if not token:
-        logger.critical("Missing JUDGE_SERVER_TOKEN")
-        exceptions.internal_server_error()
-
-    langs = await _get_sys_option(session, "languages") or []
-    config = next((item["config"] for item in langs if item["name"] == language), None)
-
-    if not config:
-        logger.error(f"Language not found: {language}")
-        exceptions.language_not_found()
-
-    norm_config = copy.deepcopy(config)
-    if isinstance(norm_config.get("run", {}).get("seccomp_rule"), dict):
-        norm_config["run"]["seccomp_rule"] = "c_cpp"
+    return await judge_config_cache.get(session, language)
 
-    return norm_config, hashlib.sha256(token.encode("utf-8")).hexdigest()
 
-
-def _prepare_temp_testcase(stdin: str) -> str:
+def _prepare_temp_testcase(stdins: List[str]) -> str:
+    """Write one test case per stdin (1.in ... N.in) so the judge compiles once and runs every input."""
     case_id = uuid.uuid4().hex
     case_dir = os.path.join(settings.TEST_CASE_DATA_PATH, case_id)
     os.makedirs(case_dir, exist_ok=True)
-    with open(os.path.join(case_dir, "1.in"), "w", encoding="utf-8") as f:
-        f.write(stdin)
-    open(os.path.join(case_dir, "1.out"), "w").close()
-
     empty_hash = hashlib.md5(b"").hexdigest()
-    info = {
-        "spj": False,
-        "test_cases": {"1": {"input_name": "1.in", "output_name": "1.out",
-                             "output_md5": empty_hash, "stripped_output_md5": empty_hash}}
-    }
+    test_cases = {}
+    for index, stdin in enumerate(stdins, start=1):
+        with open(os.path.join(case_dir, f"{index}.in"), "w", encoding="utf-8") as f:
+            f.write(stdin)
+        open(os.path.join(case_dir, f"{index}.out"), "w").close()
+        test_cases[str(index)] = {"input_name": f"{index}.in", "output_name": f"{index}.out",
+                                  "output_md5": empty_hash, "stripped_output_md5": empty_hash}
+
+    info = {"spj": False, "test_cases": test_cases}
     with open(os.path.join(case_dir, "info"), "w", encoding="utf-8") as f:
         json.dump(info, f)
 
     return case_id
 
+
+def _remove_temp_testcase(case_id: str) -> None:
+    shutil.rmtree(os.path.join(settings.TEST_CASE_DATA_PATH, case_id), ignore_errors=True)
+
+
+async def _judge_temp_testcase(
+        service_url: str,
+        headers: Dict[str, str],
+        config: Dict[str, Any],
+        src: str,
+        stdins: List[str],
+        max_cpu_time: int,
+        mem_bytes: int,
+        timeout: Optional[httpx.Timeout] = None) -> Dict[str, Any]:
+    client = get_judge_client(service_url)
+    url_judge = f"{service_url.rstrip('/')}/judge"
+    case_id = _prepare_temp_testcase(stdins)
+    judge_payload = {
+        "language_config": config,
+        "src": src,
+        "max_cpu_time": max_cpu_time,
+        "max_memory": mem_bytes,
+        "test_case_id": case_id,
+        "output": True
+    }
+    try:
+        if timeout is None:
+            resp = await client.post(url_judge, headers=headers, json=judge_payload)
+        else:
+            resp = await client.post(url_judge, headers=headers, json=judge_payload, timeout=timeout)
+        return resp.json()
+    finally:
+        _remove_temp_testcase(case_id)
+
+
+def _batch_timeout_seconds(req: RunCodeBatchRequest) -> int:
+    # Worst case every input runs up to its real-time limit (3x cpu time) one after another
+    return len(req.stdins) * req.max_cpu_time * 3 // 1000
+
+
+async def _run_on_server(
+        service_url: str,
+        headers: Dict[str, str],
+        config: Dict[str, Any],
+        req: RunCodeRequest,
+        mem_bytes: int) -> Dict[str, Any]:
+    client = get_judge_client(service_url)
+    url_run = f"{service_url.rstrip('/')}/run"
+    run_payload = {
+        "language_config": config,
+        "src": req.src,
+        "max_cpu_time": req.max_cpu_time,
+        "max_real_time": req.max_cpu_time * 3,
+        "max_memory": mem_bytes,
+        "stdin": req.stdin,
+        "output": True
+    }
+
+    resp = await client.post(url_run, headers=headers, json=run_payload)
+    result = resp.json()
+    if isinstance(result, dict) and result.get("err") == "InvalidRequest":
+        return await _judge_temp_testcase(service_url, headers, config, req.src, [req.stdin],
+                                          req.max_cpu_time, mem_bytes)
+    return result
+
+
+async def _run_batch_on_server(
+        service_url: str,
+        headers: Dict[str, str],
+        config: Dict[str, Any],
+        req: RunCodeBatchRequest,
+        mem_bytes: int) -> Dict[str, Any]:
+    timeout = httpx.Timeout(READ_TIMEOUT_SECONDS + _batch_timeout_seconds(req), connect=CONNECT_TIMEOUT_SECONDS)
+    result = await _judge_temp_testcase(service_url, headers, config, req.src, req.stdins,
+                                        req.max_cpu_time, mem_bytes, timeout=timeout)
+    if isinstance(result, dict) and not result.get("err") and isinstance(result.get("data"), list):
+        # One result per test case, returned in the order of the inputs
+        result["data"] = sorted(result["data"], key=lambda item: int(item.get("test_case", 0)))
+    return result
+
+
 async def run_code_service(
         session: AsyncSession,
-        req: RunCodeRequest) -> Dict[str, Any]:
+        req: RunCodeRequest,
+        user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    user_id is given for runs requested by a user, which are limited per user; cache hits and runs
+    shared with an identical request in flight are not counted against the limit.
+    """
+    async def _run():
+        return await _run_admitted(user_id, lambda: _run_on_any_server(session, req, _run_on_server))
+
+    # Repeated runs of the same code and input are answered from the cache
+    return await run_code_cache.get_or_run(req, _run)
+
+
+async def get_run_code_cache_stats(user_profile: UserProfile) -> Dict[str, Any]:
+    if user_profile.admin_type not in ["Admin", "Super Admin"]:
+        exceptions.forbidden()
+    return await run_code_cache.stats()
+
+
+async def get_run_code_admission_stats(user_profile: UserProfile) -> Dict[str, Any]:
+    if user_profile.admin_type not in ["Admin", "Super Admin"]:
+        exceptions.forbidden()
+    return await run_code_admission.stats()
+
+
+async def run_code_batch_service(
+        session: AsyncSession,
+        req: RunCodeBatchRequest,
+        user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Compile once and run the program against every stdin in one judge call.
+    Returns the judge response; on success data holds one result per input, in order.
+    """
+    return await _run_admitted(user_id, lambda: _run_on_any_server(
+        session, req, _run_batch_on_server, lease_ttl=DEFAULT_LEASE_TTL_SECONDS + _batch_timeout_seconds(req)))
+
+
+async def _run_admitted(user_id: Optional[int], run: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Rejections over the user's limits answer 429, runs shed while waiting for a judge slot answer 503."""
+    admission = run_code_admission.admit(user_id) if user_id is not None else nullcontext()
+    try:
+        async with admission:
+            return await run()
+    except AdmissionRejected as e:
+        if e.reason.startswith("rejected"):
+            exceptions.too_many_runs(e.retry_after)
+        exceptions.judge_busy(e.retry_after)
+
+
+async def _run_on_any_server(session: AsyncSession, req, run, lease_ttl: int = DEFAULT_LEASE_TTL_SECONDS):
     config, hashed_token = await _get_judge_config(session, req.language)
     headers = {"X-Judge-Server-Token": hashed_token}
     mem_bytes = max(1, req.max_memory_mb) * 1024 * 1024
-    async with ChooseJudgeServerAsync() as server:
-        if not server or not server.service_url:
-            return {"err": True, "data": "No available judge server"}
-        url_run = f"{server.service_url.rstrip('/')}/run"
-        url_judge = f"{server.service_url.rstrip('/')}/judge"
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            run_payload = {
-                "language_config": config,
-                "src": req.src,
-                "max_cpu_time": req.max_cpu_time,
-                "max_real_time": req.max_cpu_time * 3,
-                "max_memory": mem_bytes,
-                "stdin": req.stdin,
-                "output": True
-            }
-
-            try:
-                resp = await client.post(url_run, headers=headers, json=run_payload)
-                result = resp.json()
-                if isinstance(result, dict) and result.get("err") == "InvalidRequest":
-                    case_id = _prepare_temp_testcase(req.stdin)
-                    judge_payload = {
-                        "language_config": config,
-                        "src": req.src,
-                        "max_cpu_time": req.max_cpu_time,
-                        "max_memory": mem_bytes,
-                        "test_case_id": case_id,
-                        "output": True
-                    }
-                    resp = await client.post(url_judge, headers=headers, json=judge_payload)
-                    return resp.json()
-                return result
-
-            except Exception as e:
-                logger.error(f"Judge connection failed: {e}")
-                exceptions.internal_server_error()
-                return {"err": True, "data": str(e)}
+    # Servers that could not be connected to are skipped and the run moves on to the next one.
+    tried: list[int] = []
+    # Runs that find every slot taken wait in a bounded queue until a slot frees up or the deadline passes
+    ticket = None
+    try:
+        while True:
+            async with ChooseJudgeServerAsync(ttl=lease_ttl, exclude=tried) as server:
+                if not server or not server.service_url:
+                    if tried:
+                        logger.error(f"Judge connection failed on servers {tried}")
+                        exceptions.internal_server_error()
+                    if ticket is None:
+                        ticket = await run_code_admission.enter_queue()
+                    await run_code_admission.wait(ticket)
+                    continue
+                if ticket is not None:
+                    await run_code_admission.leave_queue(ticket)
+                    ticket = None
+                result = await _run_on_server_once(server, run, headers, config, req, mem_bytes, tried)
+                if result is not None:
+                    return result
+    finally:
+        if ticket is not None:
+            await run_code_admission.leave_queue(ticket)
+
+
+async def _run_on_server_once(server, run, headers, config, req, mem_bytes, tried: list[int]):
+    """
+    Returns None when the server could not be connected to and the next one should be tried.
+    Once the request was sent the run may have executed, so a read timeout is returned to the caller
+    instead of rerunning a slow program on every server, and does not count against the circuit.
+    """
+    try:
+        result = await run(server.service_url, headers, config, req, mem_bytes)
+    except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+        logger.warning(f"Judge server {server.id} failed, trying next server: {e!r}")
+        if await report_judge_failure(server.id):
+            logger.error(f"Judge server {server.id} is unreachable, circuit opened")
+        tried.append(server.id)
+        return None
+    except httpx.TimeoutException as e:
+        logger.warning(f"Judge server {server.id} timed out: {e!r}")
+        exceptions.judge_timeout()
+    except Exception as e:
+        logger.error(f"Judge connection failed: {e}")
+        exceptions.internal_server_error()
+        return {"err": True, "data": str(e)}
+    await report_judge_success(server.id)
+    return result
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from typing import Dict
+from urllib.parse import urlsplit
+
+import httpx
+
+CONNECT_TIMEOUT_SECONDS = 3.0
+READ_TIMEOUT_SECONDS = 30.0
+MAX_CONNECTIONS_PER_SERVER = 32
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_judge_client(service_url: str) -> httpx.AsyncClient:
+    """Return the keep-alive client for a judge server, creating it on first use."""
+    parts = urlsplit(service_url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    client = _clients.get(origin)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS_PER_SERVER,
+                max_keepalive_connections=MAX_CONNECTIONS_PER_SERVER,
+            ),
+        )
+        _clients[origin] = client
+    return client
+
+
+async def close_judge_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -3,7 +3,7 @@ from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_database
-from app.export_result.service import generate_contest_result_workbook
+from app.export_result.service import RESULT_WRITERS, generate_contest_result, iter_file
 from app.api.deps import get_userdata
 from app.user.schemas import UserProfile
 from app.core.auth.guards import require_role
@@ -17,14 +17,13 @@ async def export_contest_result(
         contest_id: int,
         user_profile: UserProfile = Depends(get_userdata),
         db: AsyncSession = Depends(get_database),
-        format: str = Query("xlsx", pattern="^(xlsx)$", description="Currently only xlsx is supported"),
+        format: str = Query("xlsx", pattern="^(xlsx|csv)$", description="xlsx or csv"),
 ):
-    # Only xlsx supported for now
-    workbook_stream = await generate_contest_result_workbook(contest_id, db)
-    filename = f"contest_{contest_id}_result.xlsx"
+    result_file = await generate_contest_result(contest_id, db, format)
+    filename = f"contest_{contest_id}_result.{format}"
     headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
     return StreamingResponse(
-        workbook_stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        iter_file(result_file),
+        media_type=RESULT_WRITERS[format].media_type,
         headers=headers,
     )
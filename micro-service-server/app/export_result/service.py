@@ -1,199 +1,186 @@
-from datetime import datetime
-from io import BytesIO
-from typing import List, Tuple
-from zoneinfo import ZoneInfo
+import asyncio
+import csv
+import io
+import tempfile
+from typing import AsyncIterator, BinaryIO, Iterator, List
 
-from fastapi import status
 from app.contest import exceptions as contest_exceptions
 from app.export_result import exceptions
 from openpyxl import Workbook
-from openpyxl.styles import Alignment, Font, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, Border, NamedStyle, Side
 from openpyxl.utils import get_column_letter
 from sqlalchemy.ext.asyncio import AsyncSession
 
-import app.contest.repository as contest_repo
-import app.submission.repository as submission_repo
 import app.rank.repository as rank_repo
 from app.contest.models import Contest
 from app.export_result import repository as export_repo
-from app.user.models import UserData, User
-
-
-def _format_time(dt: datetime | None) -> str:
-    if dt is None:
-        return "-"
-    try:
-        local_dt = dt.astimezone(ZoneInfo("Asia/Seoul"))
-    except Exception:
-        local_dt = dt
-    return local_dt.strftime("%Y-%m-%d %H:%M:%S")
-
-
-async def build_rank_rows(contest: Contest, db: AsyncSession) -> Tuple[list, dict, dict]:
-    problems = await export_repo.fetch_contest_problems(db, contest.id)
-    if not problems:
-        exceptions.contest_problems_not_found()
-
-    problem_score_map = export_repo.build_problem_score_map(problems)
-    submissions = await export_repo.fetch_contest_submissions(db, contest.id)
-    best_scores = export_repo.aggregate_best_scores(submissions, problem_score_map)
-
-    # Score map for total_score from submission repo
-    scores_list = await submission_repo.fetch_contest_user_scores(db, contest.id)
-    total_score_map = {item["user_id"]: item["total_score"] for item in scores_list}
-
-    # Raw ranks (includes total_time)
-    if contest.rule_type == "ACM":
-        raw_ranks = await rank_repo.get_acm_contest_rank(contest.id, db)
-    else:
-        raw_ranks = await rank_repo.get_oi_contest_rank(contest.id, db)
-
-    rows = []
-    for rank_row, user, userdata in raw_ranks:
-        total_score = total_score_map.get(user.id, 0)
-        total_time = getattr(rank_row, "total_time", None)
-        # Solve count recomputed from best_scores against full_score
-        solved = 0
-        user_best = best_scores.get(user.id, {})
-        tie_time_candidates = []
-        for pid, meta in user_best.items():
-            full_score = problem_score_map.get(pid, {}).get("full_score", 0)
-            if full_score and meta["score"] >= full_score:
-                solved += 1
-            # Only consider problems that contributed (>0 score) for tie-breaker
-            if meta["score"] > 0 and meta.get("best_time"):
-                tie_time_candidates.append(meta["best_time"])
-
-        # Tie-breaker: earliest time when any scored problem was achieved (use latest among scored problems to represent completion)
-        tie_time = None
-        if tie_time_candidates:
-            try:
-                tie_time = max(tie_time_candidates)
-            except Exception:
-                tie_time = None
-
-        rows.append(
-            {
-                "user_id": user.id,
-                "username": user.username,
-                "real_name": userdata.name if isinstance(userdata, UserData) else None,
-                "student_id": userdata.student_id if isinstance(userdata, UserData) else None,
-                "total_score": total_score,
-                "total_time": total_time,
-                "accepted_number": solved,
-                "tie_time": tie_time,
-            }
-        )
-
-    # Sort: total_score desc, then earliest tie_time (based only on scored problems) asc, fallback to total_time asc, then user_id
-    rows.sort(
-        key=lambda x: (
-            -x["total_score"],
-            (x["tie_time"].timestamp() if isinstance(x.get("tie_time"), datetime) else float("inf")),
-            float("inf") if x["total_time"] is None else float(x["total_time"]),
-            x["user_id"],
-        )
-    )
-
-    # Return rows, problems, best_scores for further formatting
-    return rows, {p.id: p for p in problems}, best_scores
-
-
-def _add_headers(ws, problems: List, width_map: dict):
-    base_headers = ["순위", "이름", "학번", "해결", "점수"]
-    # Merge base headers over two rows
-    for idx, title in enumerate(base_headers, start=1):
-        cell = ws.cell(row=1, column=idx, value=title)
-        ws.merge_cells(start_row=1, start_column=idx, end_row=2, end_column=idx)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.font = Font(bold=True)
-        width_map[idx] = max(width_map.get(idx, 0), len(str(title)))
-
-    col = len(base_headers) + 1
+from app.problem.models import Problem
+
+# best_time is formatted by Postgres so rows can be written as they come off the cursor
+BEST_TIME_SQL = "to_char(b.best_time AT TIME ZONE 'Asia/Seoul', 'YYYY-MM-DD HH24:MI:SS')"
+BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+
+BASE_HEADERS = ["순위", "이름", "학번", "해결", "점수"]
+# Write-only sheets need column widths before the first row, so data columns get fixed widths
+BASE_WIDTHS = [6, 20, 14, 8, 8]
+RESULT_HEADER = "테스트 결과"
+TIME_HEADER = "해당 점수를 받은 최초 시각"
+TIME_WIDTH = len("YYYY-MM-DD HH:MM:SS")
+
+
+def _problem_label(problem: Problem) -> str:
+    return str(problem._id or problem.id)
+
+
+def _row_values(rank: int, entry: dict, problems: List[Problem]) -> list:
+    values = [
+        rank,
+        entry.get("real_name") or entry.get("username"),
+        entry.get("student_id") or "-",
+        f"{entry.get('accepted_number', 0)}/{len(problems)}",
+        entry.get("total_score", 0),
+    ]
+    submission_info = entry.get("submission_info") or {}
     for p in problems:
-        # Merge two columns for problem label
-        ws.merge_cells(start_row=1, start_column=col, end_row=1, end_column=col + 1)
-        title_cell = ws.cell(row=1, column=col, value=str(p._id or p.id))
-        title_cell.alignment = Alignment(horizontal="center", vertical="center")
-        title_cell.font = Font(bold=True)
-        width_map[col] = max(width_map.get(col, 0), len(str(p._id or p.id)))
-
-        ws.cell(row=2, column=col, value="테스트 결과").alignment = Alignment(horizontal="center")
-        ws.cell(row=2, column=col + 1, value="해당 점수를 받은 최초 시각").alignment = Alignment(horizontal="center")
-        width_map[col] = max(width_map.get(col, 0), len("테스트 결과"))
-        width_map[col + 1] = max(width_map.get(col + 1, 0), len("해당 점수를 받은 최초 시각"))
-        col += 2
-
-
-def _write_rows(ws, rows, problems_ordered: List, best_scores_map, problem_score_map, width_map: dict):
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
-
-    for idx, entry in enumerate(rows, start=3):
-        rank = idx - 2
-        solved = entry.get("accepted_number", 0)
-        solved_str = f"{solved}/{len(problems_ordered)}"
-        base_values = [
-            rank,
-            entry.get("real_name") or entry.get("username"),
-            entry.get("student_id") or "-",
-            solved_str,
-            entry.get("total_score", 0),
-        ]
-        col = 1
-        for val in base_values:
-            cell = ws.cell(row=idx, column=col, value=val)
-            cell.alignment = Alignment(horizontal="center")
-            cell.border = thin_border
-            width_map[col] = max(width_map.get(col, 0), len(str(val)))
-            col += 1
-
-        user_best = best_scores_map.get(entry["user_id"], {})
-        for p in problems_ordered:
-            best = user_best.get(p.id)
-            if best:
-                test_result = f"{best['passed']}/{best['total']}" if best["total"] else "-"
-                time_str = _format_time(best.get("best_time"))
-            else:
-                test_result = "-"
-                time_str = "-"
-            for val in (test_result, time_str):
-                cell = ws.cell(row=idx, column=col, value=val)
-                cell.alignment = Alignment(horizontal="center")
-                cell.border = thin_border
-                width_map[col] = max(width_map.get(col, 0), len(str(val)))
-                col += 1
-
-
-async def generate_contest_result_workbook(contest_id: int, db: AsyncSession) -> BytesIO:
+        best = submission_info.get(str(p.id))
+        if best:
+            values.append(f"{best['passed']}/{best['total']}" if best["total"] else "-")
+            values.append(best.get("best_time") or "-")
+        else:
+            values.extend(("-", "-"))
+    return values
+
+
+async def iter_result_rows(contest: Contest, problems: List[Problem], db: AsyncSession) -> AsyncIterator[List[list]]:
+    # Rows are aggregated from contest_best_score and already sorted by
+    # total_score desc, tie_time asc, total_time asc, user_id
+    rank = 0
+    async for batch in rank_repo.stream_contest_user_rank(db, contest.id, contest.rule_type,
+                                                          best_time=BEST_TIME_SQL, batch_size=BATCH_SIZE):
+        rows = []
+        for entry in batch:
+            rank += 1
+            rows.append(_row_values(rank, entry, problems))
+        yield rows
+
+
+class XlsxResultWriter:
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    extension = "xlsx"
+
+    def __init__(self, file: BinaryIO, problems: List[Problem]):
+        self._file = file
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet("contest_result")
+        border_side = Side(style="thin")
+        self._wb.add_named_style(NamedStyle(
+            name="result_cell",
+            alignment=Alignment(horizontal="center"),
+            border=Border(left=border_side, right=border_side, top=border_side, bottom=border_side),
+        ))
+        self._wb.add_named_style(NamedStyle(
+            name="result_header",
+            font=Font(bold=True),
+            alignment=Alignment(horizontal="center", vertical="center"),
+        ))
+        self._write_headers(problems)
+
+    def _cell(self, value, style: str) -> WriteOnlyCell:
+        cell = WriteOnlyCell(self._ws, value=value)
+        cell.style = style
+        return cell
+
+    def _write_headers(self, problems: List[Problem]):
+        ws = self._ws
+        first, second = [], []
+        for col, (title, width) in enumerate(zip(BASE_HEADERS, BASE_WIDTHS), start=1):
+            # Base headers span both header rows
+            ws.merged_cells.add(f"{get_column_letter(col)}1:{get_column_letter(col)}2")
+            ws.column_dimensions[get_column_letter(col)].width = max(width, len(title)) + 2
+            first.append(self._cell(title, "result_header"))
+            second.append(None)
+
+        col = len(BASE_HEADERS) + 1
+        for p in problems:
+            label = _problem_label(p)
+            # The problem label spans its result and time columns
+            ws.merged_cells.add(f"{get_column_letter(col)}1:{get_column_letter(col + 1)}1")
+            ws.column_dimensions[get_column_letter(col)].width = max(len(label), len(RESULT_HEADER)) + 2
+            ws.column_dimensions[get_column_letter(col + 1)].width = max(TIME_WIDTH, len(TIME_HEADER)) + 2
+            first.extend((self._cell(label, "result_header"), None))
+            second.extend((self._cell(RESULT_HEADER, "result_header"), self._cell(TIME_HEADER, "result_header")))
+            col += 2
+        ws.append(first)
+        ws.append(second)
+
+    def write_rows(self, rows: List[list]):
+        for values in rows:
+            self._ws.append([self._cell(value, "result_cell") for value in values])
+
+    def close(self):
+        self._wb.save(self._file)
+
+
+class CsvResultWriter:
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self, file: BinaryIO, problems: List[Problem]):
+        # utf-8-sig so Excel detects the encoding of the Korean headers
+        self._text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="", write_through=True)
+        self._writer = csv.writer(self._text)
+        headers = list(BASE_HEADERS)
+        for p in problems:
+            label = _problem_label(p)
+            headers.extend((f"{label} {RESULT_HEADER}", f"{label} {TIME_HEADER}"))
+        self._writer.writerow(headers)
+
+    def write_rows(self, rows: List[list]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._text.flush()
+        # Leave the underlying file open for the response
+        self._text.detach()
+
+
+RESULT_WRITERS = {
+    XlsxResultWriter.extension: XlsxResultWriter,
+    CsvResultWriter.extension: CsvResultWriter,
+}
+
+
+async def generate_contest_result(contest_id: int, db: AsyncSession, export_format: str = "xlsx") -> BinaryIO:
+    """
+    Write the contest result into a temporary file and return it rewound.
+    Rows come from a server-side cursor in batches and are written in a worker thread,
+    so memory use does not grow with the number of participants and the event loop is not blocked.
+    """
     contest = await export_repo.fetch_contest(db, contest_id)
     if not contest:
         contest_exceptions.contest_not_found()
+    problems = await export_repo.fetch_contest_problems(db, contest.id)
+    if not problems:
+        exceptions.contest_problems_not_found()
 
-    rows, problem_map, best_scores = await build_rank_rows(contest, db)
-    problems_ordered = list(problem_map.values())
-    problem_score_map = export_repo.build_problem_score_map(problems_ordered)
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "contest_result"
-
-    width_map: dict[int, int] = {}
-    _add_headers(ws, problems_ordered, width_map)
-    _write_rows(ws, rows, problems_ordered, best_scores, problem_score_map, width_map)
-
-    # Adjust column widths a bit
-    for col_idx, max_len in width_map.items():
-        # Add small padding so text is not cramped
-        width = max_len + 2
-        col_letter = get_column_letter(col_idx)
-        ws.column_dimensions[col_letter].width = width
-
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
-    return bio
+    file = tempfile.TemporaryFile()
+    try:
+        writer = await asyncio.to_thread(RESULT_WRITERS[export_format], file, problems)
+        async for rows in iter_result_rows(contest, problems, db):
+            await asyncio.to_thread(writer.write_rows, rows)
+        await asyncio.to_thread(writer.close)
+    except BaseException:
+        file.close()
+        raise
+    file.seek(0)
+    return file
+
+
+def iter_file(file: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    try:
+        while chunk := file.read(chunk_size):
+            yield chunk
+    finally:
+        file.close()
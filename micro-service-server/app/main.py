@@ -9,7 +9,10 @@ from app.code_autosave.listener import code_save_listener
 from app.core.cors import setup_cors
 from app.core.logger import logger
 from app.core.logger import setup_logging
+from app.execution.config import judge_config_listener
+from app.execution.transport import close_judge_clients
 from app.problem.cron import daily_problem_cron_bot
+from app.rank.cron import organization_rank_cron_bot
 from app.todo.cron import todo_rollover_cron_bot
 
 
@@ -20,6 +23,8 @@ async def lifespan(app: FastAPI):
     listener_task = asyncio.create_task(code_save_listener())
     daily_problem_task = asyncio.create_task(daily_problem_cron_bot())
     todo_rollover_task = asyncio.create_task(todo_rollover_cron_bot())
+    organization_rank_task = asyncio.create_task(organization_rank_cron_bot())
+    judge_config_task = asyncio.create_task(judge_config_listener())
     configure_mappers()
     logger.info("DB mappers configured.")
     try:
@@ -28,12 +33,19 @@ async def lifespan(app: FastAPI):
         listener_task.cancel()
         daily_problem_task.cancel()
         todo_rollover_task.cancel()
+        organization_rank_task.cancel()
+        judge_config_task.cancel()
         with suppress(asyncio.CancelledError):
             await listener_task
         with suppress(asyncio.CancelledError):
             await daily_problem_task
         with suppress(asyncio.CancelledError):
             await todo_rollover_task
+        with suppress(asyncio.CancelledError):
+            await organization_rank_task
+        with suppress(asyncio.CancelledError):
+            await judge_config_task
+        await close_judge_clients()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -1,7 +1,9 @@
+from datetime import datetime
 from typing import List
 import enum
 
-from sqlalchemy import String, ForeignKey, UniqueConstraint, Index, Enum as SAEnum, Boolean
+from sqlalchemy import (String, ForeignKey, UniqueConstraint, Index, Enum as SAEnum, Boolean, BigInteger, DateTime,
+                        Float, Integer, func)
 from sqlalchemy.orm import Mapped, mapped_column, relationship, backref
 
 from app.core.database import Base
@@ -69,3 +71,31 @@ class OrganizationMember(BaseEntity, Base):
         nullable=False,
         default=OrganizationRole.MEMBER,
     )
+
+
+class OrganizationRank(Base):
+    """
+    Precomputed organization leaderboard, one row per organization.
+    Maintained by app.rank.repository.refresh_organization_rank: on a schedule and whenever membership changes.
+    rank is dense (1..N), so pages are read by rank range without aggregating members.
+    """
+    __tablename__ = "micro_organization_rank"
+    __table_args__ = (
+        Index("ix_org_rank_rank", "rank"),
+        {"schema": "public"},
+    )
+
+    organization_id: Mapped[int] = mapped_column(
+        ForeignKey("public.micro_organization.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    rank: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_members: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    total_accepted: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    total_submission: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    accuracy: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    updated_time: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
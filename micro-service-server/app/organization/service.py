@@ -11,6 +11,7 @@ import app.user.exceptions as user_exceptions
 import app.organization.exceptions as organization_exception
 import app.pending.service as pending_service
 import app.organization.repository as organization_repo
+import app.rank.repository as rank_repo
 import app.user.repository as user_repo
 
 
@@ -34,6 +35,7 @@ async def create_organization(
         role=OrganizationRole.ORG_SUPER_ADMIN
     )
     await organization_repo.save_organization_member(org_member, db)
+    await rank_repo.refresh_organization_rank(db, [organization.id])
     return OrganizationResponse.from_orm(organization)
 
 
@@ -81,6 +83,7 @@ async def delete_organization(
     await delete_contests_by_organization_id(organization_id, db)
     await organization_repo.remove_organization_all_members(organization_id, db)
     await organization_repo.delete_by_id(organization_id, db)
+    await rank_repo.refresh_organization_rank(db, [organization_id])
     return
 
 
@@ -116,6 +119,7 @@ async def join_organization(
         organization_exception.user_already_exist()
     new_organization_member = OrganizationMember(organization=organization, user=user_profile)
     await organization_repo.save_organization_member(new_organization_member, db)
+    await rank_repo.refresh_organization_rank(db, [organization_id])
     return OrganizationMemberResponse.from_orm(new_organization_member)
 
 
@@ -173,6 +177,7 @@ async def delete_organization_user(
         organization_exception.user_not_found()
 
     await organization_repo.delete_member_by_member_id(member_data.id, db)
+    await rank_repo.refresh_organization_rank(db, [organization_id])
     return
 
 
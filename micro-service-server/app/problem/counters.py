@@ -0,0 +1,26 @@
+from typing import Iterable
+
+from app.core.redis import redis_client
+
+# Key layout shared with OnlineJudge/problem/counters.py. The Django dispatcher
+# buffers problem counters in one hash per problem and flushes them to Postgres
+# in batches, so the columns can lag behind by a few seconds.
+PROBLEM_COUNTER_KEY = "problem_counter"
+SUBMISSION_FIELD = "submission_number"
+ACCEPTED_FIELD = "accepted_number"
+
+
+async def pending_counts(problem_ids: Iterable[int]) -> dict[int, tuple[int, int]]:
+    """Return the unflushed (submission_number, accepted_number) deltas per problem."""
+    problem_ids = list(problem_ids)
+    if not problem_ids:
+        return {}
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for problem_id in problem_ids:
+            pipe.hmget(f"{PROBLEM_COUNTER_KEY}:{problem_id}", SUBMISSION_FIELD, ACCEPTED_FIELD)
+        rows = await pipe.execute()
+    return {
+        problem_id: (int(submission or 0), int(accepted or 0))
+        for problem_id, (submission, accepted) in zip(problem_ids, rows)
+        if submission or accepted
+    }
@@ -79,6 +79,21 @@ class Problem(Base):
     daily_challenges: Mapped[List["DailyProblem"]] = relationship("DailyProblem", back_populates="problem")
 
 
+class UserProblemStatus(Base):
+    """
+    Per-user status on each problem, maintained by the judge (Django side).
+    """
+    __tablename__ = "user_problem_status"
+    __table_args__ = {"schema": "public"}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("public.user.id"), nullable=False)
+    problem_id: Mapped[int] = mapped_column(Integer, ForeignKey("public.problem.id"), nullable=False)
+    contest_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("public.contest.id"), nullable=True)
+    status: Mapped[int] = mapped_column(Integer, nullable=False)
+    score: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
 class DailyProblem(Base):
     __tablename__ = "micro_daily_problem"
     __table_args__ = (
@@ -1,3 +1,4 @@
+import asyncio
 import io
 import json
 import os
@@ -17,7 +18,7 @@ from app.contest.models import OrganizationContest, ContestLanguage
 from app.core.logger import logger
 from app.core.settings import settings
 from app.core.redis import get_polling_task
-from app.execution.schemas import RunCodeRequest
+from app.execution.schemas import RunCodeBatchRequest
 from app.pending.models import PendingTargetType
 from app.problem.models import Problem, ProblemTag
 from app.problem.schemas import *
@@ -27,6 +28,7 @@ from app.problem.schemas import ProblemDetailResponse
 
 import app.execution.service as execution_service
 import app.pending.service as pending_service
+import app.problem.counters as problem_counters
 import app.problem.repository as problem_repository
 import app.contest.repository as contest_repository
 import app.problem.exceptions as problem_exceptions
@@ -610,36 +612,17 @@ async def import_problem_from_file(
                 file_list = zip_ref.namelist()
                 md_paths = utils.filter_problem_md_paths(file_list)
                 logger.info(f"Found {len(md_paths)} problems in zip")
+                # Solutions are validated concurrently first, the slow part of an import;
+                # building the problems afterwards only reads the zip
+                await _validate_import_solutions(zip_ref, file_list, md_paths, polling_key, status)
                 for i, path in enumerate(md_paths):
                     try:
                         problem = await _process_single_problem(zip_ref, file_list, path, user_profile.user_id, db)
                     except Exception as e:
-                        title_hint = ""
-                        try:
-                            md_content = zip_ref.read(path).decode("utf-8")
-                            meta_data, _ = utils.parse_problem_md(md_content)
-                            parsed_title = meta_data.get("title")
-                            if parsed_title:
-                                title_hint = str(parsed_title)
-                        except Exception:
-                            pass
-
-                        context_prefix = f"[Problem {i + 1}/{len(md_paths)}]"
-                        if title_hint:
-                            context_prefix += f" {title_hint}"
-                        context_prefix += f" ({path})"
-
-                        if hasattr(e, "detail") and isinstance(getattr(e, "detail", None), dict):
-                            original_message = e.detail.get("message", str(e))
-                            e.detail["message"] = f"{context_prefix}\n{original_message}"
+                        _add_problem_context(e, zip_ref, i, len(md_paths), path)
                         raise
                     problems.append(problem)
                     testcase_list.append(problem.test_case_id)
-                    status.status = "processing"
-                    status.processed_problem = i + 1
-                    status.left_problem = status.all_problem - status.processed_problem
-                    await _set_redis_polling_state(polling_key, "processing", i + 1, status.left_problem,
-                                                   status.all_problem)
                 status.status = "done"
                 status.left_problem = 0
                 logger.info(f"Polling finished: {status}")
@@ -688,6 +671,98 @@ async def process_test_case_upload(file: UploadFile, spj: bool = False):
     }
 
 
+def _add_problem_context(e: Exception, zip_ref: zipfile.ZipFile, index: int, total: int, path: str):
+    title_hint = ""
+    try:
+        md_content = zip_ref.read(path).decode("utf-8")
+        meta_data, _ = utils.parse_problem_md(md_content)
+        parsed_title = meta_data.get("title")
+        if parsed_title:
+            title_hint = str(parsed_title)
+    except Exception:
+        pass
+
+    context_prefix = f"[Problem {index + 1}/{total}]"
+    if title_hint:
+        context_prefix += f" {title_hint}"
+    context_prefix += f" ({path})"
+
+    if hasattr(e, "detail") and isinstance(getattr(e, "detail", None), dict):
+        original_message = e.detail.get("message", str(e))
+        e.detail["message"] = f"{context_prefix}\n{original_message}"
+
+
+async def _validate_import_solutions(
+        zip_ref: zipfile.ZipFile,
+        file_list: List[str],
+        md_paths: List[str],
+        polling_key: str,
+        status: ProblemImportPollingStatus):
+    """
+    Validate the solutions of every problem in the zip, at most
+    PROBLEM_IMPORT_VALIDATION_CONCURRENCY at a time. Each run leases the least loaded judge server,
+    so the problems spread over all free servers.
+    When several problems fail, the first one in zip order is reported, as a sequential import would.
+    """
+    semaphore = asyncio.Semaphore(max(1, settings.PROBLEM_IMPORT_VALIDATION_CONCURRENCY))
+
+    async def _validate(path: str):
+        async with semaphore:
+            # An AsyncSession cannot be shared between concurrent tasks
+            async with get_background_database() as db:
+                await _validate_problem_solution(zip_ref, file_list, path, db)
+
+    tasks = [asyncio.create_task(_validate(path)) for path in md_paths]
+    index_of = {task: i for i, task in enumerate(tasks)}
+    pending = set(tasks)
+    failed = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled() or task.exception() is None:
+                    continue
+                if failed is None or index_of[task] < index_of[failed]:
+                    failed = task
+            if failed is not None:
+                # Problems after the failing one no longer matter; earlier ones may still fail
+                for task in pending:
+                    if index_of[task] > index_of[failed]:
+                        task.cancel()
+            else:
+                status.processed_problem = len(tasks) - len(pending)
+                status.left_problem = status.all_problem - status.processed_problem
+                await _set_redis_polling_state(polling_key, "processing", status.processed_problem,
+                                               status.left_problem, status.all_problem)
+    finally:
+        for task in pending:
+            task.cancel()
+    if failed is not None:
+        e = failed.exception()
+        _add_problem_context(e, zip_ref, index_of[failed], len(md_paths), md_paths[index_of[failed]])
+        raise e
+
+
+async def _validate_problem_solution(
+        zip_ref: zipfile.ZipFile,
+        file_list: List[str],
+        md_path: str,
+        db: AsyncSession):
+    problem_dir = os.path.dirname(md_path) + "/"
+    test_case_dir = f"{problem_dir}test/"
+    problem_md = zip_ref.read(md_path).decode("utf-8")
+    meta_data, sections = utils.parse_problem_md(problem_md)
+    if bool(meta_data.get("skip_solution_validation", False)):
+        return
+    solution_file = utils.find_solution_file(file_list, problem_dir)
+    solution_code = zip_ref.read(solution_file).decode("utf-8")
+    language = utils.detect_language_from_extension(solution_file)
+    test_cases_to_validate = (utils
+                              .extract_test_cases_to_memory(zip_ref, file_list, test_case_dir,
+                                                            sections.get("samples", [])))
+    await _validate_solution_code(solution_code, language, test_cases_to_validate, db)
+
+
 async def _process_single_problem(
         zip_ref: zipfile.ZipFile,
         file_list: List[str],
@@ -698,15 +773,6 @@ async def _process_single_problem(
     test_case_dir = f"{problem_dir}test/"
     problem_md = zip_ref.read(md_path).decode("utf-8")
     meta_data, sections = utils.parse_problem_md(problem_md)
-    skip_solution_validation = bool(meta_data.get("skip_solution_validation", False))
-    if not skip_solution_validation:
-        solution_file = utils.find_solution_file(file_list, problem_dir)
-        solution_code = zip_ref.read(solution_file).decode("utf-8")
-        language = utils.detect_language_from_extension(solution_file)
-        test_cases_to_validate = (utils
-                                  .extract_test_cases_to_memory(zip_ref, file_list, test_case_dir,
-                                                                sections.get("samples", [])))
-        await _validate_solution_code(solution_code, language, test_cases_to_validate, db)
     test_case_id, info_list = utils.save_test_cases_to_disk(zip_ref, test_case_dir, meta_data.get("spj", False))
     create_data = utils.parse_create_problem_data(meta_data, sections)
     display_id = str(uuid.uuid4())
@@ -722,23 +788,25 @@ async def _validate_solution_code(
         solution_code_language: str,
         test_case: List,
         db: AsyncSession) -> bool:
-    request = RunCodeRequest(
+    if not test_case:
+        return True
+    # Compiled once and run against every case in a single judge call
+    request = RunCodeBatchRequest(
         language=solution_code_language,
         src=solution_code,
-        stdin="",
+        stdins=[cases.get("input", "") for cases in test_case],
         max_cpu_time=5000,
         max_memory_mb=512
     )
-    for cases in test_case:
-        request.stdin = cases.get("input", "")
+    data = await execution_service.run_code_batch_service(db, request)
+    if data.get("err"):
+        problem_exceptions.judge_server_error()
+    exec_data = data.get("data")
+    if not isinstance(exec_data, list) or len(exec_data) != len(test_case):
+        problem_exceptions.judge_server_error()
+    for cases, result in zip(test_case, exec_data):
         expected_output = cases.get("output", "")
-        data = await execution_service.run_code_service(db, request)
-        if data.get("err"):
-            problem_exceptions.judge_server_error()
-        exec_data = data.get("data")
-        user_output = None
-        if isinstance(exec_data, list) and len(exec_data) > 0:
-            user_output = exec_data[0].get("output")
+        user_output = result.get("output") if isinstance(result, dict) else None
         if user_output is None:
             problem_exceptions.judge_server_error()
         if user_output.strip() != expected_output.strip():
@@ -757,6 +825,7 @@ async def get_problem_detail(problem_id: int, db: AsyncSession) -> ProblemDetail
                                                                          "output": "output.txt"}
     template = problem.template if isinstance(problem.template, dict) else {}
     samples = problem.samples or []
+    pending_submission, pending_accepted = (await problem_counters.pending_counts([problem.id])).get(problem.id, (0, 0))
 
     return ProblemDetailResponse(
         id=problem.id,
@@ -772,8 +841,8 @@ async def get_problem_detail(problem_id: int, db: AsyncSession) -> ProblemDetail
         visible=problem.visible,
         difficulty=problem.difficulty,
         total_score=problem.total_score or 0,
-        submission_number=problem.submission_number or 0,
-        accepted_number=problem.accepted_number or 0,
+        submission_number=(problem.submission_number or 0) + pending_submission,
+        accepted_number=(problem.accepted_number or 0) + pending_accepted,
         test_case_score=problem.test_case_score or [],
         status=None,
         tags=tag_payload,
@@ -0,0 +1,28 @@
+import asyncio
+
+from app.api.deps import get_background_database
+from app.core.logger import logger
+import app.rank.repository as rank_repo
+
+# Member statistics (user_profile accepted/submission numbers) change with every judged submission,
+# the organization leaderboard picks them up on this interval
+ORGANIZATION_RANK_REFRESH_SECONDS = 5 * 60
+
+
+async def _run_organization_rank_refresh(source: str) -> None:
+    try:
+        async with get_background_database() as db:
+            await rank_repo.refresh_organization_rank(db)
+        logger.info("[organization-rank] source=%s refreshed", source)
+    except Exception as exc:
+        logger.exception("[organization-rank] source=%s failed: %s", source, exc)
+
+
+async def organization_rank_cron_bot() -> None:
+    logger.info("[organization-rank] cron bot started interval=%ss", ORGANIZATION_RANK_REFRESH_SECONDS)
+
+    await _run_organization_rank_refresh(source="startup")
+
+    while True:
+        await asyncio.sleep(ORGANIZATION_RANK_REFRESH_SECONDS)
+        await _run_organization_rank_refresh(source="cron")
@@ -1,108 +1,226 @@
-from typing import Dict, List, Iterable
+from typing import AsyncIterator, Dict, List, Iterable
 
-from sqlalchemy import text, select, desc, func, distinct
+from sqlalchemy import text, func, distinct
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.problem.models import Problem
-from app.submission.models import Submission
 from app.contest.models import ACMContestRank, OIContestRank
-from app.user.models import User, UserData
 from app.organization.models import Organization, OrganizationMember
 from app.common.page import Page, paginate
 
 
+# Serializes refreshes so concurrent membership changes and the cron job don't re-rank at the same time
+ORGANIZATION_RANK_LOCK_ID = 7_236_001
+
+
+def _organization_rank_upsert_sql(where: str) -> str:
+    return f"""
+INSERT INTO public.micro_organization_rank
+    (organization_id, rank, total_members, total_accepted, total_submission, accuracy, updated_time)
+SELECT
+    o.id,
+    0,
+    COUNT(DISTINCT u.id),
+    COALESCE(SUM(up.accepted_number), 0),
+    COALESCE(SUM(up.submission_number), 0),
+    COALESCE(COALESCE(SUM(up.accepted_number), 0)::double precision
+             / NULLIF(COALESCE(SUM(up.submission_number), 0), 0)::double precision, 0),
+    now()
+FROM public.micro_organization AS o
+LEFT JOIN public.micro_organization_member AS om ON om.organization_id = o.id
+LEFT JOIN public."user" AS u ON u.id = om.user_id
+  AND u.admin_type = 'Regular User'
+  AND (u.is_disabled IS FALSE OR u.is_disabled IS NULL)
+LEFT JOIN public.user_profile AS up ON up.user_id = u.id AND up.submission_number > 0
+{where}
+GROUP BY o.id
+ON CONFLICT (organization_id) DO UPDATE SET
+    total_members = EXCLUDED.total_members,
+    total_accepted = EXCLUDED.total_accepted,
+    total_submission = EXCLUDED.total_submission,
+    accuracy = EXCLUDED.accuracy,
+    updated_time = EXCLUDED.updated_time
+"""
+
+
+# Re-ranking only reads the summary table; rows whose rank did not change are left alone
+_ORGANIZATION_RERANK_SQL = """
+UPDATE public.micro_organization_rank AS r
+SET rank = ranked.rank
+FROM (
+    SELECT organization_id,
+           ROW_NUMBER() OVER (ORDER BY total_accepted DESC, total_submission ASC, organization_id ASC) AS rank
+    FROM public.micro_organization_rank
+) AS ranked
+WHERE r.organization_id = ranked.organization_id AND r.rank <> ranked.rank
+"""
+
+
+async def refresh_organization_rank(db: AsyncSession, organization_ids: Iterable[int] | None = None) -> None:
+    """
+    Recompute the aggregates of the given organizations (all of them when None) into micro_organization_rank
+    and re-rank the table. Deleted organizations drop out through the foreign key cascade,
+    pass their id to close the gap in the ranks.
+    """
+    # Member rows added or deleted through the ORM in this session must be visible to the raw SQL
+    await db.flush()
+    await db.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": ORGANIZATION_RANK_LOCK_ID})
+    if organization_ids is None:
+        await db.execute(text(_organization_rank_upsert_sql("")))
+    else:
+        ids = list(organization_ids)
+        if ids:
+            await db.execute(text(_organization_rank_upsert_sql("WHERE o.id = ANY(:organization_ids)")),
+                             {"organization_ids": ids})
+    await db.execute(text(_ORGANIZATION_RERANK_SQL))
+
+
+def _organization_rank_item(r) -> dict:
+    return {
+        "rank": r.rank,
+        "organization_id": r.organization_id,
+        "name": r.name,
+        "description": r.description,
+        "total_members": int(r.total_members or 0),
+        "total_solved": int(r.total_accepted or 0),
+        "total_submission": int(r.total_submission or 0),
+        "accuracy": float(r.accuracy or 0.0),
+    }
+
+
+_ORGANIZATION_RANK_COLUMNS = """
+    r.rank, r.organization_id, o.name, o.description,
+    r.total_members, r.total_accepted, r.total_submission, r.accuracy
+FROM public.micro_organization_rank AS r
+JOIN public.micro_organization AS o ON o.id = r.organization_id
+"""
+
+
 async def get_organizations_order_by_rank_acm(
     db: AsyncSession,
     page: int,
     size: int,
 ) -> Page:
-    order = "total_accepted DESC, total_submission ASC, organization_id ASC"
-    limit = size
+    """
+    Reads one page of the precomputed leaderboard. Ranks are dense, so the page is an index range scan
+    and the total is the largest rank.
+    """
     offset = (page - 1) * size
+    sql = text(f"""
+        SELECT {_ORGANIZATION_RANK_COLUMNS}
+        WHERE r.rank > :offset AND r.rank <= :last
+        ORDER BY r.rank
+        """)
+    rows = (await db.execute(sql, {"offset": offset, "last": offset + size})).fetchall()
+    total = (await db.execute(text("SELECT COALESCE(MAX(rank), 0) FROM public.micro_organization_rank"))).scalar()
 
-    sql = text(
-        f"""
-        SELECT
-            o.id AS organization_id,
-            o.name AS organization_name,
-            o.description AS organization_description,
-            COUNT(DISTINCT u.id) AS total_members,
-            COALESCE(SUM(up.accepted_number), 0) AS total_accepted,
-            COALESCE(SUM(up.submission_number), 0) AS total_submission,
-            COALESCE(SUM(up.accepted_number), 0)::double precision
-              / NULLIF(COALESCE(SUM(up.submission_number), 0), 0)::double precision AS accuracy,
-            COUNT(*) OVER () AS total_count
-        FROM public.micro_organization AS o
-        LEFT JOIN public.micro_organization_member AS om ON om.organization_id = o.id
-        LEFT JOIN public."user" AS u ON u.id = om.user_id
-          AND u.admin_type = 'Regular User'
-          AND (u.is_disabled IS FALSE OR u.is_disabled IS NULL)
-        LEFT JOIN public.user_profile AS up ON up.user_id = u.id AND up.submission_number > 0
-        GROUP BY o.id, o.name, o.description
-        ORDER BY {order}
-        LIMIT :limit OFFSET :offset
-        """
-    )
-
-    rows = (await db.execute(sql, {"limit": limit, "offset": offset})).fetchall()
-    total = int(rows[0][-1]) if rows else 0
-
-    items = [
-        {
-            "rank": i,
-            "organization_id": r[0],
-            "name": r[1],
-            "description": r[2],
-            "total_members": int(r[3] or 0),
-            "total_solved": int(r[4] or 0),
-            "total_submission": int(r[5] or 0),
-            "accuracy": float(r[6] or 0.0),
-        }
-        for i, r in enumerate(rows, start=offset + 1)
-    ]
-
-    return Page(items=items, total=total, page=page, size=size)
-
-
-# Backward-compatible alias (keep existing import sites working)
-get_organizations_order_by_rank_ACM = get_organizations_order_by_rank_acm
-
-
-async def fetch_contest_problems(db: AsyncSession, contest_id: int) -> List[Problem]:
-    stmt = (
-        select(Problem)
-        .where(Problem.contest_id == contest_id)
-        .where(Problem.visible.is_(True))
-    )
-    rows = await db.execute(stmt)
-    problems = list(rows.scalars().all())
-
-    def sort_key(p: Problem):
-        # Ensure consistent type to avoid TypeError when mixing int/str
-        s = "" if p._id is None else str(p._id)
-        try:
-            n = int(s)
-            return (0, n)
-        except Exception:
-            return (1, s)
+    return Page(items=[_organization_rank_item(r) for r in rows], total=int(total), page=page, size=size)
 
-    problems.sort(key=sort_key)
-    return problems
 
+async def get_organization_rank_by_id(db: AsyncSession, organization_id: int) -> dict | None:
+    sql = text(f"SELECT {_ORGANIZATION_RANK_COLUMNS} WHERE r.organization_id = :organization_id")
+    row = (await db.execute(sql, {"organization_id": organization_id})).first()
+    return _organization_rank_item(row) if row else None
 
-async def fetch_contest_submissions(db: AsyncSession, contest_id: int) -> List[Submission]:
-    stmt = select(Submission).where(Submission.contest_id == contest_id)
-    rows = await db.execute(stmt)
-    return list(rows.scalars().all())
 
+# Backward-compatible alias (keep existing import sites working)
+get_organizations_order_by_rank_ACM = get_organizations_order_by_rank_acm
 
-async def get_acm_contest_rank(contest_id: int, db: AsyncSession):
-    query = select(ACMContestRank, User, UserData).join(User, ACMContestRank.user_id == User.id).outerjoin(UserData, User.id == UserData.user_id).where(ACMContestRank.contest_id == contest_id).order_by(desc(ACMContestRank.accepted_number), ACMContestRank.total_time)
-    result = await db.execute(query)
-    return result.all()
 
+def _jsonb_int(expr: str) -> str:
+    """
+    SQL expression converting a jsonb value the way Python's int() would:
+    numbers are truncated, integer strings are parsed, anything else is NULL.
+    """
+    return f"""(CASE jsonb_typeof({expr})
+        WHEN 'number' THEN trunc(({expr})::text::numeric)
+        WHEN 'boolean' THEN CASE WHEN ({expr})::text = 'true' THEN 1 ELSE 0 END
+        WHEN 'string' THEN CASE WHEN ({expr} #>> '{{}}') ~ '^\\s*[+-]?\\d+\\s*$'
+                                THEN btrim({expr} #>> '{{}}')::numeric END
+    END)"""
+
+
+# contest_best_score holds the best partial score per (user, problem), maintained when judging finishes:
+#   problem_full  full score of every visible contest problem (test case scores, negatives clamped to 0)
+#   user_agg      per-user total score, solved count, tie time and submission_info
+def _contest_user_rank_sql(rank_table: str, total_time: str, best_time: str) -> str:
+    return f"""
+WITH problem_full AS (
+    SELECT p.id AS problem_id,
+           COALESCE(SUM(GREATEST(COALESCE(CASE WHEN jsonb_typeof(c.elem) = 'object'
+                                               THEN {_jsonb_int("COALESCE(c.elem -> 'score', '0'::jsonb)")} END, 0), 0)),
+                    0) AS full_score
+    FROM public.problem AS p
+    LEFT JOIN LATERAL jsonb_array_elements(
+        CASE WHEN jsonb_typeof(p.test_case_score) = 'array' THEN p.test_case_score ELSE '[]'::jsonb END
+    ) AS c(elem) ON TRUE
+    WHERE p.contest_id = :contest_id AND p.visible IS TRUE
+    GROUP BY p.id
+),
+user_agg AS (
+    SELECT b.user_id,
+           SUM(b.score) AS total_score,
+           COUNT(*) FILTER (WHERE pf.full_score > 0 AND b.score >= pf.full_score) AS solved,
+           MAX(b.best_time) FILTER (WHERE b.score > 0) AS tie_time,
+           jsonb_object_agg(b.problem_id::text, jsonb_build_object(
+               'score', b.score,
+               'passed', b.passed,
+               'total', b.total,
+               'best_time', {best_time},
+               'is_ac', pf.full_score > 0 AND b.score >= pf.full_score
+           )) AS submission_info
+    FROM public.contest_best_score AS b
+    JOIN problem_full AS pf ON pf.problem_id = b.problem_id
+    WHERE b.contest_id = :contest_id
+    GROUP BY b.user_id
+)
+SELECT u.id AS user_id,
+       u.username,
+       ud.name AS real_name,
+       ud.student_id,
+       ud.major_id,
+       COALESCE(ua.total_score, 0)::integer AS total_score,
+       {total_time} AS total_time,
+       COALESCE(ua.solved, 0)::integer AS accepted_number,
+       ua.tie_time,
+       COALESCE(ua.submission_info, '{{}}'::jsonb) AS submission_info
+FROM public.{rank_table} AS r
+JOIN public."user" AS u ON u.id = r.user_id
+LEFT JOIN public.micro_userdata AS ud ON ud.user_id = u.id
+LEFT JOIN user_agg AS ua ON ua.user_id = u.id
+WHERE r.contest_id = :contest_id
+ORDER BY total_score DESC, ua.tie_time ASC NULLS LAST, total_time ASC NULLS LAST, u.id ASC
+"""
+
+
+def _contest_user_rank_query(rule_type: str, best_time: str = "b.best_time"):
+    if rule_type == "ACM":
+        return text(_contest_user_rank_sql(ACMContestRank.__tablename__, "r.total_time", best_time))
+    return text(_contest_user_rank_sql(OIContestRank.__tablename__, "NULL::integer", best_time))
+
+
+async def fetch_contest_user_rank(db: AsyncSession, contest_id: int, rule_type: str) -> List[dict]:
+    """
+    Per-user contest aggregates computed in Postgres from contest_best_score, already ordered by rank.
+    The cost depends on the number of participants, not the number of submissions.
+    """
+    rows = (await db.execute(_contest_user_rank_query(rule_type), {"contest_id": contest_id})).mappings().all()
+    return [dict(row) for row in rows]
+
+
+async def stream_contest_user_rank(
+    db: AsyncSession,
+    contest_id: int,
+    rule_type: str,
+    best_time: str = "b.best_time",
+    batch_size: int = 500,
+) -> AsyncIterator[List[dict]]:
+    """
+    Same rows as fetch_contest_user_rank, read through a server-side cursor and yielded in batches
+    so the caller never holds the whole contest in memory.
+    best_time is the SQL expression stored as 'best_time' in submission_info (e.g. a to_char() format).
+    """
+    query = _contest_user_rank_query(rule_type, best_time).execution_options(yield_per=batch_size)
+    result = await db.stream(query, {"contest_id": contest_id})
+    async for partition in result.mappings().partitions(batch_size):
+        yield [dict(row) for row in partition]
 
-async def get_oi_contest_rank(contest_id: int, db: AsyncSession):
-    query = select(OIContestRank, User, UserData).join(User, OIContestRank.user_id == User.id).outerjoin(UserData, User.id == UserData.user_id).where(OIContestRank.contest_id == contest_id).order_by(desc(OIContestRank.total_score))
-    result = await db.execute(query)
-    return result.all()
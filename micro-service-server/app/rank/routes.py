@@ -15,6 +15,14 @@ async def get_organization_rank(
     return await serv.get_organization_rank(page, size, db)
 
 
+@router.get("/organization/{organization_id}")
+async def get_organization_rank_by_id(
+    organization_id: int,
+    db: AsyncSession = Depends(get_database),
+):
+    return await serv.get_organization_rank_by_id(organization_id, db)
+
+
 @router.get("/contest/{contest_id}")
 async def get_contest_user_rank(
     contest_id: int,
@@ -0,0 +1,10 @@
+from app.exception import handlers
+from app.exception.codes import ErrorCode
+
+
+def submission_not_found():
+    handlers.not_found("Submission not found", ErrorCode.SUBMISSION_NOT_FOUND)
+
+
+def submission_access_denied():
+    handlers.forbidden("No permission for this submission", ErrorCode.FORBIDDEN)
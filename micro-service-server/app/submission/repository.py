@@ -1,4 +1,3 @@
-from collections import defaultdict
 from datetime import datetime, timedelta
 from typing import Iterable, List, Optional
 
@@ -6,6 +5,7 @@ from sqlalchemy import case, func, select, null
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.common.page import Page, paginate
+from app.contest.models import ContestBestScore
 from app.problem.models import Problem
 from app.submission.models import Submission
 
@@ -69,82 +69,38 @@ async def fetch_contest_problem_stats(
 async def fetch_contest_user_scores(
         db: AsyncSession,
         contest_id: int) -> List[dict]:
-    problem_scores: dict[int, dict[str, object]] = {}
+    full_scores: dict[int, int] = {}
     stmt_problem = select(Problem.id, Problem.test_case_score).where(Problem.contest_id == contest_id)
     problem_rows = await db.execute(stmt_problem)
     for row in problem_rows:
-        scores_list = row.test_case_score or []
-        case_scores: dict[int, int] = {}
         full_score = 0
-        for idx, item in enumerate(scores_list, start=1):
+        for item in row.test_case_score or []:
             try:
                 score = int(item.get("score", 0))
             except Exception:
                 score = 0
-            case_scores[idx] = max(score, 0)
             full_score += max(score, 0)
-        problem_scores[int(row.id)] = {
-            "case_scores": case_scores,
-            "full_score": full_score,
-        }
+        full_scores[int(row.id)] = full_score
 
-    if not problem_scores:
+    if not full_scores:
         return []
 
-    stmt_submissions = (
-        select(
-            Submission.user_id,
-            Submission.problem_id,
-            Submission.info,
-        )
-        .where(Submission.contest_id == contest_id)
+    # best partial score per (user, problem) is maintained in contest_best_score when judging finishes
+    stmt_best = (
+        select(ContestBestScore.user_id, ContestBestScore.problem_id, ContestBestScore.score)
+        .where(ContestBestScore.contest_id == contest_id)
     )
-    submission_rows = await db.execute(stmt_submissions)
-    best_scores: dict[int, dict[int, int]] = defaultdict(dict)
-
-    for row in submission_rows:
-        pid = int(row.problem_id)
-        if pid not in problem_scores:
-            continue
-        score_meta = problem_scores[pid]
-        case_scores: dict[int, int] = score_meta["case_scores"]
-        info = row.info or {}
-        data_list = info.get("data") if isinstance(info, dict) else None
-        if not isinstance(data_list, list):
-            continue
-        partial_score = 0
-        for item in data_list:
-            try:
-                tc_id = int(item.get("test_case"))
-                result = int(item.get("result"))
-            except Exception:
-                continue
-            if result == JUDGE_STATUS_ACCEPTED:
-                partial_score += case_scores.get(tc_id, 0)
-
+    best_rows = await db.execute(stmt_best)
+    results: dict[int, dict] = {}
+    for row in best_rows:
         user_id = int(row.user_id)
-        prev = best_scores[user_id].get(pid, 0)
-        if partial_score > prev:
-            best_scores[user_id][pid] = partial_score
-
-    results: List[dict] = []
-    for user_id, score_map in best_scores.items():
-        total = 0
-        solved = 0
-        for pid, score in score_map.items():
-            full_score = problem_scores.get(pid, {}).get("full_score", 0)
-            total += score
-            if full_score and score >= full_score:
-                solved += 1
-        results.append(
-            {
-                "user_id": user_id,
-                "total_score": total,
-                "solved_problems": solved,
-            }
-        )
+        item = results.setdefault(user_id, {"user_id": user_id, "total_score": 0, "solved_problems": 0})
+        item["total_score"] += row.score
+        full_score = full_scores.get(int(row.problem_id), 0)
+        if full_score and row.score >= full_score:
+            item["solved_problems"] += 1
 
-    return results
+    return list(results.values())
 
 
 async def get_user_submissions_by_year(user_id: int, db: AsyncSession):
@@ -162,6 +118,10 @@ async def get_user_submissions_by_year(user_id: int, db: AsyncSession):
     return result.all()
 
 
+async def find_submission_by_id(submission_id: str, db: AsyncSession) -> Optional[Submission]:
+    return await db.get(Submission, submission_id)
+
+
 async def fetch_problem_submissions(
         problem_id: int,
         contest_id: Optional[int],
@@ -190,25 +150,6 @@ async def fetch_problem_submissions(
     return (await db.execute(stmt)).scalars().all()
 
 
-async def count_solved_problem_by_contest_id_and_user_id(contest_id: int, user_id: int, db: AsyncSession) -> int:
-    stmt = (
-        select(func.count(func.distinct(Submission.problem_id)))
-        .where(Submission.contest_id == contest_id)
-        .where(Submission.user_id == user_id)
-        .where(Submission.result == JUDGE_STATUS_ACCEPTED)
-    )
-    result = await db.execute(stmt)
-    return int(result.scalar() or 0)
-
-
-async def get_score_by_contest_id_and_user_id(contest_id: int, user_id: int, db: AsyncSession) -> int:
-    scores = await fetch_contest_user_scores(db, contest_id)
-    target = next((item for item in scores if int(item.get("user_id", 0)) == user_id), None)
-    if not target:
-        return 0
-    return int(target.get("total_score", 0) or 0)
-
-
 async def count_problem_by_contest_id(contest_id: int, db: AsyncSession) -> int:
     stmt = (
         select(func.count(func.distinct(Problem.id)))
@@ -1,6 +1,7 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_database
@@ -60,3 +61,20 @@ async def get_contribution_data(
         user_profile: UserProfile = Depends(get_userdata),
         db: AsyncSession = Depends(get_database)):
     return await submission_service.get_contribution_data(user_profile, db)
+
+
+
+@router.get("/{submission_id}/progress")
+async def stream_submission_progress(
+        submission_id: str,
+        request: Request,
+        user_profile: UserProfile = Depends(get_userdata),
+        db: AsyncSession = Depends(get_database)):
+    submission = await submission_service.get_submission_for_progress(submission_id, user_profile, db)
+    # Release the DB connection before the long-lived stream starts.
+    await db.commit()
+    return StreamingResponse(
+        submission_service.stream_judge_progress(submission, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,13 +1,26 @@
-from typing import Iterable, List, Optional
+import json
+import time
+from typing import Any, AsyncIterator, Iterable, List, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.redis import redis_client
+from app.submission import exceptions as submission_exceptions
 from app.submission import repository as submission_repo
 from app.submission.models import Submission
 from app.submission.schemas import ContestProblemStat, ContestUserScore, SubmissionDailyCount, SubmissionListResponse
 from app.user.schemas import UserProfile
 from app.core.logger import logger
 
+# Stream layout shared with OnlineJudge/judge/progress.py: one stream per submission,
+# each entry has an "event" name and a JSON "data" payload.
+JUDGE_PROGRESS_KEY = "judge_progress"
+JUDGE_PROGRESS_FINISHED = "finished"
+JUDGE_STATUS_PENDING = 6
+JUDGE_STATUS_JUDGING = 7
+PROGRESS_BLOCK_MS = 15_000
+PROGRESS_STREAM_TIMEOUT_SECONDS = 600
+
 
 async def get_contest_problem_stats(
         contest_id: int,
@@ -70,4 +83,50 @@ async def get_problem_submission(
             memory=submission.statistic_info.get("memory_cost"),
         )
         for submission in submission_list
-    ]
\ No newline at end of file
+    ]
+
+
+async def get_submission_for_progress(
+        submission_id: str,
+        user_profile: UserProfile,
+        db: AsyncSession) -> Submission:
+    submission = await submission_repo.find_submission_by_id(submission_id, db)
+    if not submission:
+        submission_exceptions.submission_not_found()
+    if submission.user_id != user_profile.user_id and user_profile.admin_type not in ["Admin", "Super Admin"]:
+        submission_exceptions.submission_access_denied()
+    return submission
+
+
+def _sse(event: str, data: str, event_id: Optional[str] = None) -> str:
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event}\ndata: {data}\n\n"
+
+
+async def stream_judge_progress(
+        submission: Submission,
+        last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+    """Yield Server-Sent Events for a submission until its "finished" event.
+
+    Events already in the stream are replayed first, so subscribing late (or reconnecting
+    with Last-Event-ID) does not lose test cases.
+    """
+    key = f"{JUDGE_PROGRESS_KEY}:{submission.id}"
+    if submission.result not in (JUDGE_STATUS_PENDING, JUDGE_STATUS_JUDGING) and not await redis_client.exists(key):
+        data: dict[str, Any] = {"result": submission.result, "statistic_info": submission.statistic_info}
+        yield _sse(JUDGE_PROGRESS_FINISHED, json.dumps(data))
+        return
+
+    last_id = last_event_id or "0-0"
+    deadline = time.monotonic() + PROGRESS_STREAM_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        response = await redis_client.xread({key: last_id}, count=100, block=PROGRESS_BLOCK_MS)
+        if not response:
+            yield ": keep-alive\n\n"
+            continue
+        for _, entries in response:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                yield _sse(fields["event"], fields["data"], entry_id)
+                if fields["event"] == JUDGE_PROGRESS_FINISHED:
+                    return
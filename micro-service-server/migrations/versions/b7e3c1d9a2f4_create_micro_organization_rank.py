@@ -0,0 +1,59 @@
+"""create micro_organization_rank table
+
+Revision ID: b7e3c1d9a2f4
+Revises: 0f2e1d3c4b5a
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e3c1d9a2f4"
+down_revision: Union[str, None] = "0f2e1d3c4b5a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(inspector: sa.Inspector, table: str, schema: str = "public") -> bool:
+    return inspector.has_table(table, schema=schema)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if _has_table(inspector, "micro_organization_rank", "public"):
+        return
+
+    op.create_table(
+        "micro_organization_rank",
+        sa.Column("organization_id", sa.BigInteger(), nullable=False),
+        sa.Column("rank", sa.Integer(), nullable=False),
+        sa.Column("total_members", sa.BigInteger(), nullable=False),
+        sa.Column("total_accepted", sa.BigInteger(), nullable=False),
+        sa.Column("total_submission", sa.BigInteger(), nullable=False),
+        sa.Column("accuracy", sa.Float(), nullable=False),
+        sa.Column("updated_time", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.ForeignKeyConstraint(["organization_id"], ["public.micro_organization.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("organization_id"),
+        schema="public",
+    )
+    op.create_index("ix_org_rank_rank", "micro_organization_rank", ["rank"], unique=False, schema="public")
+    # The table is filled by the first scheduled refresh when the service starts
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if not _has_table(inspector, "micro_organization_rank", "public"):
+        return
+
+    op.drop_index("ix_org_rank_rank", table_name="micro_organization_rank", schema="public")
+    op.drop_table("micro_organization_rank", schema="public")
@@ -0,0 +1,58 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import app.contest.service as contest_service
+from app.common.page import Page
+
+
+def _contest(contest_id):
+    now = datetime.now()
+    return SimpleNamespace(id=contest_id, title=f"contest {contest_id}", description="", start_time=now,
+                           end_time=now, create_time=now, rule_type="ACM", visible=True, real_time_rank=True,
+                           allowed_ip_ranges=[], password=None)
+
+
+def _summary(contest_id, **kwargs):
+    values = dict(contest_id=contest_id, creator_id=1, creator_username="admin", languages=None,
+                  organization_id=None, is_organization_only=None, is_public=None, organization_name=None,
+                  participants=0, problem_count=0, policy_status=None)
+    values.update(kwargs)
+    return SimpleNamespace(**values)
+
+
+@pytest.mark.asyncio
+async def test_contest_list_loads_summaries_once(monkeypatch):
+    calls = []
+
+    async def _get_contest_summaries(contest_ids, _db):
+        calls.append(contest_ids)
+        return {
+            1: _summary(1, languages=["C", "Python3"], organization_id=3, is_organization_only=True,
+                        is_public=True, organization_name="org", participants=5, problem_count=2,
+                        policy_status="policy_auto"),
+            2: _summary(2),
+        }
+
+    async def _per_contest(*_args, **_kwargs):
+        raise AssertionError("contest list should not query per contest")
+
+    monkeypatch.setattr(contest_service.contest_repo, "get_contest_summaries", _get_contest_summaries)
+    monkeypatch.setattr(contest_service.contest_repo, "count_contest_participants_by_contest_id", _per_contest)
+    monkeypatch.setattr(contest_service.contest_repo, "find_contest_language_by_contest_id", _per_contest)
+    monkeypatch.setattr(contest_service.contest_repo, "find_organization_contest_by_contest_id", _per_contest)
+
+    page = Page(items=[_contest(1), _contest(2)], total=2, page=1, size=10)
+    response = await contest_service._process_contest_response(page, db=None)
+
+    assert calls == [[1, 2]]
+    first, second = response.items
+    assert (first.languages, first.participants, first.problemCount) == (["C", "Python3"], 5, 2)
+    assert (first.organization_id, first.organization_name, first.is_public) == (3, "org", True)
+    assert first.requires_approval is False
+    assert first.createdBy.username == "admin"
+    # Contests without a language row, organization or policy row keep the old defaults
+    assert (second.languages, second.participants, second.is_public, second.is_organization_only) == \
+        ([], 0, False, False)
+    assert second.requires_approval is True
@@ -0,0 +1,26 @@
+from types import SimpleNamespace
+
+import pytest
+
+import app.contest.service as contest_service
+
+
+@pytest.mark.asyncio
+async def test_get_contest_progress_reads_best_scores(monkeypatch):
+    async def _find_best_scores(contest_id, _db, user_id=None):
+        assert (contest_id, user_id) == (3, 7)
+        return [
+            SimpleNamespace(score=100, passed=5, total=5),
+            SimpleNamespace(score=40, passed=2, total=5),
+            SimpleNamespace(score=0, passed=0, total=1),
+        ]
+
+    async def _count_problem(_contest_id, _db):
+        return 4
+
+    monkeypatch.setattr(contest_service.contest_repo, "find_best_scores_by_contest_id", _find_best_scores)
+    monkeypatch.setattr(contest_service.submission_repo, "count_problem_by_contest_id", _count_problem)
+
+    progress = await contest_service.get_contest_progress(3, SimpleNamespace(user_id=7), db=None)
+
+    assert (progress.solved, progress.total, progress.total_score) == (1, 4, 140)
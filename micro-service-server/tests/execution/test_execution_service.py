@@ -0,0 +1,258 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import app.execution.service as execution_service
+from app.execution.admission import AdmissionRejected, QueueTicket
+from app.execution.cache import RunCodeCache
+from app.execution.schemas import RunCodeBatchRequest, RunCodeRequest
+
+
+def _request():
+    return RunCodeRequest(language="Python3", src="print(1)", stdin="", max_cpu_time=1000, max_memory_mb=128)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+    async def hincrby(self, key, field, amount):
+        self.store.setdefault(key, {})
+        self.store[key][field] = self.store[key].get(field, 0) + amount
+
+    async def hgetall(self, key):
+        return self.store.get(key, {})
+
+
+class _FakeChooser:
+    servers = []
+
+    def __init__(self, ttl=None, exclude=()):
+        self._exclude = list(exclude)
+
+    async def __aenter__(self):
+        return next((s for s in self.servers if s.id not in self._exclude), None)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class _FakeAdmission:
+    def __init__(self, reject=None, waits_before_shed=2):
+        self.reject = reject
+        self.waits_before_shed = waits_before_shed
+        self.waits = 0
+        self.on_wait = None
+        self.tickets = []
+        self.left = []
+
+    @asynccontextmanager
+    async def admit(self, user_id):
+        if self.reject:
+            raise AdmissionRejected(self.reject, 3)
+        yield
+
+    async def enter_queue(self):
+        ticket = QueueTicket(f"waiter-{len(self.tickets)}", 0.0, 0.0)
+        self.tickets.append(ticket)
+        return ticket
+
+    async def wait(self, ticket):
+        self.waits += 1
+        if self.waits > self.waits_before_shed:
+            raise AdmissionRejected("shed_deadline", 2)
+        if self.on_wait:
+            self.on_wait()
+
+    async def leave_queue(self, ticket):
+        self.left.append(ticket)
+
+
+@pytest.fixture
+def patched(monkeypatch):
+    state = {"failures": [], "successes": []}
+
+    async def _config(session, language):
+        return {"compile": {}}, "hashed"
+
+    async def _failure(server_id):
+        state["failures"].append(server_id)
+        return False
+
+    async def _success(server_id):
+        state["successes"].append(server_id)
+
+    _FakeChooser.servers = [
+        SimpleNamespace(id=1, service_url="http://judge-1:8080"),
+        SimpleNamespace(id=2, service_url="http://judge-2:8080"),
+    ]
+    monkeypatch.setattr(execution_service, "_get_judge_config", _config)
+    monkeypatch.setattr(execution_service, "ChooseJudgeServerAsync", _FakeChooser)
+    monkeypatch.setattr(execution_service, "report_judge_failure", _failure)
+    monkeypatch.setattr(execution_service, "report_judge_success", _success)
+    monkeypatch.setattr(execution_service, "run_code_cache", RunCodeCache(redis=_FakeRedis()))
+    state["admission"] = _FakeAdmission()
+    monkeypatch.setattr(execution_service, "run_code_admission", state["admission"])
+    return state
+
+
+@pytest.mark.asyncio
+async def test_run_code_moves_to_next_server(monkeypatch, patched):
+    async def _run(service_url, headers, config, req, mem_bytes):
+        if service_url == "http://judge-1:8080":
+            raise httpx.ConnectError("refused")
+        return {"err": None, "data": [{"output": "1\n"}]}
+
+    monkeypatch.setattr(execution_service, "_run_on_server", _run)
+    result = await execution_service.run_code_service(SimpleNamespace(), _request())
+    assert result["data"][0]["output"] == "1\n"
+    assert patched["failures"] == [1]
+    assert patched["successes"] == [2]
+
+
+@pytest.mark.asyncio
+async def test_run_code_fails_when_every_server_is_down(monkeypatch, patched):
+    async def _run(service_url, headers, config, req, mem_bytes):
+        raise httpx.ConnectTimeout("timeout")
+
+    monkeypatch.setattr(execution_service, "_run_on_server", _run)
+    with pytest.raises(Exception):
+        await execution_service.run_code_service(SimpleNamespace(), _request())
+    assert patched["failures"] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_run_code_read_timeout_is_not_retried(monkeypatch, patched):
+    calls = []
+
+    async def _run(service_url, headers, config, req, mem_bytes):
+        calls.append(service_url)
+        raise httpx.ReadTimeout("timeout")
+
+    monkeypatch.setattr(execution_service, "_run_on_server", _run)
+    with pytest.raises(HTTPException) as e:
+        await execution_service.run_code_service(SimpleNamespace(), _request())
+    assert e.value.status_code == 504
+    assert calls == ["http://judge-1:8080"]
+    assert patched["failures"] == []
+
+
+@pytest.mark.asyncio
+async def test_run_code_without_server(patched):
+    _FakeChooser.servers = []
+    with pytest.raises(HTTPException) as e:
+        await execution_service.run_code_service(SimpleNamespace(), _request())
+    # Shed after waiting in the queue, and the queue entry is released
+    assert e.value.status_code == 503
+    assert e.value.headers == {"Retry-After": "2"}
+    admission = patched["admission"]
+    assert admission.waits == 3
+    assert admission.left == admission.tickets and len(admission.tickets) == 1
+
+
+@pytest.mark.asyncio
+async def test_run_code_waits_for_free_server(monkeypatch, patched):
+    servers = _FakeChooser.servers
+    _FakeChooser.servers = []
+    admission = patched["admission"]
+
+    def _free_slot():
+        _FakeChooser.servers = servers
+
+    admission.on_wait = _free_slot
+
+    async def _run(service_url, headers, config, req, mem_bytes):
+        return {"err": None, "data": [{"output": "1\n"}]}
+
+    monkeypatch.setattr(execution_service, "_run_on_server", _run)
+    result = await execution_service.run_code_service(SimpleNamespace(), _request(), user_id=1)
+
+    assert result == {"err": None, "data": [{"output": "1\n"}]}
+    assert admission.waits == 1
+    assert admission.left == admission.tickets and len(admission.tickets) == 1
+
+
+@pytest.mark.asyncio
+async def test_run_code_rejected_over_user_limit(monkeypatch, patched):
+    patched["admission"].reject = "rejected_rate"
+
+    async def _run(*_args):
+        raise AssertionError("rejected runs must not reach a judge server")
+
+    monkeypatch.setattr(execution_service, "_run_on_server", _run)
+    with pytest.raises(HTTPException) as e:
+        await execution_service.run_code_service(SimpleNamespace(), _request(), user_id=1)
+    assert e.value.status_code == 429
+    assert e.value.headers == {"Retry-After": "3"}
+
+
+@pytest.mark.asyncio
+async def test_run_code_batch_uses_one_judge_call(monkeypatch, patched, tmp_path):
+    calls = []
+
+    class _Client:
+        async def post(self, url, headers=None, json=None, timeout=None):
+            case_dir = tmp_path / json["test_case_id"]
+            inputs = [(case_dir / f"{i}.in").read_text() for i in (1, 2, 3)]
+            calls.append((url, inputs))
+            data = [{"test_case": str(i), "output": f"{inputs[i - 1]}!"} for i in (3, 1, 2)]
+            return SimpleNamespace(json=lambda: {"err": None, "data": data})
+
+    monkeypatch.setattr(execution_service.settings, "TEST_CASE_DATA_PATH", str(tmp_path))
+    monkeypatch.setattr(execution_service, "get_judge_client", lambda service_url: _Client())
+    req = RunCodeBatchRequest(language="Python3", src="print(input() + '!')", stdins=["a", "b", "c"],
+                              max_cpu_time=1000, max_memory_mb=128)
+    result = await execution_service.run_code_batch_service(SimpleNamespace(), req)
+
+    assert calls == [("http://judge-1:8080/judge", ["a", "b", "c"])]
+    assert [item["output"] for item in result["data"]] == ["a!", "b!", "c!"]
+    # The temporary test case is removed after the run
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_run_code_is_cached(monkeypatch, patched):
+    import asyncio
+
+    runs = []
+
+    async def _run(service_url, headers, config, req, mem_bytes):
+        runs.append(req.stdin)
+        await asyncio.sleep(0.01)
+        return {"err": None, "data": [{"result": 0, "output": "1\n"}]}
+
+    monkeypatch.setattr(execution_service, "_run_on_server", _run)
+    # Concurrent identical runs share one judge call, a later one is read from the cache
+    results = await asyncio.gather(*(execution_service.run_code_service(SimpleNamespace(), _request())
+                                     for _ in range(3)))
+    await execution_service.run_code_service(SimpleNamespace(), _request())
+    await execution_service.run_code_service(SimpleNamespace(), _request().model_copy(update={"stdin": "2"}))
+
+    assert runs == ["", "2"]
+    assert all(result["data"][0]["output"] == "1\n" for result in results)
+    stats = await execution_service.run_code_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["shared"]) == (1, 2, 2)
+    assert stats["hit_rate"] == 0.6
+
+
+@pytest.mark.asyncio
+async def test_run_code_failures_are_not_cached(monkeypatch, patched):
+    runs = []
+
+    async def _run(service_url, headers, config, req, mem_bytes):
+        runs.append(req.stdin)
+        return {"err": None, "data": [{"result": 5, "output": ""}]}
+
+    monkeypatch.setattr(execution_service, "_run_on_server", _run)
+    await execution_service.run_code_service(SimpleNamespace(), _request())
+    await execution_service.run_code_service(SimpleNamespace(), _request())
+    assert runs == ["", ""]
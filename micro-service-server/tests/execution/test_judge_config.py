@@ -0,0 +1,96 @@
+import hashlib
+
+import pytest
+from fastapi import HTTPException
+
+import app.execution.config as config_module
+from app.execution.config import JudgeConfigCache
+
+
+class _FakeRedis:
+    def __init__(self, version=None):
+        self.version = version
+
+    async def get(self, key):
+        return self.version
+
+
+class _FakeSession:
+    def __init__(self, languages, token="db-token"):
+        self.options = {"languages": languages, "judge_server_token": token}
+        self.queries = 0
+        self.on_execute = None
+
+    async def execute(self, stmt):
+        self.queries += 1
+        if self.on_execute:
+            self.on_execute()
+        options = dict(self.options)
+        return type("Result", (), {"all": lambda _self: list(options.items())})()
+
+
+def _language(name, seccomp_rule):
+    return {"name": name, "config": {"compile": {"src_name": "main"}, "run": {"seccomp_rule": seccomp_rule}}}
+
+
+@pytest.fixture
+def db_token(monkeypatch):
+    monkeypatch.setattr(config_module.settings, "JUDGE_SERVER_TOKEN", "")
+
+
+@pytest.mark.asyncio
+async def test_snapshot_loaded_once(db_token):
+    cache = JudgeConfigCache(redis=_FakeRedis("3"))
+    session = _FakeSession([_language("C", {"C": "c_cpp"}), _language("Python3", "general")])
+
+    c_config, token = await cache.get(session, "C")
+    python_config, _ = await cache.get(session, "Python3")
+
+    assert session.queries == 1
+    assert token == hashlib.sha256(b"db-token").hexdigest()
+    assert c_config["run"]["seccomp_rule"] == "c_cpp"
+    assert python_config["run"]["seccomp_rule"] == "general"
+    # The stored options are not modified by the normalization
+    assert session.options["languages"][0]["config"]["run"]["seccomp_rule"] == {"C": "c_cpp"}
+
+
+@pytest.mark.asyncio
+async def test_snapshot_reloaded_on_newer_version(db_token):
+    redis = _FakeRedis("3")
+    cache = JudgeConfigCache(redis=redis)
+    session = _FakeSession([_language("C", "c_cpp")])
+    await cache.get(session, "C")
+
+    # Versions the snapshot already has are ignored
+    cache.invalidate(3)
+    await cache.get(session, "C")
+    assert session.queries == 1
+
+    redis.version = "4"
+    session.options["languages"] = [_language("C", "c_cpp"), _language("Go", "golang")]
+    cache.invalidate(4)
+    config, _ = await cache.get(session, "Go")
+    assert session.queries == 2
+    assert config["run"]["seccomp_rule"] == "golang"
+
+
+@pytest.mark.asyncio
+async def test_load_racing_with_bump_is_not_kept(db_token):
+    cache = JudgeConfigCache(redis=_FakeRedis("3"))
+    session = _FakeSession([_language("C", "c_cpp")])
+    # Published after the version was read but before the options were
+    session.on_execute = lambda: cache.invalidate(4)
+
+    await cache.get(session, "C")
+    session.on_execute = None
+    await cache.get(session, "C")
+    assert session.queries == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_language(db_token):
+    cache = JudgeConfigCache(redis=_FakeRedis())
+    session = _FakeSession([_language("C", "c_cpp")])
+    with pytest.raises(HTTPException) as e:
+        await cache.get(session, "Rust")
+    assert e.value.status_code == 400
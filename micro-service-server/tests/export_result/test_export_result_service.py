@@ -0,0 +1,64 @@
+import csv
+import io
+from types import SimpleNamespace
+
+import pytest
+from openpyxl import load_workbook
+
+import app.export_result.service as export_service
+
+ROWS = [
+    {"user_id": 2, "username": "u2", "real_name": "Kim", "student_id": "2024001", "accepted_number": 1,
+     "total_score": 100, "submission_info": {"10": {"passed": 3, "total": 3, "best_time": "2026-01-01 10:00:00"}}},
+    {"user_id": 1, "username": "u1", "real_name": None, "student_id": None, "accepted_number": 0,
+     "total_score": 0, "submission_info": {}},
+]
+
+
+@pytest.fixture
+def contest_data(monkeypatch):
+    calls = []
+
+    async def _fetch_contest(_db, contest_id):
+        return SimpleNamespace(id=contest_id, rule_type="OI")
+
+    async def _fetch_contest_problems(_db, _contest_id):
+        return [SimpleNamespace(id=10, _id="A"), SimpleNamespace(id=11, _id="B")]
+
+    async def _stream_contest_user_rank(_db, contest_id, rule_type, best_time, batch_size):
+        calls.append((contest_id, rule_type, best_time))
+        # Two batches, as they would come off the server-side cursor
+        yield ROWS[:1]
+        yield ROWS[1:]
+
+    monkeypatch.setattr(export_service.export_repo, "fetch_contest", _fetch_contest)
+    monkeypatch.setattr(export_service.export_repo, "fetch_contest_problems", _fetch_contest_problems)
+    monkeypatch.setattr(export_service.rank_repo, "stream_contest_user_rank", _stream_contest_user_rank)
+    return calls
+
+
+def _read(file):
+    return b"".join(export_service.iter_file(file))
+
+
+@pytest.mark.asyncio
+async def test_generate_contest_result_xlsx(contest_data):
+    file = await export_service.generate_contest_result(5, db=None, export_format="xlsx")
+
+    assert contest_data == [(5, "OI", export_service.BEST_TIME_SQL)]
+    ws = load_workbook(io.BytesIO(_read(file))).active
+    assert [c.value for c in ws[1]][:7] == ["순위", "이름", "학번", "해결", "점수", "A", None]
+    assert [c.value for c in ws[3]] == [1, "Kim", "2024001", "1/2", 100, "3/3", "2026-01-01 10:00:00", "-", "-"]
+    assert [c.value for c in ws[4]] == [2, "u1", "-", "0/2", 0, "-", "-", "-", "-"]
+    assert "A1:A2" in ws.merged_cells
+    assert "F1:G1" in ws.merged_cells
+
+
+@pytest.mark.asyncio
+async def test_generate_contest_result_csv(contest_data):
+    file = await export_service.generate_contest_result(5, db=None, export_format="csv")
+
+    rows = list(csv.reader(io.StringIO(_read(file).decode("utf-8-sig"))))
+    assert rows[0][5:7] == ["A 테스트 결과", "A 해당 점수를 받은 최초 시각"]
+    assert rows[1] == ["1", "Kim", "2024001", "1/2", "100", "3/3", "2026-01-01 10:00:00", "-", "-"]
+    assert rows[2] == ["2", "u1", "-", "0/2", "0", "-", "-", "-", "-"]
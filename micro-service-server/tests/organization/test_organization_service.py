@@ -28,7 +28,12 @@ class FakeOrganizationMember:
         self.role = organization_service.OrganizationRole.MEMBER
 
 
-def _patch_common_dependencies(monkeypatch, redis: FakeRedis, existing_members: set[tuple[int, int]]):
+def _patch_common_dependencies(
+        monkeypatch,
+        redis: FakeRedis,
+        existing_members: set[tuple[int, int]],
+        refreshed: Optional[list] = None,
+):
     async def _get_redis_manage_code():
         return redis
 
@@ -50,6 +55,10 @@ def _patch_common_dependencies(monkeypatch, redis: FakeRedis, existing_members:
         existing_members.add((member.organization_id, member.user_id))
         return member
 
+    async def _refresh_organization_rank(_db, organization_ids=None):
+        if refreshed is not None:
+            refreshed.append(organization_ids)
+
     monkeypatch.setattr(organization_service, "OrganizationMember", FakeOrganizationMember)
     monkeypatch.setattr(organization_service, "get_redis_manage_code", _get_redis_manage_code)
     monkeypatch.setattr(organization_service, "_get_organization_by_id", _get_org)
@@ -57,6 +66,7 @@ def _patch_common_dependencies(monkeypatch, redis: FakeRedis, existing_members:
     monkeypatch.setattr(organization_service.user_repo, "find_sub_userdata_by_user_id", _find_sub_userdata_by_user_id)
     monkeypatch.setattr(organization_service.organization_repo, "get_member_by_organization_id_and_user_id", _get_member)
     monkeypatch.setattr(organization_service.organization_repo, "save_organization_member", _save_member)
+    monkeypatch.setattr(organization_service.rank_repo, "refresh_organization_rank", _refresh_organization_rank)
     monkeypatch.setattr(
         organization_service.OrganizationMemberResponse,
         "from_orm",
@@ -118,3 +128,19 @@ async def test_join_organization_duplicate_member_does_not_invalidate_invite_cod
 
     assert redis.deleted == []
     assert redis.store["invite-code"] == "organization_join:7:99"
+
+
+@pytest.mark.asyncio
+async def test_join_organization_refreshes_organization_rank(monkeypatch):
+    redis = FakeRedis({"invite-code": "organization_join:7:99"})
+    refreshed: list = []
+    _patch_common_dependencies(monkeypatch, redis, set(), refreshed)
+
+    await organization_service.join_organization(
+        7,
+        SimpleNamespace(user_id=101),
+        "invite-code",
+        SimpleNamespace(),
+    )
+
+    assert refreshed == [[7]]
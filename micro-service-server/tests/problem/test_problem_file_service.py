@@ -1,4 +1,8 @@
+import asyncio
+import io
 import json
+import zipfile
+from contextlib import asynccontextmanager
 from types import SimpleNamespace
 
 import pytest
@@ -70,3 +74,52 @@ async def test_import_problem_file_validation_error():
             is_admin=False,
             db=SimpleNamespace(),
         )
+
+
+@pytest.mark.asyncio
+async def test_import_validates_solutions_concurrently(monkeypatch):
+    paths = [f"p{i}/problem.md" for i in range(6)]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for i, path in enumerate(paths):
+            zf.writestr(path, f"---\ntitle: title{i}\n---\n# description\nbody\n")
+    zip_ref = zipfile.ZipFile(buffer)
+
+    running, peak, progress = [0], [0], []
+
+    async def _validate(_zip_ref, _file_list, md_path, _db):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        index = paths.index(md_path)
+        # Later problems finish first; problems 2 and 4 fail
+        await asyncio.sleep(0.01 * (len(paths) - index))
+        running[0] -= 1
+        if index in (2, 4):
+            problem_service.problem_exceptions.judge_server_error()
+
+    @asynccontextmanager
+    async def _database():
+        yield None
+
+    async def _polling_state(_key, _status, processed, *_args, **_kwargs):
+        progress.append(processed)
+
+    monkeypatch.setattr(problem_service.settings, "PROBLEM_IMPORT_VALIDATION_CONCURRENCY", 3)
+    monkeypatch.setattr(problem_service, "_validate_problem_solution", _validate)
+    monkeypatch.setattr(problem_service, "get_background_database", _database)
+    monkeypatch.setattr(problem_service, "_set_redis_polling_state", _polling_state)
+
+    status = problem_service.ProblemImportPollingStatus(status="initialized", processed_problem=0,
+                                                        left_problem=len(paths), all_problem=len(paths))
+    with pytest.raises(Exception) as exc_info:
+        await problem_service._validate_import_solutions(zip_ref, zip_ref.namelist(), paths, "key", status)
+
+    assert peak[0] == 3
+    # The first failing problem in zip order is reported, with the same prefix as a sequential import
+    assert exc_info.value.detail["message"].startswith("[Problem 3/6] title2 (p2/problem.md)\n")
+
+    progress.clear()
+    monkeypatch.setattr(problem_service, "_validate_problem_solution", lambda *args: asyncio.sleep(0))
+    await problem_service._validate_import_solutions(zip_ref, zip_ref.namelist(), paths, "key", status)
+    assert progress == sorted(progress) and progress[-1] == 6
+    assert status.processed_problem == 6 and status.left_problem == 0
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+import pytest
+
+import app.rank.service as rank_service
+
+
+@pytest.mark.asyncio
+async def test_get_contest_user_rank_numbers_aggregated_rows(monkeypatch):
+    calls = []
+
+    async def _find_contest(contest_id, _db):
+        return SimpleNamespace(id=contest_id, rule_type="OI")
+
+    async def _fetch_contest_user_rank(_db, contest_id, rule_type):
+        calls.append((contest_id, rule_type))
+        return [
+            {"user_id": 2, "total_score": 200, "submission_info": {}},
+            {"user_id": 1, "total_score": 100, "submission_info": {}},
+        ]
+
+    monkeypatch.setattr(rank_service.contest_repo, "find_contest_by_id", _find_contest)
+    monkeypatch.setattr(rank_service.ranking_repository, "fetch_contest_user_rank", _fetch_contest_user_rank)
+
+    rows = await rank_service.get_contest_user_rank(5, db=None)
+
+    assert calls == [(5, "OI")]
+    assert [(row["user_id"], row["rank"]) for row in rows] == [(2, 1), (1, 2)]
+
+
+@pytest.mark.asyncio
+async def test_get_contest_user_rank_contest_not_found(monkeypatch):
+    async def _find_contest(_contest_id, _db):
+        return None
+
+    monkeypatch.setattr(rank_service.contest_repo, "find_contest_by_id", _find_contest)
+
+    with pytest.raises(ValueError):
+        await rank_service.get_contest_user_rank(5, db=None)
@@ -0,0 +1,64 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import app.submission.service as submission_service
+
+
+class _FakeStreamRedis:
+    def __init__(self, entries):
+        self.entries = entries
+        self.reads = []
+
+    async def exists(self, key):
+        return int(bool(self.entries))
+
+    async def xread(self, streams, count=None, block=None):
+        (key, last_id), = streams.items()
+        self.reads.append(last_id)
+        ids = [entry_id for entry_id, _ in self.entries]
+        start = ids.index(last_id) + 1 if last_id in ids else 0
+        pending = self.entries[start:start + count]
+        return [(key, pending)] if pending else []
+
+
+def _entry(entry_id, event, data):
+    return entry_id, {"event": event, "data": json.dumps(data)}
+
+
+async def _collect(submission, last_event_id=None):
+    return [chunk async for chunk in submission_service.stream_judge_progress(submission, last_event_id)]
+
+
+@pytest.mark.asyncio
+async def test_stream_replays_events_until_finished(monkeypatch):
+    redis = _FakeStreamRedis([
+        _entry("1-0", "judging", {"test_case_number": 2}),
+        _entry("2-0", "test_case", {"test_case": "1", "result": 0}),
+        _entry("3-0", "finished", {"result": -1}),
+        _entry("4-0", "test_case", {"test_case": "2", "result": 0}),
+    ])
+    monkeypatch.setattr(submission_service, "redis_client", redis)
+    chunks = await _collect(SimpleNamespace(id="abc", result=7, statistic_info={}))
+    assert [chunk.split("\n")[1] for chunk in chunks] == ["event: judging", "event: test_case", "event: finished"]
+    assert chunks[0].startswith("id: 1-0\n")
+
+
+@pytest.mark.asyncio
+async def test_stream_resumes_from_last_event_id(monkeypatch):
+    redis = _FakeStreamRedis([
+        _entry("1-0", "judging", {"test_case_number": 1}),
+        _entry("2-0", "finished", {"result": 0}),
+    ])
+    monkeypatch.setattr(submission_service, "redis_client", redis)
+    chunks = await _collect(SimpleNamespace(id="abc", result=7, statistic_info={}), last_event_id="1-0")
+    assert chunks == ['id: 2-0\nevent: finished\ndata: {"result": 0}\n\n']
+    assert redis.reads == ["1-0"]
+
+
+@pytest.mark.asyncio
+async def test_finished_submission_without_stream(monkeypatch):
+    monkeypatch.setattr(submission_service, "redis_client", _FakeStreamRedis([]))
+    chunks = await _collect(SimpleNamespace(id="abc", result=0, statistic_info={"time_cost": 3}))
+    assert chunks == ['event: finished\ndata: {"result": 0, "statistic_info": {"time_cost": 3}}\n\n']